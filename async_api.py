@@ -0,0 +1,160 @@
+"""
+asyncio API for PDF Password Manager.
+
+The coroutines here run add/remove/rekey jobs without blocking the event
+loop and without printing or prompting: parsing and crypto run in an
+executor, and each job returns the same result dict as a batch worker
+(input, output, success, messages, ...). Messages the CLI would print
+are collected in ``messages``, and questions such as "overwrite?" get
+their default answer.
+
+By default jobs run on the loop's default thread pool. Pass a process
+pool, e.g. from make_executor(), to use more than one CPU:
+
+    with make_executor(jobs=4) as executor:
+        async for result in process_batch_async(["./incoming"], "secret", "./unlocked",
+                                                 executor=executor, limit=8):
+            print(result['input'], result['success'])
+
+process_batch_async() walks directories lazily in a helper thread and
+keeps at most ``limit`` documents in flight, so memory stays bounded
+however many files there are; results are yielded as they complete.
+"""
+
+import asyncio
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import remove_pdf_password
+from file_discovery import iter_input_files
+from remove_pdf_password import (_batch_jobs, _batch_output_path, init_batch_worker, process_file_worker,
+                                 available_cpu_count, sanitize_error_message)
+
+# Input paths discovered per hop to the helper thread
+DISCOVERY_CHUNK_SIZE = 256
+
+OPERATIONS = ('remove', 'add', 'rekey')
+
+
+def make_executor(jobs=None, keyring=None):
+    """Return a process pool whose workers are set up like the CLI's batch workers.
+
+    :param jobs: Number of worker processes (default: available CPUs).
+    :param keyring: Keyring kept in each worker, so its ordering learns across jobs.
+    """
+    store = remove_pdf_password.backup_store
+    return ProcessPoolExecutor(max_workers=jobs or available_cpu_count(), initializer=init_batch_worker,
+                               initargs=(keyring, store.root if store is not None else None))
+
+
+def _options(backup=True, overwrite=False, owner_password=None, permissions=None, engine='auto',
+             new_password=None, durability='none'):
+    return {
+        'backup': backup,
+        'overwrite': overwrite,
+        'owner_password': owner_password,
+        'permissions': permissions,
+        'engine': engine,
+        'new_password': new_password,
+        'durability': durability,
+    }
+
+
+def _failed_result(input_file, output_file, error):
+    return {'input': input_file, 'output': output_file, 'success': False,
+            'messages': [f"Error: {sanitize_error_message(str(error), input_file)}"], 'key_cache': (0, 0),
+            'fingerprint': None, 'params': None}
+
+
+async def process_file_async(operation, input_pdf, output_pdf, password, executor=None, keyring=None, **options):
+    """Run one add/remove/rekey job in executor and return its result dict.
+
+    :param keyring: Keyring tried before password in remove and rekey modes.
+    :param options: backup, overwrite, owner_password, permissions, engine, new_password and durability,
+        as for process_batch().
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation: {operation}")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, process_file_worker, operation, input_pdf, output_pdf, password,
+                                      _options(**options), False, keyring)
+
+
+async def remove_password_async(input_pdf, output_pdf, password, executor=None, keyring=None, **options):
+    """Remove the password from a PDF without blocking the event loop; see process_file_async()."""
+    return await process_file_async('remove', input_pdf, output_pdf, password, executor, keyring, **options)
+
+
+async def add_password_async(input_pdf, output_pdf, password, executor=None, **options):
+    """Password-protect a PDF without blocking the event loop; see process_file_async()."""
+    return await process_file_async('add', input_pdf, output_pdf, password, executor, **options)
+
+
+async def rekey_password_async(input_pdf, output_pdf, password, new_password=None, executor=None, keyring=None,
+                               **options):
+    """Change the password and/or permissions of a PDF without blocking the event loop."""
+    return await process_file_async('rekey', input_pdf, output_pdf, password, executor, keyring,
+                                    new_password=new_password, **options)
+
+
+async def process_batch_async(paths, password, output_dir=None, operation='remove', executor=None, limit=None,
+                              keyring=None, password_map=None, recursive=False, include=None, exclude=None,
+                              **options):
+    """Yield a result dict for every PDF under paths, in completion order.
+
+    :param paths: Files and directories, or (path, credentials) pairs from iter_password_map_files().
+    :param limit: Documents in flight at once (default: available CPUs). Discovery pauses while it is reached.
+    :param password_map: PasswordMap giving per-file credentials.
+    :param options: As for process_file_async().
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation: {operation}")
+    limit = max(1, limit or available_cpu_count())
+    loop = asyncio.get_running_loop()
+
+    def inputs():
+        # Credential pairs from a password map pass through; plain paths are expanded
+        plain = []
+        for item in paths:
+            if isinstance(item, tuple):
+                yield from iter_input_files(plain, recursive, include, exclude)
+                plain = []
+                yield item
+            else:
+                plain.append(item)
+        yield from iter_input_files(plain, recursive, include, exclude)
+
+    batch_jobs = _batch_jobs(inputs(), password, _options(**options), password_map)
+    discovered = []
+    exhausted = False
+    pending = {}
+    try:
+        while True:
+            while len(pending) < limit and not exhausted:
+                if not discovered:
+                    # Directory walks and list files are read off the event loop
+                    discovered = await asyncio.to_thread(list, itertools.islice(batch_jobs, DISCOVERY_CHUNK_SIZE))
+                    discovered.reverse()
+                    if not discovered:
+                        exhausted = True
+                        break
+                input_file, file_password, file_options = discovered.pop()
+                output_file = _batch_output_path(input_file, output_dir, operation)
+                future = loop.run_in_executor(executor, process_file_worker, operation, input_file, output_file,
+                                              file_password, file_options, False, keyring)
+                pending[future] = (input_file, output_file)
+            if not pending:
+                return
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                input_file, output_file = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = _failed_result(input_file, output_file, e)
+                yield result
+    finally:
+        # The consumer stopped early or was cancelled: drop queued jobs; running ones finish in the executor
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,187 @@
+"""
+Content-addressed backup store for PDF Password Manager.
+
+Backups are kept in one directory instead of next to every input:
+
+    <store>/objects/ab/abcdef....pdf   one copy per distinct file content
+    <store>/index.jsonl                one line per backup taken
+
+Each index line records the time, the original path, the SHA-256 of the
+content and its size. Backing up a file whose content is already stored
+only appends an index line. New objects are cloned with a reflink
+(FICLONE) or copy_file_range() where the filesystem supports it, and
+copied normally otherwise.
+
+Pruning drops index entries by age and/or count per original path and
+deletes the objects no remaining entry refers to. Do not prune while a
+batch is writing backups into the same store.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl request for sharing extents between files (Linux, btrfs/XFS/bcachefs)
+FICLONE = 0x40049409
+
+# Read size for hashing and plain copies
+COPY_CHUNK_SIZE = 1024 * 1024
+
+INDEX_NAME = "index.jsonl"
+OBJECTS_DIR = "objects"
+
+
+def file_digest(path):
+    """Return (sha256 hex digest, size) of a file."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def clone_file(source, destination):
+    """Copy source to destination, sharing disk blocks when possible.
+
+    :return: The method used: 'reflink', 'copy_file_range' or 'copy'.
+    """
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return 'reflink'
+            except OSError:
+                pass
+
+        if hasattr(os, "copy_file_range"):
+            size = os.fstat(src.fileno()).st_size
+            copied = 0
+            try:
+                while copied < size:
+                    count = os.copy_file_range(src.fileno(), dst.fileno(), size - copied)
+                    if not count:
+                        break
+                    copied += count
+            except OSError:
+                pass
+            if copied == size:
+                return 'copy_file_range'
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        return 'copy'
+
+
+class BackupStore:
+    """Deduplicating backup directory keyed by content hash."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.index_path = os.path.join(self.root, INDEX_NAME)
+        self.objects_dir = os.path.join(self.root, OBJECTS_DIR)
+
+    def object_path(self, digest):
+        """Return where the object with the given SHA-256 is stored."""
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.pdf")
+
+    def store(self, file_path):
+        """Back up file_path and return the path of its stored copy."""
+        digest, size = file_digest(file_path)
+        object_path = self.object_path(digest)
+
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            temp_path = f"{object_path}.{os.getpid()}.tmp"
+            try:
+                clone_file(file_path, temp_path)
+                os.chmod(temp_path, 0o444)
+                os.replace(temp_path, object_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        record = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'path': os.path.abspath(file_path),
+            'sha256': digest,
+            'size': size,
+        }
+        # One short append per backup, so concurrent batch workers do not interleave lines
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        return object_path
+
+    def entries(self):
+        """Yield the index records, oldest first."""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def prune(self, keep_last=None, max_age_days=None, now=None):
+        """Apply a retention policy and delete objects no longer referenced.
+
+        :param keep_last: Keep at most this many of the newest backups per original path.
+        :param max_age_days: Drop backups older than this many days.
+        :return: Dict with entries_removed, objects_removed and bytes_reclaimed.
+        """
+        entries = list(self.entries())
+        cutoff = None
+        if max_age_days is not None:
+            cutoff = (now or datetime.now()) - timedelta(days=max_age_days)
+
+        kept = []
+        seen = {}
+        for entry in reversed(entries):
+            seen[entry['path']] = seen.get(entry['path'], 0) + 1
+            if keep_last is not None and seen[entry['path']] > keep_last:
+                continue
+            if cutoff is not None and datetime.fromisoformat(entry['time']) < cutoff:
+                continue
+            kept.append(entry)
+        kept.reverse()
+
+        if len(kept) != len(entries):
+            temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for entry in kept:
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(temp_path, self.index_path)
+
+        referenced = {entry['sha256'] for entry in kept}
+        objects_removed = 0
+        bytes_reclaimed = 0
+        if os.path.isdir(self.objects_dir):
+            for bucket in os.scandir(self.objects_dir):
+                if not bucket.is_dir():
+                    continue
+                for item in os.scandir(bucket.path):
+                    digest, extension = os.path.splitext(item.name)
+                    if extension != ".pdf" or digest in referenced:
+                        continue
+                    bytes_reclaimed += item.stat().st_size
+                    os.remove(item.path)
+                    objects_removed += 1
+
+        return {
+            'entries_removed': len(entries) - len(kept),
+            'objects_removed': objects_removed,
+            'bytes_reclaimed': bytes_reclaimed,
+        }
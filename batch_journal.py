@@ -0,0 +1,162 @@
+"""
+Progress journal for resumable PDF Password Manager batches.
+
+The journal is an append-only JSON Lines file with one record per file
+processed:
+
+    {"time": ..., "operation": "remove", "input": "/abs/in.pdf", "size": 1234,
+     "mtime_ns": ..., "sha256": "...", "output": "/abs/out.pdf", "params": "...",
+     "success": true}
+
+Each record is one write followed by a flush, so the journal can be
+followed with ``tail -f`` while a batch runs. A crash loses at most the
+line being written, and a torn last line is ignored when the journal is
+loaded. A file counts as completed when its latest record succeeded, its
+size and modification time are unchanged and its output still exists.
+``params`` is a fingerprint of the settings the output was made with.
+"""
+
+import json
+import os
+from collections import namedtuple
+from datetime import datetime
+
+from backup_store import file_digest
+
+# The last successful record for a file, as returned by BatchJournal.latest()
+CompletedRecord = namedtuple('CompletedRecord', 'size mtime_ns output sha256 params')
+
+
+def fingerprint(path, content_hash=True):
+    """Return the size, mtime_ns and (optionally) SHA-256 recorded for an input file."""
+    stat = os.stat(path)
+    info = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': None}
+    if content_hash:
+        info['sha256'] = file_digest(path)[0]
+    return info
+
+
+class AppendLog:
+    """An append-only JSON Lines file whose records are loaded back through _remember() when it is opened.
+
+    Subclasses set up the state _remember() fills before calling
+    AppendLog.__init__ and add records with _append().
+    """
+
+    def __init__(self, path, sync=False):
+        """Open the log at path, loading any records already in it.
+
+        :param sync: fsync after every record instead of only on close.
+        """
+        self.path = path
+        self.sync = sync
+        torn = self._load()
+        self._file = open(path, "a", encoding="utf-8")
+        if torn:
+            # Start a fresh line after a record cut short by a crash
+            self._file.write("\n")
+
+    def _load(self):
+        """Replay the records in the log; return whether its last line is torn."""
+        torn = False
+        if not os.path.exists(self.path):
+            return torn
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                torn = not line.endswith("\n")
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._remember(record)
+        return torn
+
+    def _remember(self, record):
+        raise NotImplementedError
+
+    def _append(self, record):
+        """Write one record as a single line, flush it and remember it."""
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+        self._remember(record)
+
+    def close(self):
+        """Flush the log to disk and close it."""
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BatchJournal(AppendLog):
+    """Append per-file results to a journal and answer whether a file is already done."""
+
+    def __init__(self, path, sync=False):
+        """Open the journal at path, loading any records already in it.
+
+        :param sync: fsync after every record instead of only on close.
+        """
+        self._completed = {}
+        super().__init__(path, sync)
+
+    def _remember(self, record):
+        key = (record['operation'], record['input'])
+        if record['success']:
+            self._completed[key] = CompletedRecord(record['size'], record['mtime_ns'], record['output'],
+                                                   record.get('sha256'), record.get('params'))
+        else:
+            self._completed.pop(key, None)
+
+    def __len__(self):
+        return len(self._completed)
+
+    def is_complete(self, operation, input_path):
+        """Return whether input_path was already processed successfully and has not changed since."""
+        done = self._completed.get((operation, os.path.abspath(input_path)))
+        if done is None:
+            return False
+        try:
+            stat = os.stat(input_path)
+        except OSError:
+            return False
+        if (stat.st_size, stat.st_mtime_ns) != (done.size, done.mtime_ns):
+            return False
+        return done.output is None or os.path.exists(done.output)
+
+    def latest(self, operation, input_path):
+        """Return the CompletedRecord of the last successful record for a file, or None."""
+        return self._completed.get((operation, os.path.abspath(input_path)))
+
+    def record(self, operation, input_path, output_path, success, info=None, params=None):
+        """Append the result for one file.
+
+        :param info: The input's fingerprint() taken before processing; the file is statted now if omitted.
+        :param params: Fingerprint of the processing parameters.
+        """
+        if info is None:
+            try:
+                info = fingerprint(input_path, content_hash=False)
+            except OSError:
+                info = {'size': None, 'mtime_ns': None, 'sha256': None}
+        written = success and output_path is not None and os.path.exists(output_path)
+        record = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'operation': operation,
+            'input': os.path.abspath(input_path),
+            'size': info['size'],
+            'mtime_ns': info['mtime_ns'],
+            'sha256': info['sha256'],
+            'output': os.path.abspath(output_path) if written else None,
+            'params': params,
+            'success': bool(success),
+        }
+        self._append(record)
@@ -0,0 +1,236 @@
+"""
+Three-stage batch pipeline for PDF Password Manager.
+
+A Pipeline runs every item through a read, a transform and a write stage,
+each on its own threads, so reading one file from disk (or NFS), working
+on another and writing a third all happen at once. The stages are joined
+by bounded StageQueues: a stage that runs ahead blocks once a few items
+are waiting for the next one, so memory stays bounded however many items
+there are.
+
+Each queue records how full it ran. A queue that stays near full means
+the stage after it is the bottleneck; one that stays near empty means the
+stage before it is.
+"""
+
+import collections
+import logging
+import os
+import threading
+import time
+
+# Bytes read per call when prefetching a file
+PREFETCH_CHUNK_SIZE = 1024 * 1024
+
+
+def prefetch_file(path):
+    """Read a file into the page cache, so that opening or mapping it later does not wait on storage.
+
+    posix_fadvise(WILLNEED) has the kernel start reading the whole file at
+    once; the file is then read through and discarded, so this returns once
+    it is cached. Errors are left to the stage that processes the file.
+    """
+    try:
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            buffer = bytearray(PREFETCH_CHUNK_SIZE)
+            while f.readinto(buffer):
+                pass
+    except OSError as e:
+        logging.debug(f"Cannot prefetch {path}: {e}")
+
+
+class StageQueue:
+    """Bounded FIFO between two pipeline stages that records how full it runs."""
+
+    def __init__(self, name, maxsize, producers=1):
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.max_depth = 0
+        # Thread-seconds producers spent blocked on a full queue and consumers on an empty one
+        self.put_wait = 0.0
+        self.get_wait = 0.0
+        self._items = collections.deque()
+        self._producers = producers
+        self._aborted = False
+        self._condition = threading.Condition()
+        self._started = self._changed = time.monotonic()
+        self._depth_seconds = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    def _account(self):
+        """Add the time since the last change at the current depth; the lock is held."""
+        now = time.monotonic()
+        self._depth_seconds += len(self._items) * (now - self._changed)
+        self._changed = now
+
+    def put(self, item):
+        """Append item, waiting while the queue is full; return False if the pipeline was aborted."""
+        with self._condition:
+            if len(self._items) >= self.maxsize and not self._aborted:
+                start = time.monotonic()
+                while len(self._items) >= self.maxsize and not self._aborted:
+                    self._condition.wait()
+                self.put_wait += time.monotonic() - start
+            if self._aborted:
+                return False
+            self._account()
+            self._items.append(item)
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._condition.notify_all()
+            return True
+
+    def get(self):
+        """Remove and return the oldest item, waiting while the queue is empty.
+
+        Returns None once every producer is done and the queue is drained, or
+        when the pipeline was aborted.
+        """
+        with self._condition:
+            if not self._items and self._producers and not self._aborted:
+                start = time.monotonic()
+                while not self._items and self._producers and not self._aborted:
+                    self._condition.wait()
+                self.get_wait += time.monotonic() - start
+            if self._aborted or not self._items:
+                return None
+            self._account()
+            item = self._items.popleft()
+            self._condition.notify_all()
+            return item
+
+    def producer_done(self):
+        """Note that one producer will put no more items."""
+        with self._condition:
+            self._producers -= 1
+            self._condition.notify_all()
+
+    def abort(self):
+        """Wake every waiting thread; puts and gets fail from now on."""
+        with self._condition:
+            self._aborted = True
+            self._condition.notify_all()
+
+    def stats(self):
+        """Return the queue's name, size, time-weighted mean and maximum depth, and wait times."""
+        with self._condition:
+            self._account()
+            elapsed = self._changed - self._started
+            return {
+                'queue': self.name,
+                'size': self.maxsize,
+                'mean_depth': self._depth_seconds / elapsed if elapsed > 0 else 0.0,
+                'max_depth': self.max_depth,
+                'put_wait': self.put_wait,
+                'get_wait': self.get_wait,
+            }
+
+
+class Pipeline:
+    """Run items through read, transform and write functions on separate thread pools.
+
+    read(item) runs on read_threads threads, transform() on its result on
+    transform_threads threads and write() on that on write_threads threads.
+    Each of the two queues between the stages holds at most queue_size
+    values. An exception escaping a stage, or the item iterable, stops the
+    pipeline and is raised by run().
+    """
+
+    def __init__(self, read, transform, write, read_threads=1, transform_threads=1, write_threads=1, queue_size=1):
+        self.stages = ((read, read_threads), (transform, transform_threads), (write, write_threads))
+        # Named after the stage that consumes them
+        self.queues = (StageQueue('transform', queue_size, read_threads),
+                       StageQueue('write', queue_size, transform_threads))
+
+    def stats(self):
+        """Return StageQueue.stats() for both queues."""
+        return [queue.stats() for queue in self.queues]
+
+    def run(self, items):
+        """Yield write()'s result for every item, in completion order."""
+        items = iter(items)
+        items_lock = threading.Lock()
+        finished = collections.deque()
+        finished_ready = threading.Condition()
+        errors = []
+        (read, read_threads), (transform, transform_threads), (write, write_threads) = self.stages
+        to_transform, to_write = self.queues
+        writers_left = write_threads
+
+        def abort(error):
+            errors.append(error)
+            for queue in self.queues:
+                queue.abort()
+
+        def next_item():
+            with items_lock:
+                return next(items)
+
+        def reader():
+            try:
+                while True:
+                    try:
+                        item = next_item()
+                    except StopIteration:
+                        return
+                    if not to_transform.put(read(item)):
+                        return
+            except BaseException as e:
+                abort(e)
+            finally:
+                to_transform.producer_done()
+
+        def transformer():
+            try:
+                while True:
+                    value = to_transform.get()
+                    if value is None or not to_write.put(transform(value)):
+                        return
+            except BaseException as e:
+                abort(e)
+            finally:
+                to_write.producer_done()
+
+        def writer():
+            nonlocal writers_left
+            try:
+                while True:
+                    value = to_write.get()
+                    if value is None:
+                        return
+                    result = write(value)
+                    with finished_ready:
+                        finished.append(result)
+                        finished_ready.notify()
+            except BaseException as e:
+                abort(e)
+            finally:
+                with finished_ready:
+                    writers_left -= 1
+                    finished_ready.notify()
+
+        threads = [threading.Thread(target=target, daemon=True)
+                   for target, count in ((reader, read_threads), (transformer, transform_threads), (writer, write_threads))
+                   for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                with finished_ready:
+                    while not finished and writers_left:
+                        finished_ready.wait()
+                    if not finished:
+                        break
+                    result = finished.popleft()
+                yield result
+        finally:
+            # Stopped early, failed or interrupted: let every stage finish the item it holds and exit
+            for queue in self.queues:
+                queue.abort()
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark for document copying in PDF Password Manager.
+Compares the whole-document clone against page-by-page add_page copying.
+Run with: python benchmarks/bench_document_copy.py --pages 2000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, NameObject
+
+from remove_pdf_password import _clone_document, _copy_pages
+
+def build_document(pages, password):
+    """Build an encrypted test document with a small content stream on every page."""
+    writer = PdfWriter()
+    for i in range(pages):
+        writer.add_blank_page(width=612, height=792)
+        page = writer.pages[-1]
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 72 720 Td (Page {i + 1}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+    writer.add_outline_item("Start", 0)
+    writer.encrypt(user_password=password, owner_password=password, use_128bit=True)
+    
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+def time_copy(copy_func, data, password, repeat):
+    """Return the best wall time for decrypting, copying and writing the document."""
+    best = None
+    for _ in range(repeat):
+        reader = PdfReader(io.BytesIO(data))
+        reader.decrypt(password)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            writer = copy_func(reader)
+        writer.write(io.BytesIO())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark whole-document clone vs per-page copying.")
+    parser.add_argument("--pages", type=int, default=1000, help="Number of pages in the test document.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per method (best is reported).")
+    args = parser.parse_args()
+    
+    password = "benchmark"
+    data = build_document(args.pages, password)
+    print(f"Test document: {args.pages} pages, {len(data) / 1024:.0f} KiB")
+    
+    results = {}
+    for name, func in (("per-page add_page", _copy_pages), ("whole-document clone", _clone_document)):
+        elapsed = time_copy(func, data, password, args.repeat)
+        results[name] = elapsed
+        print(f"{name:>22}: {elapsed:.3f}s  ({args.pages / elapsed:,.0f} pages/s)")
+    
+    speedup = results["per-page add_page"] / results["whole-document clone"]
+    print(f"Speedup: {speedup:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the header-only encryption probe in PDF Password Manager.
+Compares probe_pdf against building a PdfReader for every file in a directory.
+Run with: python benchmarks/bench_probe.py --files 500 --pages 200
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader, PdfWriter
+
+from pdf_probe import probe_pdf
+
+def build_directory(directory, files, pages):
+    """Write files copies of a document, every other one encrypted."""
+    for protected in (False, True):
+        writer = PdfWriter()
+        for _ in range(pages):
+            writer.add_blank_page(width=612, height=792)
+        if protected:
+            writer.encrypt(user_password="benchmark", owner_password="benchmark", use_128bit=True)
+        with open(os.path.join(directory, f"template_{int(protected)}.pdf"), "wb") as f:
+            writer.write(f)
+
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, f"doc_{i:06d}.pdf")
+        shutil.copyfile(os.path.join(directory, f"template_{i % 2}.pdf"), path)
+        paths.append(path)
+    return paths
+
+def full_parse(path):
+    return PdfReader(path).is_encrypted
+
+def time_scan(func, paths):
+    start = time.perf_counter()
+    for path in paths:
+        func(path)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the encryption probe against full PdfReader parsing.")
+    parser.add_argument("--files", type=int, default=500, help="Number of files in the test directory.")
+    parser.add_argument("--pages", type=int, default=200, help="Number of pages per file.")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = build_directory(directory, args.files, args.pages)
+        print(f"Test directory: {args.files} files of {args.pages} pages")
+
+        results = {}
+        for name, func in (("PdfReader", full_parse),
+                           ("probe", lambda path: probe_pdf(path, count_pages=False)),
+                           ("probe + page count", probe_pdf)):
+            elapsed = time_scan(func, paths)
+            results[name] = elapsed
+            print(f"{name:>18}: {elapsed:.3f}s  ({args.files / elapsed:,.0f} files/s)")
+
+        print(f"Probe time as a fraction of PdfReader: {results['probe'] / results['PdfReader']:.1%}")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
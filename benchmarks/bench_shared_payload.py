@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark for handing in-memory PDFs to worker processes in PDF Password Manager.
+Compares pickling the payload through the pool's pipe against shared-memory segments.
+Run with: python benchmarks/bench_shared_payload.py --sizes 10,100,1024 --rounds 3
+"""
+
+import argparse
+import io
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfWriter
+from PyPDF2.generic import NameObject, StreamObject
+
+from remove_pdf_password import remove_password_bytes
+from shared_payload import make_shared_executor, submit_shared
+
+# Size of each page's (incompressible) content stream
+STREAM_SIZE = 1024 * 1024
+
+def build_document(size_mb):
+    """Return an encrypted PDF of about size_mb megabytes."""
+    writer = PdfWriter()
+    for i in range(max(1, size_mb * 1024 * 1024 // STREAM_SIZE)):
+        writer.add_blank_page(width=612, height=792)
+        stream = StreamObject()
+        stream._data = os.urandom(STREAM_SIZE)
+        writer.pages[i][NameObject("/Contents")] = writer._add_object(stream)
+    writer.encrypt(user_password="benchmark", owner_password="benchmark", use_128bit=True)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+def pickled(executor, data):
+    return len(executor.submit(remove_password_bytes, data, "benchmark").result())
+
+def shared(executor, data):
+    with submit_shared(executor, "remove", data, "benchmark").result() as result:
+        return result.size
+
+def peak_rss_mb():
+    """Return the peak RSS of the calling process in MB (Linux reports ru_maxrss in KB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pickled against shared-memory payload transfer.")
+    parser.add_argument("--sizes", default="10,100", help="Comma-separated document sizes in MB.")
+    parser.add_argument("--rounds", type=int, default=3, help="Jobs per size and method.")
+    args = parser.parse_args()
+
+    for size_mb in (int(size) for size in args.sizes.split(",")):
+        data = build_document(size_mb)
+        print(f"Document: {len(data) / 1024 / 1024:.0f} MB")
+        for name, func in (("pickled", pickled), ("shared memory", shared)):
+            # A fresh worker per method, so its peak RSS belongs to that method alone
+            with make_shared_executor(1) as executor:
+                executor.submit(int).result()
+                start = time.perf_counter()
+                for _ in range(args.rounds):
+                    func(executor, data)
+                elapsed = (time.perf_counter() - start) / args.rounds
+                worker_peak = executor.submit(peak_rss_mb).result()
+            print(f"{name:>14}: {elapsed:.3f}s per job  (worker peak RSS {worker_peak} MB)")
+        del data
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Lazy input discovery for PDF Password Manager.
+
+Inputs may be files or directories, given on the command line or read
+from a list file (one path per line, or NUL-separated as produced by
+``find -print0``). Directories are walked with os.scandir() as files are
+consumed, so the first file can be processed before discovery finishes
+and memory does not grow with the number of files found.
+
+Include/exclude patterns without a "/" match the file name only; other
+patterns match the whole path. Excluded names also prune directories.
+"""
+
+import fnmatch
+import logging
+import os
+import sys
+
+# Bytes read at a time from a NUL-separated list
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def matches(path, patterns):
+    """Return whether path matches any of the glob patterns."""
+    name = os.path.basename(path)
+    for pattern in patterns:
+        if '/' in pattern or os.sep in pattern:
+            if fnmatch.fnmatchcase(path, pattern):
+                return True
+        elif fnmatch.fnmatchcase(name, pattern):
+            return True
+    return False
+
+
+def read_file_list(source, null_separated=False):
+    """Yield the paths listed in source ('-' for standard input) as they are read.
+
+    :param null_separated: Paths are separated by NUL bytes instead of newlines.
+    """
+    stream = sys.stdin.buffer if source == '-' else open(source, "rb")
+    try:
+        if not null_separated:
+            for line in stream:
+                path = line.rstrip(b"\r\n")
+                if path:
+                    yield os.fsdecode(path)
+            return
+
+        remainder = b""
+        while True:
+            chunk = stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            parts = (remainder + chunk).split(b"\0")
+            remainder = parts.pop()
+            for path in parts:
+                if path:
+                    yield os.fsdecode(path)
+        if remainder.strip(b"\r\n"):
+            yield os.fsdecode(remainder.rstrip(b"\r\n"))
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+def _walk(directory, recursive, exclude):
+    """Yield the PDF files in directory, descending into subdirectories when recursive."""
+    try:
+        entries = os.scandir(directory)
+    except OSError as e:
+        # Unreadable directories are reported and skipped, like find(1)
+        logging.warning(f"Cannot read directory {directory}: {e.strerror}")
+        return
+    with entries:
+        for entry in entries:
+            if exclude and matches(entry.path, exclude):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        yield from _walk(entry.path, recursive, exclude)
+                elif entry.name.lower().endswith('.pdf') and entry.is_file():
+                    yield entry.path
+            except OSError:
+                continue
+
+
+def iter_input_files(paths, recursive=False, include=None, exclude=None):
+    """Yield the files named by paths, expanding directories to the PDFs in them.
+
+    :param paths: Any iterable of file and directory paths; it is consumed lazily.
+    :param recursive: Also walk subdirectories.
+    :param include: Glob patterns a file must match (any of them), if given.
+    :param exclude: Glob patterns of files and directories to skip.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = _walk(path, recursive, exclude)
+        elif exclude and matches(path, exclude):
+            continue
+        else:
+            candidates = (path,)
+        for candidate in candidates:
+            if include and not matches(candidate, include):
+                continue
+            yield candidate
@@ -0,0 +1,390 @@
+"""
+Local HTTP job service for PDF Password Manager.
+
+Runs add/remove/rekey/inspect jobs on a warm process pool so other
+services avoid paying interpreter start-up and PyPDF2 import per
+document. A job that overruns the job timeout is killed together with
+its worker, and a worker that crashes fails only its own request; either
+way a fresh worker takes its place. Endpoints:
+
+    POST /remove, /add, /rekey   body: the PDF (Content-Length or chunked)
+                                 response: the resulting PDF
+    POST /inspect                body: the PDF; response: JSON probe record
+    GET  /health                 liveness check
+    GET  /metrics                JSON counters
+
+Credentials are passed in headers so they stay out of URLs and access
+logs: X-PDF-Password, X-PDF-Owner-Password, X-PDF-New-Password and
+X-PDF-Permissions (e.g. "print,copy"). When the service is started with
+a path root, a JSON body {"path": ..., "output": ..., "password": ...}
+processes a local file under that root instead of an upload.
+
+The service binds to localhost by default and has no authentication.
+"""
+
+import json
+import logging
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from isolated_pool import IsolatedPool, TaskTimeoutError, WorkerCrashedError
+from password_map import PERMISSION_NAMES, parse_permissions
+from remove_pdf_password import OUTPUT_PREFIXES, init_batch_worker, inspect_file, process_file_worker, stop_on_sigterm
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Seconds a job may run before it is killed and the request fails with 504
+DEFAULT_JOB_TIMEOUT = 300
+# Seconds a client may stall while sending its request
+DEFAULT_REQUEST_TIMEOUT = 60
+# Largest accepted upload
+DEFAULT_MAX_UPLOAD = 512 * 1024 * 1024
+# Bytes copied at a time between sockets and files
+CHUNK_SIZE = 64 * 1024
+
+_CREDENTIAL_HEADERS = {
+    'password': 'X-PDF-Password',
+    'owner_password': 'X-PDF-Owner-Password',
+    'new_password': 'X-PDF-New-Password',
+    'permissions': 'X-PDF-Permissions',
+}
+
+
+class RequestError(Exception):
+    """Raised to answer a request with an error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class JobService:
+    """Warm worker pool, concurrency limit and metrics shared by all requests."""
+
+    def __init__(self, jobs=1, max_concurrent=None, job_timeout=DEFAULT_JOB_TIMEOUT,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT, max_upload=DEFAULT_MAX_UPLOAD,
+                 engine='auto', durability='none', keyring=None, backup_root=None, path_root=None):
+        self.jobs = jobs
+        self.max_concurrent = max_concurrent or jobs * 2
+        self.job_timeout = job_timeout
+        self.request_timeout = request_timeout
+        self.max_upload = max_upload
+        self.engine = engine
+        self.durability = durability
+        self.path_root = os.path.realpath(path_root) if path_root else None
+        self.executor = IsolatedPool(jobs, job_timeout, init_batch_worker, (keyring, backup_root))
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._metrics = {
+            'requests': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'rejected_busy': 0,
+            'timed_out': 0,
+            'crashed': 0,
+            'in_flight': 0,
+            'bytes_received': 0,
+            'bytes_sent': 0,
+            'key_cache_hits': 0,
+            'key_cache_misses': 0,
+        }
+        # Start the workers now so the first request does not pay for it
+        for future in [self.executor.submit(os.getpid) for _ in range(jobs)]:
+            future.result()
+
+    def count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._metrics[name] += delta
+
+    def metrics(self):
+        """Return a snapshot of the counters."""
+        with self._lock:
+            snapshot = dict(self._metrics)
+        snapshot.update({
+            'workers': self.jobs,
+            'max_concurrent': self.max_concurrent,
+            'uptime_seconds': round(time.monotonic() - self._started, 3),
+        })
+        return snapshot
+
+    def acquire(self):
+        """Take a job slot, or return False if the service is at its concurrency limit."""
+        if not self._slots.acquire(blocking=False):
+            self.count(rejected_busy=1)
+            return False
+        self.count(in_flight=1)
+        return True
+
+    def release(self):
+        self.count(in_flight=-1)
+        self._slots.release()
+
+    def run(self, func, *args):
+        """Run func on the pool and return its result; a job overrunning the timeout is killed."""
+        try:
+            return self.executor.submit(func, *args).result()
+        except TaskTimeoutError:
+            self.count(timed_out=1)
+            raise RequestError(504, f"job did not finish within {self.job_timeout:g} seconds")
+        except WorkerCrashedError as e:
+            self.count(crashed=1)
+            logging.error(f"Job worker crashed: {e}")
+            raise RequestError(500, "worker crashed while processing the job")
+        except Exception as e:
+            logging.error(f"Job failed: {e!r}")
+            raise RequestError(500, "job failed unexpectedly")
+
+    def resolve_path(self, path):
+        """Return the real path of a local input, which must lie under the path root."""
+        if self.path_root is None:
+            raise RequestError(403, "local paths are not enabled on this service")
+        real = os.path.realpath(path)
+        if os.path.commonpath([real, self.path_root]) != self.path_root:
+            raise RequestError(403, "path is outside the allowed root")
+        return real
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """Request handler; the JobService is attached to the server as .service."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "PDFPasswordManager/2.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def setup(self):
+        self.timeout = self.server.service.request_timeout
+        super().setup()
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} - {format % args}")
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.service.count(bytes_sent=len(data))
+
+    def send_file(self, path):
+        size = os.path.getsize(path)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        with open(path, "rb") as f:
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+        self.service.count(bytes_sent=size)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {'status': 'ok'})
+        elif self.path == "/metrics":
+            self.send_json(200, self.service.metrics())
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        operation = self.path.strip("/")
+        if operation not in OUTPUT_PREFIXES and operation != 'inspect':
+            self.drain_body()
+            self.send_json(404, {'error': 'not found'})
+            return
+        self.service.count(requests=1)
+        if not self.service.acquire():
+            self.drain_body()
+            self.send_response(503)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        work_dir = tempfile.mkdtemp(prefix="pdfpm-")
+        try:
+            self.handle_job(operation, work_dir)
+        except RequestError as e:
+            self.service.count(failed=1)
+            self.close_connection = True
+            self.send_json(e.status, {'success': False, 'error': str(e)})
+        except Exception as e:
+            logging.error(f"Request failed: {e!r}")
+            self.service.count(failed=1)
+            self.close_connection = True
+            self.send_json(500, {'success': False, 'error': 'internal error'})
+        finally:
+            self.service.release()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def handle_job(self, operation, work_dir):
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            request = self.read_json()
+            input_file = self.service.resolve_path(str(request.get('path', '')))
+            output_file = request.get('output')
+            if output_file:
+                output_dir = self.service.resolve_path(os.path.dirname(os.path.abspath(str(output_file))))
+                output_file = os.path.join(output_dir, os.path.basename(str(output_file)))
+            elif operation != 'inspect':
+                output_file = os.path.join(os.path.dirname(input_file),
+                                           f"{OUTPUT_PREFIXES[operation]}{os.path.basename(input_file)}")
+            credentials = request
+            upload = False
+        else:
+            input_file = os.path.join(work_dir, "input.pdf")
+            self.receive_upload(input_file)
+            output_file = os.path.join(work_dir, "output.pdf")
+            credentials = {field: self.headers.get(header) for field, header in _CREDENTIAL_HEADERS.items()}
+            upload = True
+
+        if operation == 'inspect':
+            record = self.service.run(inspect_file, input_file)
+            if upload:
+                record.pop('path', None)
+            if 'error' in record:
+                self.service.count(failed=1)
+                self.send_json(422, record)
+            else:
+                self.service.count(succeeded=1)
+                self.send_json(200, record)
+            return
+
+        try:
+            permissions = parse_permissions(credentials.get('permissions'))
+        except ValueError as e:
+            raise RequestError(400, f"{e} (known: {', '.join(PERMISSION_NAMES)})")
+        if operation == 'add' and permissions is None:
+            permissions = {name: True for name in PERMISSION_NAMES}
+        options = {
+            'backup': not upload,
+            'overwrite': upload or bool(credentials.get('overwrite')),
+            'owner_password': credentials.get('owner_password') or None,
+            'permissions': permissions,
+            'engine': self.service.engine,
+            'durability': 'none' if upload else self.service.durability,
+            'new_password': credentials.get('new_password') or None,
+        }
+        result = self.service.run(process_file_worker, operation, input_file, output_file,
+                                  credentials.get('password') or None, options)
+        self.service.count(key_cache_hits=result['key_cache'][0], key_cache_misses=result['key_cache'][1])
+
+        if not result['success']:
+            self.service.count(failed=1)
+            self.send_json(422, {'success': False, 'messages': result['messages']})
+            return
+        self.service.count(succeeded=1)
+        if not upload:
+            self.send_json(200, {'success': True, 'output': output_file, 'messages': result['messages']})
+        else:
+            # Removing the password of an unprotected PDF writes nothing: the input is the result
+            self.send_file(output_file if os.path.exists(output_file) else input_file)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > CHUNK_SIZE:
+            raise RequestError(413, "JSON request too large")
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            raise RequestError(400, f"invalid JSON: {e}")
+        if not isinstance(request, dict):
+            raise RequestError(400, "expected a JSON object")
+        self.service.count(bytes_received=length)
+        return request
+
+    def iter_body(self):
+        """Yield the request body in chunks, decoding chunked transfer encoding."""
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    # Skip trailers
+                    while self.rfile.readline().strip():
+                        pass
+                    return
+                remaining = size
+                while remaining:
+                    data = self.rfile.read(min(remaining, CHUNK_SIZE))
+                    if not data:
+                        raise RequestError(400, "truncated request body")
+                    remaining -= len(data)
+                    yield data
+                self.rfile.readline()
+        else:
+            length = self.headers.get("Content-Length")
+            if length is None:
+                raise RequestError(411, "Content-Length or chunked transfer encoding required")
+            remaining = int(length)
+            if remaining > self.service.max_upload:
+                raise RequestError(413, "upload too large")
+            while remaining:
+                data = self.rfile.read(min(remaining, CHUNK_SIZE))
+                if not data:
+                    raise RequestError(400, "truncated request body")
+                remaining -= len(data)
+                yield data
+
+    def receive_upload(self, path):
+        """Stream the request body into path without holding it in memory."""
+        received = 0
+        try:
+            with open(path, "wb") as f:
+                for data in self.iter_body():
+                    received += len(data)
+                    if received > self.service.max_upload:
+                        raise RequestError(413, "upload too large")
+                    f.write(data)
+        except (OSError, ValueError) as e:
+            raise RequestError(400, f"cannot read upload: {e}")
+        finally:
+            self.service.count(bytes_received=received)
+
+    def drain_body(self):
+        """Discard a request body that will not be used, so the connection can be reused."""
+        try:
+            for _ in self.iter_body():
+                pass
+        except (RequestError, OSError, ValueError):
+            self.close_connection = True
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Return a ThreadingHTTPServer bound to host:port that runs jobs on service."""
+    server = ThreadingHTTPServer((host, port), JobRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, **service_options):
+    """Run the job service until interrupted."""
+    service = JobService(**service_options)
+    try:
+        server = make_server(service, host, port)
+    except BaseException:
+        service.close()
+        raise
+    previous_handler = signal.signal(signal.SIGTERM, stop_on_sigterm)
+    address, bound_port = server.server_address[:2]
+    logging.info(f"Job service listening on http://{address}:{bound_port}")
+    print(f"Listening on http://{address}:{bound_port} with {service.jobs} workers (press Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping job service...")
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+        server.server_close()
+        service.close()
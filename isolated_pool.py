@@ -0,0 +1,213 @@
+"""
+Process pool with per-task timeouts for PDF Password Manager (--file-timeout).
+
+concurrent.futures.ProcessPoolExecutor cannot stop one task: a worker
+stuck in a pathological PDF keeps its slot until it finishes, and a
+worker that dies breaks the whole pool. IsolatedPool runs each task in
+one of its own worker processes. A task that overruns the timeout is
+killed together with its worker, and a worker that crashes (a segfault,
+or the OOM killer) fails only its own task. Either way a fresh worker
+takes the slot, so the rest of the batch carries on.
+
+submit() returns a concurrent.futures.Future, so the pool can be used
+with wait() and as_completed() like an executor.
+"""
+
+import collections
+import multiprocessing
+import multiprocessing.connection
+import threading
+import time
+from concurrent.futures import Future
+
+
+class TaskTimeoutError(Exception):
+    """Raised by the future of a task that was killed for overrunning the timeout.
+
+    pid is the process id of the killed worker, so the caller can clean up
+    files it named after it.
+    """
+
+    def __init__(self, message, pid=None):
+        super().__init__(message)
+        self.pid = pid
+
+
+class WorkerCrashedError(Exception):
+    """Raised by the future of a task whose worker process died; pid is the dead worker's."""
+
+    def __init__(self, message, pid=None):
+        super().__init__(message)
+        self.pid = pid
+
+
+def _worker_main(connection, initializer, initargs):
+    """Run tasks received on connection until told to stop."""
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        func, args = task
+        try:
+            reply = (True, func(*args))
+        except BaseException as e:
+            reply = (False, e)
+        try:
+            connection.send(reply)
+        except Exception as e:
+            # The result or exception could not be pickled
+            connection.send((False, RuntimeError(f"cannot return task result: {e!r}")))
+
+
+class _Worker:
+    """One worker process and the task it is running."""
+
+    def __init__(self, initializer, initargs):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child_connection, initializer, initargs),
+                                               daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.future = None
+        self.deadline = None
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join()
+        self.connection.close()
+
+
+class IsolatedPool:
+    """Run tasks in worker processes, killing and replacing a worker whose task overruns timeout seconds."""
+
+    def __init__(self, max_workers, timeout=None, initializer=None, initargs=()):
+        self.timeout = timeout
+        self._initializer = initializer
+        self._initargs = initargs
+        self._workers = [_Worker(initializer, initargs) for _ in range(max_workers)]
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._shutdown = False
+        self._wakeup_reader, self._wakeup_writer = multiprocessing.Pipe(duplex=False)
+        self._manager = threading.Thread(target=self._manage, daemon=True)
+        self._manager.start()
+
+    def submit(self, func, *args):
+        """Queue func(*args) and return a Future for its result."""
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit to a pool that was shut down")
+            self._queue.append((future, func, args))
+        self._wakeup_writer.send(None)
+        return future
+
+    def shutdown(self, wait=True):
+        """Stop the workers once every queued task is done; with wait, block until then."""
+        with self._lock:
+            self._shutdown = True
+        self._wakeup_writer.send(None)
+        if wait:
+            self._manager.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def _replace(self, worker):
+        self._workers[self._workers.index(worker)] = _Worker(self._initializer, self._initargs)
+
+    def _send(self, index, func, args):
+        """Send a task to the worker in slot index and return it.
+
+        An idle worker can die unnoticed (the OOM killer, say); it is
+        replaced and the task sent to the new worker instead.
+        """
+        worker = self._workers[index]
+        try:
+            worker.connection.send((func, args))
+        except OSError:
+            worker.kill()
+            self._replace(worker)
+            worker = self._workers[index]
+            worker.connection.send((func, args))
+        return worker
+
+    def _dispatch(self):
+        """Hand queued tasks to idle workers; return whether the pool is done."""
+        with self._lock:
+            for index in range(len(self._workers)):
+                while self._workers[index].future is None and self._queue:
+                    future, func, args = self._queue.popleft()
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        worker = self._send(index, func, args)
+                    except Exception as e:
+                        future.set_exception(e)
+                        continue
+                    worker.future = future
+                    worker.deadline = time.monotonic() + self.timeout if self.timeout else None
+            return self._shutdown and not self._queue and all(worker.future is None for worker in self._workers)
+
+    def _finish(self, worker, ready):
+        """Complete worker's task if it replied, died or overran its deadline."""
+        future = worker.future
+        crashed = worker.process.sentinel in ready
+        if worker.connection in ready:
+            try:
+                succeeded, value = worker.connection.recv()
+            except (EOFError, OSError):
+                crashed = True
+            else:
+                worker.future = None
+                if succeeded:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+                return
+        if crashed:
+            worker.kill()
+            future.set_exception(WorkerCrashedError(f"worker process exited with code {worker.process.exitcode}",
+                                                    worker.process.pid))
+        elif worker.deadline is not None and time.monotonic() >= worker.deadline:
+            worker.kill()
+            future.set_exception(TaskTimeoutError(f"task did not finish within {self.timeout:g} seconds",
+                                                  worker.process.pid))
+        else:
+            return
+        self._replace(worker)
+
+    def _manage(self):
+        try:
+            while not self._dispatch():
+                busy = [worker for worker in self._workers if worker.future is not None]
+                waitables = [self._wakeup_reader]
+                for worker in busy:
+                    waitables += [worker.connection, worker.process.sentinel]
+                deadlines = [worker.deadline for worker in busy if worker.deadline is not None]
+                timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+                ready = multiprocessing.connection.wait(waitables, timeout)
+                if self._wakeup_reader in ready:
+                    while self._wakeup_reader.poll():
+                        self._wakeup_reader.recv()
+                for worker in busy:
+                    self._finish(worker, ready)
+        finally:
+            for worker in self._workers:
+                worker.stop()
@@ -0,0 +1,96 @@
+"""
+Derived-key cache for AES-256 PDF documents.
+
+Revision 5/6 security handlers derive the file key from the password with
+an iterated SHA-2 hash that costs milliseconds per attempt. Documents made
+by one producer often share the password and the /O, /U, /OE and /UE
+values, so the key derived for one can be reused for the next.
+
+The cache is memory-only and per process, and may be shared by threads.
+Passwords are kept only as an HMAC under a random per-process key, and
+cached file keys are zeroed when they are evicted or the cache is cleared.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+
+# Default number of (password, handler) pairs kept
+DEFAULT_CACHE_SIZE = 256
+
+
+class DerivedKeyCache:
+    """Bounded LRU cache of verification results for AES-256 handlers."""
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._secret = os.urandom(32)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _cache_key(self, encryption, password):
+        if isinstance(password, str):
+            try:
+                password = password.encode("latin-1")
+            except UnicodeEncodeError:
+                password = password.encode("utf-8")
+        entry = encryption.entry
+        handler = tuple(entry[name].get_object().original_bytes for name in ("/O", "/U", "/OE", "/UE"))
+        return (hmac.new(self._secret, password, hashlib.sha256).digest(), encryption.algR) + handler
+
+    def _store(self, cache_key, key, password_type):
+        self._entries[cache_key] = (bytearray(key) if key else None, password_type)
+        while len(self._entries) > self.max_size:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            if evicted is not None:
+                evicted[:] = bytes(len(evicted))
+
+    def verify(self, encryption, password):
+        """Verify password like encryption.verify(), reusing a key derived for an identical handler."""
+        if encryption.algV < 5 or self.max_size <= 0:
+            return encryption.verify(password)
+
+        cache_key = self._cache_key(encryption, password)
+        with self._lock:
+            cached = self._entries.get(cache_key)
+            if cached is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                key, password_type = cached
+                if key is not None:
+                    encryption._key = bytes(key)
+                    encryption._password_type = password_type
+                return password_type
+            self.misses += 1
+
+        # Derive outside the lock so other threads are not held up
+        password_type = encryption.verify(password)
+        with self._lock:
+            self._store(cache_key, encryption._key if password_type else None, password_type)
+        return password_type
+
+    def decrypt(self, reader, password):
+        """Decrypt a PdfReader like reader.decrypt(), using the cache."""
+        if reader._encryption is None:
+            return reader.decrypt(password)
+        return self.verify(reader._encryption, password)
+
+    def stats(self):
+        """Return (hits, misses)."""
+        return self.hits, self.misses
+
+    def clear(self):
+        """Zero and drop every cached key."""
+        with self._lock:
+            for key, _ in self._entries.values():
+                if key is not None:
+                    key[:] = bytes(len(key))
+            self._entries.clear()
+
@@ -0,0 +1,198 @@
+"""
+Per-file password manifests for PDF Password Manager batches.
+
+A manifest maps file paths or glob patterns to the credentials used for
+them. Supported formats, chosen by file extension:
+
+- CSV (.csv) with a header row
+- JSON Lines (.jsonl, .ndjson), one object per line
+- JSON (.json), an array of objects (loaded in one piece; prefer JSONL
+  for very large manifests)
+
+Each record has a ``path`` (exact path or glob pattern) and any of
+``password``, ``owner_password``, ``new_password`` and ``permissions``.
+Permissions are the allowed operations, e.g. ``"print,copy"`` in CSV or
+``["print", "copy"]`` / ``{"print": true, "copy": false}`` in JSON.
+
+A keyring is a plain list of known passwords, one per line.
+"""
+
+import csv
+import fnmatch
+import glob
+import json
+import os
+import re
+import threading
+
+PERMISSION_NAMES = ('print', 'modify', 'copy', 'annotate')
+CREDENTIAL_FIELDS = ('password', 'owner_password', 'new_password', 'permissions')
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+class PasswordMapError(ValueError):
+    """Raised when a manifest record cannot be used."""
+
+
+def parse_permissions(value):
+    """Return a permissions dict from a manifest value, or None to keep the default."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, dict):
+        names = [name for name, allowed in value.items() if allowed]
+        unknown = set(value) - set(PERMISSION_NAMES)
+    else:
+        if isinstance(value, str):
+            value = [name for name in re.split(r"[\s,;|]+", value) if name]
+        names = [str(name).lower() for name in value]
+        unknown = set(names) - set(PERMISSION_NAMES)
+    if unknown:
+        raise ValueError(f"unknown permissions: {', '.join(sorted(unknown))}")
+    return {name: name in names for name in PERMISSION_NAMES}
+
+
+def _make_entry(record, source, line):
+    """Validate one raw manifest record and return its normalized entry."""
+    if not isinstance(record, dict):
+        raise PasswordMapError(f"{source}:{line}: expected an object")
+    path = record.get('path')
+    if not path:
+        raise PasswordMapError(f"{source}:{line}: missing 'path'")
+
+    entry = {'path': str(path)}
+    for field in ('password', 'owner_password', 'new_password'):
+        value = record.get(field)
+        entry[field] = str(value) if value not in (None, '') else None
+    try:
+        entry['permissions'] = parse_permissions(record.get('permissions'))
+    except ValueError as e:
+        raise PasswordMapError(f"{source}:{line}: {e}")
+    return entry
+
+
+def read_password_map(map_path):
+    """Yield manifest entries one at a time, in file order."""
+    extension = os.path.splitext(map_path)[1].lower()
+    with open(map_path, newline='' if extension == '.csv' else None, encoding='utf-8') as f:
+        if extension == '.csv':
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield _make_entry(record, map_path, reader.line_num)
+        elif extension in ('.jsonl', '.ndjson'):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    raise PasswordMapError(f"{map_path}:{line_number}: {e}")
+                yield _make_entry(record, map_path, line_number)
+        elif extension == '.json':
+            try:
+                records = json.load(f)
+            except ValueError as e:
+                raise PasswordMapError(f"{map_path}: {e}")
+            if not isinstance(records, list):
+                raise PasswordMapError(f"{map_path}: expected a JSON array")
+            for index, record in enumerate(records, 1):
+                yield _make_entry(record, map_path, index)
+        else:
+            raise PasswordMapError(f"{map_path}: unsupported manifest format (use .csv, .json or .jsonl)")
+
+
+def is_pattern(path):
+    """Return whether a manifest path is a glob pattern."""
+    return bool(_GLOB_CHARS.search(path))
+
+
+def credentials(entry):
+    """Return the credential fields of an entry."""
+    return {field: entry[field] for field in CREDENTIAL_FIELDS}
+
+
+def iter_password_map_files(entries):
+    """Yield (path, credentials) for every file named or matched by the manifest, as it is read."""
+    for entry in entries:
+        if is_pattern(entry['path']):
+            for path in glob.iglob(entry['path'], recursive=True):
+                if os.path.isfile(path):
+                    yield path, credentials(entry)
+        else:
+            yield entry['path'], credentials(entry)
+
+
+class PasswordMap:
+    """Look up the credentials for input files given on the command line.
+
+    Exact paths win over patterns; patterns are tried in manifest order.
+    Patterns without a directory separator match the file name only.
+    """
+
+    def __init__(self, entries):
+        self._exact = {}
+        self._patterns = []
+        for entry in entries:
+            if is_pattern(entry['path']):
+                self._patterns.append((entry['path'], credentials(entry)))
+            else:
+                self._exact.setdefault(os.path.normpath(entry['path']), credentials(entry))
+
+    def lookup(self, path):
+        """Return the credentials for path, or None if the manifest does not cover it."""
+        path = os.path.normpath(path)
+        found = self._exact.get(path)
+        if found is not None:
+            return found
+        name = os.path.basename(path)
+        for pattern, found in self._patterns:
+            if '/' in pattern or os.sep in pattern:
+                matched = fnmatch.fnmatchcase(path, os.path.normpath(pattern))
+            else:
+                matched = fnmatch.fnmatchcase(name, pattern)
+            if matched:
+                return found
+        return None
+
+
+class Keyring:
+    """Known passwords, tried in most-recently-successful order.
+
+    Candidates are checked with a handler's verify() against the /U and /O
+    entries only, so a wrong candidate costs a few hashes, not a parse.
+    """
+
+    def __init__(self, passwords):
+        self._passwords = list(dict.fromkeys(password for password in passwords if password))
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'_passwords': self._passwords}
+
+    def __setstate__(self, state):
+        self._passwords = state['_passwords']
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a keyring with one password per line; blank lines are skipped."""
+        with open(path, encoding='utf-8') as f:
+            return cls(line.rstrip('\r\n') for line in f)
+
+    def __len__(self):
+        return len(self._passwords)
+
+    def match(self, encryption, verify=None):
+        """Return the first password that unlocks encryption and move it to the front, or None.
+
+        :param verify: Optional verify(encryption, password) to use instead of encryption.verify.
+        """
+        with self._lock:
+            candidates = list(self._passwords)
+        for password in candidates:
+            if verify(encryption, password) if verify else encryption.verify(password):
+                with self._lock:
+                    self._passwords.remove(password)
+                    self._passwords.insert(0, password)
+                return password
+        return None
@@ -1,7 +1,8 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from tkinter.scrolledtext import ScrolledText
-from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2 import PdfReader
+from remove_pdf_password import atomic_output, copy_document, replaces_input
 import os
 import threading
 import logging
@@ -273,7 +274,7 @@ class PDFPasswordManagerGUI:
         settings_options = ttk.LabelFrame(self.settings_frame, text="General Options", padding=10)
         settings_options.pack(fill=tk.X, padx=10, pady=10)
         
-        ttk.Checkbutton(settings_options, text="Create backup files before processing", 
+        ttk.Checkbutton(settings_options, text="Back up input files before overwriting them", 
                        variable=self.create_backup).pack(anchor=tk.W)
         ttk.Checkbutton(settings_options, text="Overwrite existing files without asking", 
                        variable=self.overwrite_files).pack(anchor=tk.W)
@@ -471,9 +472,6 @@ class PDFPasswordManagerGUI:
     def process_single_file_remove(self, input_file, output_file, password):
         """Remove password from a single PDF file."""
         try:
-            if self.create_backup.get():
-                self.create_file_backup(input_file)
-                
             reader = PdfReader(input_file)
             
             if not reader.is_encrypted:
@@ -484,11 +482,13 @@ class PDFPasswordManagerGUI:
                 self.log_message(f"Incorrect password for: {input_file}")
                 return False
                 
-            writer = PdfWriter()
-            for page in reader.pages:
-                writer.add_page(page)
+            writer = copy_document(reader)
+                
+            # Back up the input only if the output replaces it
+            if self.create_backup.get() and replaces_input(input_file, output_file):
+                self.create_file_backup(input_file)
                 
-            with open(output_file, "wb") as f:
+            with atomic_output(output_file) as f:
                 writer.write(f)
                 
             return True
@@ -500,17 +500,12 @@ class PDFPasswordManagerGUI:
     def process_single_file_add(self, input_file, output_file, user_password, owner_password, permissions):
         """Add password to a single PDF file."""
         try:
-            if self.create_backup.get():
-                self.create_file_backup(input_file)
-                
             reader = PdfReader(input_file)
             
             if reader.is_encrypted:
                 self.log_message(f"Warning: {input_file} is already password protected")
                 
-            writer = PdfWriter()
-            for page in reader.pages:
-                writer.add_page(page)
+            writer = copy_document(reader)
             
             # Convert permissions to PyPDF2 format
             permissions_flag = 0
@@ -530,7 +525,11 @@ class PDFPasswordManagerGUI:
                 permissions_flag=permissions_flag
             )
                 
-            with open(output_file, "wb") as f:
+            # Back up the input only if the output replaces it
+            if self.create_backup.get() and replaces_input(input_file, output_file):
+                self.create_file_backup(input_file)
+                
+            with atomic_output(output_file) as f:
                 writer.write(f)
                 
             return True
@@ -1,7 +1,8 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from tkinter import dnd
-from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2 import PdfReader
+from remove_pdf_password import copy_document
 import os
 import threading
 import logging
@@ -119,9 +120,7 @@ class PDFPasswordRemoverGUI:
                 return
             
             # Create a new PDF writer
-            writer = PdfWriter()
-            for page in reader.pages:
-                writer.add_page(page)
+            writer = copy_document(reader)
             
             # Save to temporary file
             with open(temp_output, "wb") as f:
@@ -1,7 +1,8 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from tkinter.scrolledtext import ScrolledText
-from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2 import PdfReader
+from remove_pdf_password import atomic_output, copy_document, replaces_input
 import os
 import threading
 import logging
@@ -190,7 +191,7 @@ class PDFPasswordRemoverGUIEnhanced:
         options_section = ttk.LabelFrame(self.main_frame, text="Options", padding=10)
         options_section.pack(fill=tk.X, pady=(0, 10))
         
-        ttk.Checkbutton(options_section, text="Create backup files", 
+        ttk.Checkbutton(options_section, text="Back up input files before overwriting them", 
                        variable=self.create_backup).pack(anchor=tk.W)
         ttk.Checkbutton(options_section, text="Overwrite existing files without asking", 
                        variable=self.overwrite_files).pack(anchor=tk.W)
@@ -380,18 +381,6 @@ class PDFPasswordRemoverGUIEnhanced:
             if not os.path.exists(input_file):
                 raise FileNotFoundError(f"File not found: {input_file}")
             
-            # Create backup if requested
-            if self.create_backup.get():
-                try:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    base_name = os.path.splitext(os.path.basename(input_file))[0]
-                    backup_name = f"{base_name}_backup_{timestamp}.pdf"
-                    backup_path = os.path.join(os.path.dirname(input_file), backup_name)
-                    shutil.copy2(input_file, backup_path)
-                    self.log_message(f"Backup created: {backup_path}")
-                except Exception as e:
-                    self.log_message(f"Could not create backup: {e}")
-                    
             # Read and process PDF
             reader = PdfReader(input_file)
             
@@ -409,12 +398,22 @@ class PDFPasswordRemoverGUIEnhanced:
                 self.log_message(f"Overwriting existing file: {output_file}")
                 
             # Create writer and copy pages
-            writer = PdfWriter()
-            for page in reader.pages:
-                writer.add_page(page)
+            writer = copy_document(reader)
                 
+            # Back up the input only if the unlocked PDF replaces it
+            if self.create_backup.get() and replaces_input(input_file, output_file):
+                try:
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    base_name = os.path.splitext(os.path.basename(input_file))[0]
+                    backup_name = f"{base_name}_backup_{timestamp}.pdf"
+                    backup_path = os.path.join(os.path.dirname(input_file), backup_name)
+                    shutil.copy2(input_file, backup_path)
+                    self.log_message(f"Backup created: {backup_path}")
+                except Exception as e:
+                    self.log_message(f"Could not create backup: {e}")
+                    
             # Save unlocked PDF
-            with open(output_file, "wb") as f:
+            with atomic_output(output_file) as f:
                 writer.write(f)
                 
             return True
@@ -0,0 +1,367 @@
+"""
+Header-only encryption probe for PDF Password Manager.
+
+Reports whether a PDF is encrypted, and with which security handler, by
+reading only the file header, the cross-reference entries needed to
+locate a handful of objects, the trailer and the /Encrypt dictionary.
+No PdfReader is built and object bodies are never decrypted.
+
+Both entry points take a path or an open binary stream, such as the
+memory-mapped input the password operations share.
+"""
+
+import contextlib
+import re
+from io import BytesIO
+
+from PyPDF2._encryption import Encryption
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject, read_object
+
+# Initial read size for an object; doubled until the object fits
+_CHUNK_SIZE = 4096
+# How much of the end of the file is searched for startxref
+_TAIL_SIZE = 2048
+
+_HEADER_RE = re.compile(rb"%PDF-(\d\.\d)")
+_STARTXREF_RE = re.compile(rb"startxref\s+(\d+)")
+_OBJECT_HEADER_RE = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj\s*")
+_XREF_RE = re.compile(rb"\s*xref")
+_SUBSECTION_RE = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*(?:\r\n|\r|\n)")
+_TRAILER_RE = re.compile(rb"\s*trailer\s*")
+_ENTRY_RE = re.compile(rb"(\d{10}) (\d{5}) ([nf])")
+_COUNT_RE = re.compile(rb"/Count\s+(\d+)(?!\d)(?!\s+\d+\s+R)")
+
+
+class ProbeError(Exception):
+    """Raised when a file cannot be probed without a full parse."""
+
+
+class _Section:
+    """One cross-reference section: a classic table or an xref stream."""
+
+    def __init__(self, trailer, subsections=None, rows=None, widths=None):
+        self.trailer = trailer
+        self.subsections = subsections
+        self.rows = rows
+        self.widths = widths
+
+
+class _Probe:
+    """Resolve individual objects straight from the cross-reference sections."""
+
+    # Passed to PyPDF2's object parser: fail on truncated reads so the caller can read more
+    strict = True
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.encrypted = False
+        self._sections = []
+        self._pending = []
+        self._seen = set()
+        self._object_streams = {}
+
+        stream.seek(0, 2)
+        self.size = stream.tell()
+        stream.seek(max(0, self.size - _TAIL_SIZE))
+        matches = _STARTXREF_RE.findall(stream.read())
+        if not matches:
+            raise ProbeError("startxref not found")
+        self._pending.append(int(matches[-1]))
+        self.trailer = self._next_section().trailer
+
+    def _read(self, offset, size):
+        self.stream.seek(offset)
+        return self.stream.read(size)
+
+    def _parse_at(self, offset, parse, end_marker=None):
+        """Call parse(data) on growing reads from offset until it succeeds."""
+        chunk = _CHUNK_SIZE
+        while True:
+            data = self._read(offset, chunk)
+            if end_marker and end_marker not in data and offset + len(data) < self.size:
+                chunk *= 2
+                continue
+            try:
+                return parse(data)
+            except ProbeError:
+                raise
+            except Exception as e:
+                if offset + len(data) >= self.size:
+                    raise ProbeError(f"cannot parse data at byte {offset}: {e!r}")
+                chunk *= 2
+
+    def _read_object(self, offset, idnum=None):
+        """Parse the indirect object at offset and return its value."""
+        def parse(data):
+            match = _OBJECT_HEADER_RE.match(data)
+            if not match:
+                raise ProbeError(f"no object at byte {offset}")
+            if idnum is not None and int(match.group(1)) != idnum:
+                raise ProbeError(f"expected object {idnum} at byte {offset}")
+            buffer = BytesIO(data)
+            buffer.seek(match.end())
+            return read_object(buffer, self)
+        return self._parse_at(offset, parse, b"endobj")
+
+    def _load_section(self, offset):
+        """Read the cross-reference section at offset."""
+        head = self._read(offset, 16)
+        if not _XREF_RE.match(head):
+            stream = self._read_object(offset)
+            if not isinstance(stream, StreamObject) or stream.get("/Type") != "/XRef":
+                raise ProbeError(f"no cross-reference section at byte {offset}")
+            index = stream.get("/Index", [0, stream["/Size"]])
+            return _Section(stream, rows=(stream.get_data(), list(zip(index[0::2], index[1::2]))),
+                            widths=[int(w) for w in stream["/W"]])
+
+        def parse(data):
+            pos = _XREF_RE.match(data).end()
+            subsections = []
+            while True:
+                trailer = _TRAILER_RE.match(data, pos)
+                if trailer:
+                    buffer = BytesIO(data)
+                    buffer.seek(trailer.end())
+                    return _Section(read_object(buffer, self), subsections=subsections)
+                match = _SUBSECTION_RE.match(data, pos)
+                if not match:
+                    raise ValueError("malformed cross-reference table")
+                start, count = int(match.group(1)), int(match.group(2))
+                subsections.append((start, count, offset + match.end()))
+                pos = match.end() + 20 * count
+        return self._parse_at(offset, parse)
+
+    def _next_section(self):
+        """Load the next section in lookup order, or return None when all are loaded."""
+        while self._pending:
+            offset = self._pending.pop(0)
+            if offset in self._seen:
+                continue
+            self._seen.add(offset)
+            section = self._load_section(offset)
+            # Hybrid files list their compressed objects in a stream consulted before /Prev
+            follow = [section.trailer.get(key) for key in ("/XRefStm", "/Prev")]
+            self._pending[:0] = [int(o) for o in follow if o is not None]
+            self._sections.append(section)
+            return section
+        return None
+
+    def _find_in(self, section, idnum):
+        """Return the cross-reference entry for idnum in section, or None."""
+        if section.subsections is not None:
+            for start, count, entries in section.subsections:
+                if start <= idnum < start + count:
+                    match = _ENTRY_RE.match(self._read(entries + 20 * (idnum - start), 20))
+                    if not match:
+                        raise ProbeError(f"malformed cross-reference entry for object {idnum}")
+                    if match.group(3) == b"f":
+                        return ("free",)
+                    return ("offset", int(match.group(1)))
+            return None
+
+        data, index = section.rows
+        widths = section.widths
+        row = 0
+        for start, count in index:
+            if start <= idnum < start + count:
+                pos = (row + idnum - start) * sum(widths)
+                fields = []
+                for width in widths:
+                    fields.append(int.from_bytes(data[pos:pos + width], "big"))
+                    pos += width
+                kind = fields[0] if widths[0] else 1
+                if kind == 1:
+                    return ("offset", fields[1])
+                if kind == 2:
+                    return ("compressed", fields[1], fields[2])
+                return ("free",)
+            row += count
+        return None
+
+    def _locate(self, idnum):
+        for section in self._sections:
+            entry = self._find_in(section, idnum)
+            if entry is not None:
+                return entry
+        while True:
+            section = self._next_section()
+            if section is None:
+                return ("free",)
+            entry = self._find_in(section, idnum)
+            if entry is not None:
+                return entry
+
+    def _compressed_object(self, stream_idnum, index):
+        if self.encrypted:
+            raise ProbeError("object is stored in an encrypted object stream")
+        if stream_idnum not in self._object_streams:
+            stream = self.get_object(IndirectObject(stream_idnum, 0, self))
+            data = stream.get_data()
+            first = int(stream["/First"])
+            numbers = [int(n) for n in data[:first].split()]
+            self._object_streams[stream_idnum] = (data, first, numbers[1::2])
+        data, first, offsets = self._object_streams[stream_idnum]
+        buffer = BytesIO(data)
+        buffer.seek(first + offsets[index])
+        return read_object(buffer, self)
+
+    def page_count(self):
+        """Return /Count of the page tree root without parsing its /Kids array when possible."""
+        pages = self.get_object(self.trailer["/Root"]).raw_get("/Pages")
+        entry = self._locate(pages.idnum) if isinstance(pages, IndirectObject) else None
+        if entry is not None and entry[0] == "offset":
+            def scan(data):
+                end = data.find(b"endobj")
+                if end < 0:
+                    raise ValueError("endobj not found")
+                for match in _COUNT_RE.finditer(data, 0, end):
+                    # Only the entry of the outermost dictionary counts
+                    before = data[:match.start()]
+                    if before.count(b"<<") - before.count(b">>") == 1:
+                        return int(match.group(1))
+                return None
+            count = self._parse_at(entry[1], scan, b"endobj")
+            if count is not None:
+                return count
+        return int(self.get_object(self.get_object(pages)["/Count"]))
+
+    def get_object(self, obj):
+        """Resolve obj if it is an indirect reference; used by PyPDF2's parser too."""
+        if not isinstance(obj, IndirectObject):
+            return obj
+        entry = self._locate(obj.idnum)
+        if entry[0] == "offset":
+            return self._read_object(entry[1], obj.idnum)
+        if entry[0] == "compressed":
+            return self._compressed_object(entry[1], entry[2])
+        return None
+
+
+def _resolve(probe, obj):
+    """Return obj with every indirect reference inside it resolved."""
+    obj = probe.get_object(obj)
+    if isinstance(obj, DictionaryObject):
+        for key, value in list(obj.items()):
+            obj[key] = _resolve(probe, value)
+    elif isinstance(obj, ArrayObject):
+        for index, value in enumerate(obj):
+            obj[index] = _resolve(probe, value)
+    return obj
+
+
+def _name(value):
+    """Return a PDF name without its leading slash, or None."""
+    return str(value)[1:] if value is not None else None
+
+
+def _cipher(probe, encrypt):
+    """Return (method, key_length) described by an /Encrypt dictionary."""
+    v = probe.get_object(encrypt.get("/V", 0))
+    if v >= 5:
+        return "AES", 256
+    if v == 4:
+        filters = probe.get_object(encrypt.get("/CF")) or {}
+        crypt_filter = probe.get_object(filters.get(probe.get_object(encrypt.get("/StmF", "/Identity")))) or {}
+        method = probe.get_object(crypt_filter.get("/CFM", "/None"))
+        if method == "/AESV2":
+            return "AES", 128
+        if method == "/V2":
+            length = int(probe.get_object(crypt_filter.get("/Length", 16)))
+            return "RC4", length * 8 if length <= 16 else length
+        return _name(method), None
+    if v in (2, 3):
+        return "RC4", int(probe.get_object(encrypt.get("/Length", 40)))
+    return "RC4", 40
+
+
+@contextlib.contextmanager
+def _open(source):
+    """Yield a binary stream for a path, or source itself, rewound, if it is already a stream."""
+    if hasattr(source, "read"):
+        source.seek(0)
+        yield source
+    else:
+        with open(source, "rb") as f:
+            yield f
+
+
+def probe_pdf(source, count_pages=True):
+    """Describe the protection of a PDF without parsing the whole file.
+
+    :param source: Path of the file, or a seekable binary stream over it (left open).
+    :param count_pages: Also resolve /Root and /Pages to report the page count.
+    :return: Dict with pdf_version, encrypted, filter, version, revision,
+        key_length, method, permissions and page_count (None when unknown).
+    :raises ProbeError: If the file cannot be probed; a full parse may still work.
+    """
+    with _open(source) as f:
+        header = _HEADER_RE.search(f.read(1024))
+        if not header:
+            raise ProbeError("PDF header not found")
+
+        info = {
+            'pdf_version': header.group(1).decode(),
+            'encrypted': False,
+            'filter': None,
+            'version': None,
+            'revision': None,
+            'key_length': None,
+            'method': None,
+            'permissions': None,
+            'page_count': None,
+        }
+
+        try:
+            probe = _Probe(f)
+            encrypt = probe.get_object(probe.trailer.get("/Encrypt"))
+            if encrypt is not None:
+                probe.encrypted = True
+                method, key_length = _cipher(probe, encrypt)
+                info.update({
+                    'encrypted': True,
+                    'filter': _name(probe.get_object(encrypt.get("/Filter"))),
+                    'version': int(probe.get_object(encrypt.get("/V", 0))),
+                    'revision': int(probe.get_object(encrypt["/R"])) if "/R" in encrypt else None,
+                    'key_length': key_length,
+                    'method': method,
+                    'permissions': int(probe.get_object(encrypt["/P"])) if "/P" in encrypt else None,
+                })
+        except ProbeError:
+            raise
+        except Exception as e:
+            raise ProbeError(f"cannot read trailer: {e!r}")
+
+        if count_pages:
+            try:
+                info['page_count'] = probe.page_count()
+            except Exception:
+                # The page tree may sit in an encrypted object stream
+                pass
+
+    return info
+
+
+def read_encryption(source):
+    """Return the document's Encryption handler, still locked, or None if it is not encrypted.
+
+    Only the trailer and the /Encrypt dictionary are read, so candidate
+    passwords can be checked with Encryption.verify() before a full parse.
+
+    :param source: Path of the file, or a seekable binary stream over it (left open).
+    :raises ProbeError: If the file cannot be probed or uses an unsupported handler.
+    """
+    with _open(source) as f:
+        try:
+            probe = _Probe(f)
+            encrypt = probe.get_object(probe.trailer.get("/Encrypt"))
+            if encrypt is None:
+                return None
+            probe.encrypted = True
+            encrypt = _resolve(probe, encrypt)
+            id_entry = probe.get_object(probe.trailer.get("/ID"))
+            id1_entry = probe.get_object(id_entry[0]).original_bytes if id_entry else b""
+            return Encryption.read(encrypt, id1_entry)
+        except ProbeError:
+            raise
+        except Exception as e:
+            raise ProbeError(f"cannot read security handler: {e!r}")
@@ -0,0 +1,690 @@
+"""
+Streaming object engine for PDF Password Manager.
+
+Rewrites a PDF one indirect object at a time, straight from its
+cross-reference table. Only string tokens and stream bodies are decrypted
+or encrypted; every other byte of an object is copied verbatim, and only
+the object currently being rewritten is held in memory.
+
+PyPDF2 is used to locate objects (xref table, xref streams, trailer) and
+to derive document keys; object bodies are never parsed into PyPDF2
+objects.
+"""
+
+import hashlib
+import os
+import random
+import re
+import struct
+import time
+import zlib
+from array import array
+
+from PyPDF2._encryption import _PADDING, AES_CBC_encrypt, AlgV4, AlgV5, Encryption, RC4_decrypt
+from PyPDF2._security import _alg33, _alg35
+from PyPDF2.generic import ArrayObject, BooleanObject, ByteStringObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+# Initial read size for an object; doubled until the object fits
+_CHUNK_SIZE = 8192
+
+_HEADER_RE = re.compile(rb"%PDF-(\d\.\d)")
+_OBJECT_HEADER_RE = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj")
+_TOKEN_RE = re.compile(rb"[()<>\[\]%]|(?<![/\w])(?:stream|endobj)(?!\w)")
+_LITERAL_RE = re.compile(rb"[()\\]")
+_EOL_RE = re.compile(rb"[\r\n]")
+_LENGTH_RE = re.compile(rb"/Length(?![^\s/<>\[\]()%{}])\s+(\d+)(?:\s+(\d+)\s+R)?")
+_TYPE_RE = re.compile(rb"/Type\s*/(\w+)")
+_CRYPT_FILTER_RE = re.compile(rb"/Crypt(?![^\s/<>\[\]()%{}])")
+_ENDSTREAM_RE = re.compile(rb"\s*endstream")
+_INTEGER_OBJECT_RE = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj\s*(\d+)")
+_WHITESPACE = b" \t\r\n\f\x00"
+
+_LITERAL_ESCAPES = {
+    ord("n"): b"\n", ord("r"): b"\r", ord("t"): b"\t", ord("b"): b"\b",
+    ord("f"): b"\f", ord("("): b"(", ord(")"): b")", ord("\\"): b"\\",
+}
+
+
+class StreamEngineError(Exception):
+    """Raised when a document uses a structure the streaming engine cannot rewrite."""
+
+
+class _NeedMoreData(Exception):
+    """Raised by the lexer when the buffered bytes end inside an object."""
+
+
+def standard_encryption(user_password, owner_password, permissions_flag, file_id=None):
+    """Create 128-bit RC4 (V2, R3) encryption, as PdfWriter.encrypt(use_128bit=True) does.
+
+    :param file_id: Existing /ID array to keep; a new one is generated if None.
+    :return: (encryption, encrypt_entry, file_id) for rewrite_pdf.
+    """
+    rev, keylen = 3, 16
+    if owner_password is None:
+        owner_password = user_password
+    if file_id is None:
+        file_id = _new_file_id()
+    # PyPDF2 reads some IDs back as text strings; the key derivation needs the raw bytes
+    id1_entry = ByteStringObject(file_id[0].get_object().original_bytes)
+    
+    owner_entry = ByteStringObject(_alg33(owner_password, user_password, rev, keylen))
+    user_entry, key = _alg35(user_password, rev, keylen, owner_entry, permissions_flag, id1_entry, False)
+    
+    entry = DictionaryObject()
+    entry[NameObject("/Filter")] = NameObject("/Standard")
+    entry[NameObject("/V")] = NumberObject(2)
+    entry[NameObject("/Length")] = NumberObject(keylen * 8)
+    entry[NameObject("/R")] = NumberObject(rev)
+    entry[NameObject("/O")] = owner_entry
+    entry[NameObject("/U")] = ByteStringObject(user_entry)
+    entry[NameObject("/P")] = NumberObject(permissions_flag)
+    
+    encryption = Encryption(2, rev, entry, id1_entry, "/V2", "/V2", "/V2")
+    encryption._key = key
+    return encryption, entry, file_id
+
+
+def matching_encryption(handler, user_password, owner_password, permissions_flag, file_id=None):
+    """Create encryption with new passwords but the same handler as an existing document.
+
+    The version, revision, key length, crypt filter method and
+    /EncryptMetadata of handler (a PyPDF2 Encryption) are kept, so a
+    rekeyed AES-128 or AES-256 document is not downgraded to RC4.
+
+    :param file_id: Existing /ID array to keep; a new one is generated if None.
+    :return: (encryption, encrypt_entry, file_id) for rewrite_pdf.
+    :raises StreamEngineError: If the handler uses different methods for strings and streams.
+    """
+    version, rev = handler.algV, handler.algR
+    methods = {method for method in (handler.StmF, handler.StrF) if method != "/Identity"}
+    if len(methods) > 1:
+        raise StreamEngineError("cannot re-create a handler that mixes crypt filter methods")
+    method = methods.pop() if methods else "/V2"
+    metadata_encrypted = _metadata_encrypted(handler)
+    if owner_password is None:
+        owner_password = user_password
+    if file_id is None:
+        file_id = _new_file_id()
+    id1_entry = ByteStringObject(file_id[0].get_object().original_bytes)
+    user_secret, owner_secret = _password_bytes(user_password), _password_bytes(owner_password)
+    
+    entry = DictionaryObject()
+    entry[NameObject("/Filter")] = NameObject("/Standard")
+    entry[NameObject("/V")] = NumberObject(version)
+    entry[NameObject("/R")] = NumberObject(rev)
+    entry[NameObject("/P")] = NumberObject(permissions_flag)
+    if version >= 5:
+        keylen = 32
+        key = os.urandom(keylen)
+        user_salts, owner_salts = os.urandom(16), os.urandom(16)
+        user_entry = AlgV5.calculate_hash(rev, user_secret[:127], user_salts[:8], b"") + user_salts
+        owner_entry = AlgV5.calculate_hash(rev, owner_secret[:127], owner_salts[:8], user_entry) + owner_salts
+        iv = bytes(16)
+        entry[NameObject("/UE")] = ByteStringObject(
+            AES_CBC_encrypt(AlgV5.calculate_hash(rev, user_secret[:127], user_salts[8:], b""), iv, key))
+        entry[NameObject("/OE")] = ByteStringObject(
+            AES_CBC_encrypt(AlgV5.calculate_hash(rev, owner_secret[:127], owner_salts[8:], user_entry), iv, key))
+        entry[NameObject("/Perms")] = ByteStringObject(
+            AlgV5.compute_Perms_value(key, permissions_flag & 0xFFFFFFFF, metadata_encrypted))
+    else:
+        # V1 is always 40-bit; V4 crypt filters always use 128-bit keys
+        keylen = 5 if version == 1 else 16 if version == 4 else handler.key_size // 8
+        owner_key = AlgV4.compute_O_value_key(owner_secret, rev, keylen * 8)
+        owner_entry = AlgV4.compute_O_value(owner_key, user_secret, rev)
+        key = AlgV4.compute_key(user_secret, rev, keylen * 8, owner_entry, permissions_flag & 0xFFFFFFFF, id1_entry,
+                                metadata_encrypted)
+        user_entry = AlgV4.compute_U_value(key, rev, id1_entry)
+    entry[NameObject("/Length")] = NumberObject(keylen * 8)
+    entry[NameObject("/O")] = ByteStringObject(owner_entry)
+    entry[NameObject("/U")] = ByteStringObject(user_entry)
+    if version >= 4:
+        crypt_filter = DictionaryObject()
+        crypt_filter[NameObject("/CFM")] = NameObject(method)
+        crypt_filter[NameObject("/AuthEvent")] = NameObject("/DocOpen")
+        crypt_filter[NameObject("/Length")] = NumberObject(keylen)
+        entry[NameObject("/CF")] = DictionaryObject({NameObject("/StdCF"): crypt_filter})
+        entry[NameObject("/StmF")] = NameObject("/Identity" if handler.StmF == "/Identity" else "/StdCF")
+        entry[NameObject("/StrF")] = NameObject("/Identity" if handler.StrF == "/Identity" else "/StdCF")
+        if not metadata_encrypted:
+            entry[NameObject("/EncryptMetadata")] = BooleanObject(False)
+    
+    encryption = Encryption(version, rev, entry, id1_entry, handler.StmF, handler.StrF, handler.StmF)
+    encryption._key = key
+    return encryption, entry, file_id
+
+
+def _new_file_id():
+    """Generate a new /ID array, as PdfWriter.encrypt does."""
+    return ArrayObject((
+        ByteStringObject(hashlib.md5(repr(time.time()).encode("utf8")).digest()),
+        ByteStringObject(hashlib.md5(repr(random.random()).encode("utf8")).digest()),
+    ))
+
+
+def _password_bytes(password):
+    """Encode a password the way Encryption.verify does, so the document opens with it again."""
+    if isinstance(password, bytes):
+        return password
+    try:
+        return password.encode("latin-1")
+    except UnicodeEncodeError:
+        return password.encode("utf-8")
+
+
+def recover_user_password(encryption, owner_password):
+    """Recover the user password from the /O entry using the owner password.
+
+    Only revision 2-4 handlers store the user password under /O. An AES-256
+    (revision 5/6) document only reveals it when the owner password is
+    also the user password, as it often is.
+
+    :raises StreamEngineError: If the user password cannot be recovered.
+    """
+    secret = _password_bytes(owner_password)
+    if encryption.algR > 4:
+        user_entry = encryption.entry["/U"].get_object().original_bytes
+        user_key_entry = encryption.entry["/UE"].get_object().original_bytes
+        if AlgV5.verify_user_password(encryption.algR, secret, user_entry, user_key_entry):
+            return owner_password
+        raise StreamEngineError("user password cannot be recovered from a revision %d handler" % encryption.algR)
+    
+    rc4_key = AlgV4.compute_O_value_key(secret, encryption.algR, encryption.key_size)
+    padded = encryption.entry["/O"].get_object().original_bytes[:32]
+    if encryption.algR <= 2:
+        padded = RC4_decrypt(rc4_key, padded)
+    else:
+        for i in range(19, -1, -1):
+            padded = RC4_decrypt(bytes(x ^ i for x in rc4_key), padded)
+    
+    # The password was padded with the start of the standard padding string
+    for end in range(len(padded) + 1):
+        if padded[end:] == _PADDING[: len(padded) - end]:
+            return padded[:end].decode("latin-1")
+    return padded.decode("latin-1")
+
+
+def _object_ciphers(encryption, idnum, generation):
+    """Return the (stream, string) ciphers for one object (PDF Algorithm 1)."""
+    key = encryption._key
+    n = 5 if encryption.algV == 1 else encryption.key_size // 8
+    key_hash = hashlib.md5(key[:n] + struct.pack("<i", idnum)[:3] + struct.pack("<i", generation)[:2])
+    rc4_key = key_hash.digest()[: min(n + 5, 16)]
+    key_hash.update(b"sAlT")
+    aes128_key = key_hash.digest()[: min(n + 5, 16)]
+    return (
+        Encryption._get_crypt(encryption.StmF, rc4_key, aes128_key, key),
+        Encryption._get_crypt(encryption.StrF, rc4_key, aes128_key, key),
+    )
+
+
+def _metadata_encrypted(encryption):
+    """Return whether /Metadata streams are covered by the document encryption."""
+    value = encryption.entry.get("/EncryptMetadata", True)
+    return getattr(value, "value", value) is not False
+
+
+def _decode_literal(raw):
+    """Decode the body of a literal string token into its bytes."""
+    out = bytearray()
+    i = 0
+    length = len(raw)
+    while i < length:
+        c = raw[i]
+        if c == 0x5C:  # backslash
+            i += 1
+            if i >= length:
+                break
+            c = raw[i]
+            if c in _LITERAL_ESCAPES:
+                out += _LITERAL_ESCAPES[c]
+                i += 1
+            elif 0x30 <= c <= 0x37:
+                end = i + 1
+                while end < length and end < i + 3 and 0x30 <= raw[end] <= 0x37:
+                    end += 1
+                out.append(int(raw[i:end], 8) & 0xFF)
+                i = end
+            elif c == 0x0D:  # line continuation
+                i += 2 if raw[i + 1:i + 2] == b"\n" else 1
+            elif c == 0x0A:
+                i += 1
+            else:
+                out.append(c)
+                i += 1
+        elif c == 0x0D:  # unescaped end-of-line is read as a single LF
+            out += b"\n"
+            i += 2 if raw[i + 1:i + 2] == b"\n" else 1
+        else:
+            out.append(c)
+            i += 1
+    return bytes(out)
+
+
+def _decode_hex(raw):
+    """Decode the body of a hex string token into its bytes."""
+    digits = bytes(c for c in raw if c not in _WHITESPACE)
+    if len(digits) % 2:
+        digits += b"0"
+    return bytes.fromhex(digits.decode("ascii"))
+
+
+class _ObjectRewriter:
+    """Rewrite indirect objects from a source file, transforming strings and streams."""
+
+    def __init__(self, reader, decryption=None, encryption=None):
+        self.reader = reader
+        self.source = reader.stream
+        self.decryption = decryption
+        self.encryption = encryption
+        self.transforming = decryption is not None or encryption is not None
+
+    def _read_at(self, offset, size):
+        self.source.seek(offset)
+        return self.source.read(size)
+
+    def _transform_string(self, data, string_ciphers):
+        for cipher, direction in string_ciphers:
+            data = cipher.decrypt(data) if direction == "decrypt" else cipher.encrypt(data)
+        return b"<" + data.hex().encode("ascii") + b">"
+
+    def _lex(self, buf, start, string_ciphers):
+        """Lex one object body from buf[start:].
+
+        Returns (segments, length_index, info, end) where segments is the
+        rewritten body up to the 'stream' or 'endobj' keyword, length_index
+        is the segment holding the top-level /Length value (or None), info
+        holds top-level /Length and /Type values, and end is the offset just
+        past the keyword.
+        """
+        segments = []
+        length_index = None
+        info = {"length": None, "type": None, "stream": False, "crypt": False}
+        depth = 0
+        pos = start
+
+        while True:
+            match = _TOKEN_RE.search(buf, pos)
+            if match is None:
+                raise _NeedMoreData()
+            token_start = match.start()
+            text = buf[pos:token_start]
+
+            if depth == 1 and text:
+                type_match = _TYPE_RE.search(text)
+                if type_match and info["type"] is None:
+                    info["type"] = type_match.group(1)
+                length_match = _LENGTH_RE.search(text)
+                if length_match and info["length"] is None:
+                    value = int(length_match.group(1))
+                    if length_match.group(2) is not None:
+                        value = IndirectObject(value, int(length_match.group(2)), self.reader)
+                    info["length"] = value
+                    segments.append(text[:length_match.start()])
+                    length_index = len(segments)
+                    segments.append(text[length_match.start():length_match.end()])
+                    text = text[length_match.end():]
+            if text:
+                if _CRYPT_FILTER_RE.search(text):
+                    info["crypt"] = True
+                segments.append(text)
+
+            token = match.group()
+            if token == b"(":
+                end = self._find_literal_end(buf, token_start)
+                if self.transforming and string_ciphers:
+                    data = _decode_literal(buf[token_start + 1:end - 1])
+                    segments.append(self._transform_string(data, string_ciphers))
+                else:
+                    segments.append(buf[token_start:end])
+                pos = end
+            elif token == b"<":
+                if buf[token_start + 1:token_start + 2] == b"<":
+                    depth += 1
+                    segments.append(b"<<")
+                    pos = token_start + 2
+                else:
+                    end = buf.find(b">", token_start)
+                    if end < 0:
+                        raise _NeedMoreData()
+                    if self.transforming and string_ciphers:
+                        data = _decode_hex(buf[token_start + 1:end])
+                        segments.append(self._transform_string(data, string_ciphers))
+                    else:
+                        segments.append(buf[token_start:end + 1])
+                    pos = end + 1
+            elif token == b">":
+                if buf[token_start + 1:token_start + 2] != b">":
+                    raise StreamEngineError("Unbalanced '>' in object")
+                depth -= 1
+                segments.append(b">>")
+                pos = token_start + 2
+            elif token == b"[":
+                depth += 1
+                segments.append(b"[")
+                pos = token_start + 1
+            elif token == b"]":
+                depth -= 1
+                segments.append(b"]")
+                pos = token_start + 1
+            elif token == b"%":
+                eol = _EOL_RE.search(buf, token_start)
+                if eol is None:
+                    raise _NeedMoreData()
+                segments.append(buf[token_start:eol.start()])
+                pos = eol.start()
+            elif token == b"stream":
+                info["stream"] = True
+                return segments, length_index, info, match.end()
+            else:  # endobj
+                return segments, length_index, info, match.end()
+
+    @staticmethod
+    def _find_literal_end(buf, start):
+        nesting = 0
+        pos = start
+        while True:
+            match = _LITERAL_RE.search(buf, pos)
+            if match is None:
+                raise _NeedMoreData()
+            c = match.group()
+            if c == b"\\":
+                pos = match.start() + 2
+                if pos > len(buf):
+                    raise _NeedMoreData()
+                continue
+            nesting += 1 if c == b"(" else -1
+            pos = match.end()
+            if nesting == 0:
+                return pos
+
+    def _resolve_length(self, ref):
+        """Resolve an indirect /Length to an integer, or None if it cannot be read cheaply."""
+        offset = self.reader.xref.get(ref.generation, {}).get(ref.idnum)
+        if offset is None:
+            return None
+        match = _INTEGER_OBJECT_RE.match(self._read_at(offset, 128))
+        if match is None or int(match.group(1)) != ref.idnum:
+            return None
+        return int(match.group(3))
+
+    def _read_stream_data(self, data_start, length):
+        """Read stream data, falling back to scanning for 'endstream' if /Length is wrong."""
+        if length is not None:
+            data = self._read_at(data_start, length)
+            if len(data) == length and _ENDSTREAM_RE.match(self.source.read(64)):
+                return data
+
+        # Scan forward for the endstream keyword
+        chunks = []
+        offset = data_start
+        tail = b""
+        while True:
+            chunk = self._read_at(offset, _CHUNK_SIZE * 16)
+            if not chunk:
+                raise StreamEngineError("Unterminated stream")
+            window = tail + chunk
+            index = window.find(b"endstream")
+            if index >= 0:
+                data = b"".join(chunks) + window[:index]
+                if data.endswith(b"\r\n"):
+                    return data[:-2]
+                if data.endswith((b"\n", b"\r")):
+                    return data[:-1]
+                return data
+            chunks.append(window[:-8])
+            tail = window[-8:]
+            offset += len(chunk)
+
+    def rewrite(self, offset, expected_idnum, write):
+        """Rewrite the object at offset through write(); return its /Type or None.
+
+        Cross-reference streams are not written (their /Type is returned so
+        the caller can account for them).
+        """
+        size = _CHUNK_SIZE
+        while True:
+            buf = self._read_at(offset, size)
+            header = _OBJECT_HEADER_RE.match(buf)
+            if header is None:
+                if len(buf) < size:
+                    raise StreamEngineError(f"No object header at offset {offset}")
+                size *= 2
+                continue
+            idnum, generation = int(header.group(1)), int(header.group(2))
+            if idnum != expected_idnum:
+                raise StreamEngineError(f"Expected object {expected_idnum} at offset {offset}, found {idnum}")
+
+            string_ciphers = self._string_ciphers(idnum, generation)
+            try:
+                segments, length_index, info, end = self._lex(buf, header.end(), string_ciphers)
+                break
+            except _NeedMoreData:
+                if len(buf) < size:
+                    raise StreamEngineError(f"Object {idnum} is truncated")
+                size *= 2
+
+        if info["type"] == b"XRef":
+            return info["type"]
+
+        if not info["stream"]:
+            write(b"%d %d obj" % (idnum, generation))
+            write(b"".join(segments))
+            write(b"endobj\n")
+            return info["type"]
+
+        # Stream data starts after the EOL following the 'stream' keyword
+        data_start = offset + end
+        if buf[end:end + 2] == b"\r\n":
+            data_start += 2
+        elif buf[end:end + 1] in (b"\n", b"\r"):
+            data_start += 1
+
+        length = info["length"]
+        if isinstance(length, IndirectObject):
+            length = self._resolve_length(length)
+        data = self._read_stream_data(data_start, length)
+
+        for cipher, direction in self._stream_ciphers(idnum, generation, info):
+            data = cipher.decrypt(data) if direction == "decrypt" else cipher.encrypt(data)
+
+        if length_index is None:
+            # No top-level /Length: add one just before the dictionary closes
+            close_index = len(segments) - 1 - segments[::-1].index(b">>")
+            segments.insert(close_index, b" /Length %d " % len(data))
+        else:
+            segments[length_index] = b"/Length %d" % len(data)
+
+        write(b"%d %d obj" % (idnum, generation))
+        write(b"".join(segments))
+        write(b"stream\n")
+        write(data)
+        write(b"\nendstream\nendobj\n")
+        return info["type"]
+
+    def _string_ciphers(self, idnum, generation):
+        ciphers = []
+        if self.decryption is not None:
+            ciphers.append((_object_ciphers(self.decryption, idnum, generation)[1], "decrypt"))
+        if self.encryption is not None:
+            ciphers.append((_object_ciphers(self.encryption, idnum, generation)[1], "encrypt"))
+        return ciphers
+
+    def _stream_ciphers(self, idnum, generation, info):
+        if info["crypt"] and self.decryption is not None:
+            raise StreamEngineError("Streams with their own /Crypt filter are not supported")
+
+        ciphers = []
+        is_metadata = info["type"] == b"Metadata"
+        if self.decryption is not None and not (is_metadata and not _metadata_encrypted(self.decryption)):
+            ciphers.append((_object_ciphers(self.decryption, idnum, generation)[0], "decrypt"))
+        if self.encryption is not None and not (is_metadata and not _metadata_encrypted(self.encryption)):
+            ciphers.append((_object_ciphers(self.encryption, idnum, generation)[0], "encrypt"))
+        return ciphers
+
+
+class _CountingWriter:
+    """Wrap a binary file object and track the number of bytes written."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.offset = 0
+
+    def write(self, data):
+        self.stream.write(data)
+        self.offset += len(data)
+
+
+def _serialize(obj):
+    """Serialize a PyPDF2 object (used for trailer values) to bytes."""
+    from io import BytesIO
+    buffer = BytesIO()
+    obj.write_to_stream(buffer, None)
+    return buffer.getvalue()
+
+
+def _latest_objects(reader):
+    """Return {idnum: (generation, offset)} for uncompressed objects in the final xref."""
+    objects = {}
+    for generation, entries in reader.xref.items():
+        free = reader.xref_free_entry.get(generation, {})
+        for idnum, offset in entries.items():
+            if idnum == 0 or free.get(idnum, False):
+                continue
+            if generation == 0 and idnum in reader.xref_objStm:
+                continue
+            if idnum not in objects or objects[idnum][0] < generation:
+                objects[idnum] = (generation, offset)
+    return objects
+
+
+def rewrite_pdf(reader, destination, decrypt=False, encryption=None, encrypt_entry=None, file_id=None, progress=None):
+    """Rewrite the document behind reader into destination, one object at a time.
+
+    :param reader: PdfReader opened over a file handle (see remove_pdf_password.open_input);
+        it must already be decrypted when decrypt is True.
+    :param destination: Writable binary file object.
+    :param decrypt: Remove the document's existing encryption.
+    :param encryption: PyPDF2 Encryption (with its key set) to apply, or None.
+    :param encrypt_entry: Encryption dictionary written for encryption.
+    :param file_id: /ID array for the new trailer (defaults to the source /ID).
+    :param progress: Optional callable(done, total) invoked periodically.
+    :return: Number of objects written.
+    """
+    decryption = reader._encryption if decrypt else None
+    if decrypt and (decryption is None or not decryption.is_decrypted()):
+        raise StreamEngineError("Document must be decrypted before rewriting")
+    rewriter = _ObjectRewriter(reader, decryption, encryption)
+
+    trailer = reader.trailer
+    encrypt_ref = trailer.raw_get("/Encrypt") if "/Encrypt" in trailer else None
+    skip = set()
+    if isinstance(encrypt_ref, IndirectObject) and (decrypt or encryption is not None):
+        skip.add(encrypt_ref.idnum)
+
+    objects = _latest_objects(reader)
+    compressed = reader.xref_objStm
+    max_idnum = max(list(objects) + list(compressed) + [0])
+
+    # Object number assignments for the objects this rewrite adds
+    next_idnum = max_idnum + 1
+    encrypt_idnum = None
+    if encryption is not None:
+        encrypt_idnum = next_idnum
+        next_idnum += 1
+    use_xref_stream = bool(compressed)
+    xref_idnum = next_idnum if use_xref_stream else None
+    size = next_idnum + 1 if use_xref_stream else next_idnum
+
+    offsets = array("q", [-1]) * size
+    generations = {}
+    out = _CountingWriter(destination)
+
+    header = _HEADER_RE.match(rewriter._read_at(0, 16))
+    version = header.group(1) if header else b"1.4"
+    if use_xref_stream and version < b"1.5":
+        version = b"1.5"
+    out.write(b"%PDF-" + version + b"\n%\xe2\xe3\xcf\xd3\n")
+
+    # Read objects in file order so the source is consumed sequentially
+    ordered = sorted(objects.items(), key=lambda item: item[1][1])
+    total = len(ordered)
+    written = 0
+    for done, (idnum, (generation, offset)) in enumerate(ordered, 1):
+        if idnum in skip:
+            continue
+        object_offset = out.offset
+        object_type = rewriter.rewrite(offset, idnum, out.write)
+        if object_type == b"XRef":
+            continue
+        offsets[idnum] = object_offset
+        if generation:
+            generations[idnum] = generation
+        written += 1
+        if progress is not None and (done % 1000 == 0 or done == total):
+            progress(done, total)
+
+    if encryption is not None:
+        offsets[encrypt_idnum] = out.offset
+        out.write(b"%d 0 obj\n" % encrypt_idnum)
+        out.write(_serialize(encrypt_entry))
+        out.write(b"\nendobj\n")
+
+    # Trailer entries
+    trailer_entries = [b"/Size %d" % size, b"/Root " + _serialize(trailer.raw_get("/Root"))]
+    if "/Info" in trailer:
+        trailer_entries.append(b"/Info " + _serialize(trailer.raw_get("/Info")))
+    if file_id is None and "/ID" in trailer:
+        file_id = trailer.raw_get("/ID")
+    if file_id is not None:
+        trailer_entries.append(b"/ID " + _serialize(file_id))
+    if encryption is not None:
+        trailer_entries.append(b"/Encrypt %d 0 R" % encrypt_idnum)
+    elif not decrypt and encrypt_ref is not None:
+        trailer_entries.append(b"/Encrypt " + _serialize(encrypt_ref))
+
+    xref_offset = out.offset
+    if use_xref_stream:
+        offsets[xref_idnum] = xref_offset
+        _write_xref_stream(out, size, offsets, generations, compressed, xref_idnum, trailer_entries)
+    else:
+        _write_xref_table(out, size, offsets, generations, trailer_entries)
+    out.write(b"startxref\n%d\n%%%%EOF\n" % xref_offset)
+    return written
+
+
+def _write_xref_table(out, size, offsets, generations, trailer_entries):
+    """Write a classic cross-reference table and trailer."""
+    out.write(b"xref\n0 %d\n" % size)
+    out.write(b"0000000000 65535 f\r\n")
+    lines = []
+    for idnum in range(1, size):
+        offset = offsets[idnum]
+        if offset < 0:
+            lines.append(b"0000000000 65535 f\r\n")
+        else:
+            lines.append(b"%010d %05d n\r\n" % (offset, generations.get(idnum, 0)))
+        if len(lines) >= 4096:
+            out.write(b"".join(lines))
+            lines = []
+    out.write(b"".join(lines))
+    out.write(b"trailer\n<< " + b" ".join(trailer_entries) + b" >>\n")
+
+
+def _write_xref_stream(out, size, offsets, generations, compressed, xref_idnum, trailer_entries):
+    """Write a cross-reference stream (needed when objects live in object streams)."""
+    rows = []
+    for idnum in range(size):
+        offset = offsets[idnum]
+        if offset >= 0:
+            rows.append(struct.pack(">BQH", 1, offset, generations.get(idnum, 0)))
+        elif idnum in compressed:
+            stream_idnum, index = compressed[idnum]
+            rows.append(struct.pack(">BQH", 2, stream_idnum, index))
+        else:
+            rows.append(struct.pack(">BQH", 0, 0, 65535 if idnum == 0 else 0))
+    data = zlib.compress(b"".join(rows))
+
+    out.write(b"%d 0 obj\n<< /Type /XRef /W [1 8 2] /Filter /FlateDecode /Length %d " % (xref_idnum, len(data)))
+    out.write(b" ".join(trailer_entries) + b" >>\nstream\n")
+    out.write(data)
+    out.write(b"\nendstream\nendobj\n")
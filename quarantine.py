@@ -0,0 +1,69 @@
+"""
+Quarantine list for PDF Password Manager batches (--quarantine).
+
+Inputs that made a worker time out or crash are listed in an append-only
+JSON Lines file, one record per incident:
+
+    {"time": ..., "input": "/abs/in.pdf", "size": 1234, "mtime_ns": ...,
+     "reason": "timeout", "detail": "task did not finish within 60 seconds"}
+
+Later batches skip a listed file while its size and modification time
+are unchanged, so one pathological PDF does not stall a worker on every
+run; a file that has been replaced is tried again. Delete a line (or the
+file) to retry an input by hand.
+"""
+
+import os
+from datetime import datetime
+
+from batch_journal import AppendLog
+
+# Why a file is quarantined
+REASONS = ('timeout', 'crash')
+
+
+class Quarantine(AppendLog):
+    """Record inputs that timed out or crashed a worker, and answer whether a file is quarantined."""
+
+    def __init__(self, path):
+        """Open the quarantine list at path, loading any records already in it."""
+        self._entries = {}
+        super().__init__(path)
+
+    def _remember(self, record):
+        self._entries[record['input']] = (record['size'], record['mtime_ns'], record['reason'])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def reason(self, input_path):
+        """Return why input_path is quarantined, or None if it is not listed or has changed since."""
+        entry = self._entries.get(os.path.abspath(input_path))
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(input_path)
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != entry[:2]:
+            return None
+        return entry[2]
+
+    def add(self, input_path, reason, detail=None):
+        """List input_path as quarantined for reason ('timeout' or 'crash')."""
+        if reason not in REASONS:
+            raise ValueError(f"Unknown quarantine reason: {reason}")
+        try:
+            stat = os.stat(input_path)
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        except OSError:
+            size = mtime_ns = None
+        record = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'input': os.path.abspath(input_path),
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'reason': reason,
+            'detail': detail,
+        }
+        self._append(record)
@@ -1,10 +1,37 @@
-from PyPDF2 import PdfReader, PdfWriter
+if __name__ == "__main__":
+    # Hand the command to a running warm server before paying for the imports below
+    import warm_server
+    warm_server.forward_or_continue()
+
+from PyPDF2 import PasswordType, PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NullObject
+from backup_store import BackupStore, file_digest
+from batch_journal import BatchJournal, fingerprint
+from batch_pipeline import Pipeline, prefetch_file
+from file_discovery import iter_input_files, read_file_list
+from isolated_pool import IsolatedPool, TaskTimeoutError, WorkerCrashedError
+from watch_folder import DEFAULT_SETTLE_TIME, DropFolderWatcher, WatchError
+from key_cache import DerivedKeyCache
+from password_map import Keyring, PasswordMap, PasswordMapError, iter_password_map_files, read_password_map
+from pdf_probe import ProbeError, probe_pdf, read_encryption
+from pdf_stream_engine import StreamEngineError, matching_encryption, recover_user_password, rewrite_pdf, standard_encryption
+from quarantine import Quarantine
 import argparse
 import getpass
 import os
 import sys
 import logging
 import shutil
+import io
+import json
+import contextlib
+import copy
+import hashlib
+import itertools
+import mmap
+import signal
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 
 # Try to import PyCryptodome for AES support
@@ -27,11 +54,62 @@ def setup_logging(verbose=False):
         ]
     )
 
+class _ThreadConsole:
+    """Stand-in for sys.stdout that sends a thread's output to its own buffer while it runs a captured job."""
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+    
+    def captured(self):
+        return getattr(self.local, 'buffer', None) is not None
+    
+    def write(self, text):
+        return (self.local.buffer if self.captured() else self.stream).write(text)
+    
+    def flush(self):
+        if not self.captured():
+            self.stream.flush()
+    
+    def isatty(self):
+        return not self.captured() and self.stream.isatty()
+    
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+_console_lock = threading.Lock()
+
+@contextlib.contextmanager
+def captured_console(buffer):
+    """Collect what the current thread prints into buffer and answer its prompts with their defaults.
+    
+    Unlike contextlib.redirect_stdout, other threads keep printing to the
+    real console, so jobs can run on a thread pool.
+    """
+    with _console_lock:
+        if not isinstance(sys.stdout, _ThreadConsole):
+            sys.stdout = _ThreadConsole(sys.stdout)
+        console = sys.stdout
+    console.local.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        console.local.buffer = None
+
+def console_captured():
+    """Return whether the current thread's output is being captured."""
+    return isinstance(sys.stdout, _ThreadConsole) and sys.stdout.captured()
+
 def safe_input(prompt, valid_responses=None, default='n'):
     """Safely get user input with validation."""
     if valid_responses is None:
         valid_responses = ['y', 'yes', 'n', 'no']
     
+    # Jobs with captured output never prompt; record the question and the answer taken
+    if console_captured():
+        print(f"{prompt}{default}")
+        return default
+    
     # Check if we're in a non-interactive environment
     if not sys.stdin.isatty():
         logging.info(f"Non-interactive environment, using default: {default}")
@@ -87,8 +165,11 @@ def sanitize_error_message(error_msg, file_path):
     sanitized = re.sub(r'/[^\s]*', '<file_path>', sanitized)
     return sanitized
 
-def validate_pdf_file(file_path):
-    """Validate if the file is a PDF and accessible."""
+def validate_pdf_file(file_path, stream=None):
+    """Validate if the file is a PDF and accessible.
+    
+    The header is read from stream, an open view of the file (see open_input), when one is given.
+    """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
     
@@ -100,15 +181,62 @@ def validate_pdf_file(file_path):
     
     # Basic PDF header check
     try:
-        with open(file_path, 'rb') as f:
-            header = f.read(4)
-            if header != b'%PDF':
-                raise ValueError("File does not appear to be a valid PDF")
+        if stream is not None:
+            stream.seek(0)
+            header = stream.read(4)
+        else:
+            with open(file_path, 'rb') as f:
+                header = f.read(4)
+        if header != b'%PDF':
+            raise ValueError("File does not appear to be a valid PDF")
     except Exception as e:
         raise ValueError(f"Cannot validate PDF file: {e}")
 
+def open_input(input_pdf, replaced=False):
+    """Open an input PDF for reading, memory-mapped where possible.
+    
+    The mapping is shared by the header check, the encryption probe and
+    PdfReader, which then parses it in place: the file is read once through
+    the page cache instead of into a private copy. Empty files, and files
+    that cannot be mapped, are returned as an open file. The caller closes
+    the result.
+    
+    With replaced (the output is about to replace the input), the file is
+    returned unmapped: the open file keeps reading the old inode after the
+    rename, so the streaming engine stays in constant memory. On Windows,
+    which cannot rename over a file that is still open or mapped, it is
+    read into memory and closed instead.
+    
+    A mapped file must not be truncated while it is read. If another
+    process shrinks it, touching the lost pages raises SIGBUS, which kills
+    the process (in batches, the worker; --file-timeout confines that to
+    the one file).
+    """
+    if replaced and os.name == 'nt':
+        with open(input_pdf, 'rb') as f:
+            return io.BytesIO(f.read())
+    f = open(input_pdf, 'rb')
+    if replaced:
+        return f
+    try:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError) as e:
+        logging.debug(f"Cannot map input, reading it as a file: {e}")
+        return f
+    # The mapping stays valid without the descriptor
+    f.close()
+    return mapping
+
+# Content-addressed store used for backups instead of copies next to the inputs (--backup-dir)
+backup_store = None
+
 def create_backup(file_path, backup_dir=None):
     """Create a backup of the original file."""
+    if backup_store is not None and backup_dir is None:
+        backup_path = backup_store.store(file_path)
+        logging.info(f"Backup stored: {backup_path}")
+        return backup_path
+    
     if backup_dir is None:
         backup_dir = os.path.dirname(file_path)
     
@@ -121,26 +249,244 @@ def create_backup(file_path, backup_dir=None):
     logging.info(f"Backup created: {backup_path}")
     return backup_path
 
-def add_password(input_pdf, output_pdf, user_password, owner_password=None, create_backup_flag=True, overwrite=False, permissions=None):
+def replaces_input(input_path, output_path):
+    """Return whether writing output_path would overwrite input_path."""
+    try:
+        return os.path.samefile(input_path, output_path)
+    except OSError:
+        return False
+
+def _copy_container(obj):
+    """Return a shallow copy of a PDF dictionary or array, keeping its class and attributes."""
+    if obj.__class__ is DictionaryObject or obj.__class__ is ArrayObject:
+        copied = obj.__class__(obj)
+        copied.__dict__.update(obj.__dict__)
+        return copied
+    # Streams carry their data in attributes
+    return copy.copy(obj)
+
+def _clone_document(reader):
+    """Clone the reader's object graph into a new PdfWriter in a single pass.
+    
+    Objects are copied from the trailer down (catalog, info, page tree and
+    everything they reference), so catalog-level structures such as outlines,
+    named destinations and forms are preserved and no PageObject wrappers are
+    created. Each object is visited once; references are remapped, in copies
+    of the reader's containers, through a table keyed by the original object
+    number.
+    """
+    root_ref = reader.trailer.raw_get('/Root')
+    if not isinstance(root_ref, IndirectObject):
+        raise ValueError("Document catalog is not an indirect object")
+    
+    writer = PdfWriter()
+    mapping = {}
+    pending = []
+    
+    def import_reference(ref, target=None):
+        key = (ref.idnum, ref.generation)
+        new_ref = mapping.get(key)
+        if new_ref is None:
+            if target is None:
+                writer._objects.append(None)
+                target = IndirectObject(len(writer._objects), 0, writer)
+            new_ref = mapping[key] = target
+            pending.append((new_ref.idnum, reader.get_object(ref)))
+        return new_ref
+    
+    # Reuse the writer's own catalog, page tree and info slots for the originals
+    root_object = reader.get_object(root_ref)
+    pages_ref = root_object.raw_get('/Pages') if isinstance(root_object, DictionaryObject) else None
+    if not isinstance(pages_ref, IndirectObject):
+        raise ValueError("Document page tree is not an indirect object")
+    import_reference(root_ref, writer._root)
+    import_reference(pages_ref, writer._pages)
+    info_ref = reader.trailer.raw_get('/Info') if '/Info' in reader.trailer else None
+    if isinstance(info_ref, IndirectObject):
+        import_reference(info_ref, writer._info)
+    
+    while pending:
+        idnum, obj = pending.pop()
+        if obj is None:
+            obj = NullObject()
+        
+        # Containers are copied before their references are remapped, so the reader's
+        # cached objects stay intact for the page-by-page fallback if the clone fails
+        if isinstance(obj, (dict, list)):
+            obj = _copy_container(obj)
+        stack = [obj]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, dict):
+                entries = item.items()
+                assign = dict.__setitem__
+            elif isinstance(item, list):
+                entries = enumerate(item)
+                assign = list.__setitem__
+            else:
+                continue
+            # Values are replaced in place, so the container never changes size
+            for key, value in entries:
+                if value.__class__ is IndirectObject:
+                    assign(item, key, import_reference(value))
+                elif isinstance(value, (dict, list)):
+                    value = _copy_container(value)
+                    assign(item, key, value)
+                    stack.append(value)
+        
+        writer._objects[idnum - 1] = obj
+    
+    writer._root_object = writer._objects[writer._root.idnum - 1]
+    return writer
+
+def _copy_pages(reader):
+    """Copy a document page by page into a new PdfWriter."""
+    writer = PdfWriter()
+    total_pages = len(reader.pages)
+    for i, page in enumerate(reader.pages):
+        writer.add_page(page)
+        if total_pages > 10 and i % 10 == 0:  # Progress for large files
+            print(f"Processed {i+1}/{total_pages} pages...")
+    return writer
+
+def copy_document(reader):
+    """Return a PdfWriter holding a copy of the (decrypted) reader's document.
+    
+    Uses the whole-document clone and falls back to page-by-page copying when
+    the document structure cannot be cloned directly.
+    """
+    try:
+        return _clone_document(reader)
+    except Exception as e:
+        logging.debug(f"Whole-document clone unavailable, copying pages: {e}")
+        return _copy_pages(reader)
+
+# Processing engines: 'standard' loads the document into PyPDF2 objects,
+# 'streaming' rewrites it object by object in constant memory.
+ENGINES = ('auto', 'standard', 'streaming')
+STREAMING_THRESHOLD_BYTES = 256 * 1024 * 1024
+
+def select_engine(input_pdf, engine='auto'):
+    """Resolve 'auto' to a concrete engine based on the input file size."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    if engine == 'auto':
+        return 'streaming' if os.path.getsize(input_pdf) >= STREAMING_THRESHOLD_BYTES else 'standard'
+    return engine
+
+def _print_object_progress(done, total):
+    """Progress callback for the streaming engine."""
+    if total > 1000:
+        print(f"Processed {done}/{total} objects...")
+
+def fsync_directory(directory):
+    """Flush a directory entry change (such as a rename) to disk where the platform allows it."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError as e:
+        # Directories cannot be opened on Windows; renames there are not made durable this way
+        logging.debug(f"Cannot open directory for fsync: {e}")
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def sync_outputs(paths):
+    """Make finished output files and their directories durable, each directory once."""
+    directories = set()
+    for path in paths:
+        with open(path, "rb") as f:
+            os.fsync(f.fileno())
+        directories.add(os.path.dirname(os.path.abspath(path)))
+    for directory in sorted(directories):
+        fsync_directory(directory)
+    logging.info(f"Synced {len(paths)} output files in {len(directories)} directories")
+
+# Outputs left as temporary files on this thread (see deferred_outputs)
+_deferred = threading.local()
+
+@contextlib.contextmanager
+def deferred_outputs():
+    """Leave the files atomic_output writes on this thread as temporary files instead of renaming them.
+    
+    Yields a list that fills with (temp_path, output_pdf, durability)
+    tuples, to be finished later with commit_output. Only the small tuples
+    have to travel between processes; the data stays on disk.
+    """
+    writes = []
+    _deferred.writes = writes
+    try:
+        yield writes
+    finally:
+        _deferred.writes = None
+
+def commit_output(temp_path, output_pdf, durability='none'):
+    """Finish an output left by deferred_outputs(): fsync it if asked, then rename it over output_pdf."""
+    try:
+        if durability == 'file':
+            with open(temp_path, "rb") as f:
+                os.fsync(f.fileno())
+        os.replace(temp_path, output_pdf)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    if durability == 'file':
+        fsync_directory(os.path.dirname(os.path.abspath(output_pdf)))
+
+@contextlib.contextmanager
+def atomic_output(output_pdf, durability='none'):
+    """Open a temporary file next to output_pdf and replace output_pdf with it once writing succeeds.
+    
+    A failed or interrupted write never leaves a truncated output_pdf. With
+    durability 'file' the data and the rename are fsynced before returning;
+    'none' and 'batch' leave flushing to the OS (see sync_outputs). Inside
+    deferred_outputs() the temporary file is left for commit_output.
+    """
+    temp_path = f"{output_pdf}.{os.getpid()}.tmp"
+    writes = getattr(_deferred, 'writes', None)
+    kept = False
+    try:
+        with open(temp_path, "wb") as f:
+            yield f
+            if durability == 'file' and writes is None:
+                f.flush()
+                os.fsync(f.fileno())
+        if writes is not None:
+            writes.append((temp_path, output_pdf, durability))
+            kept = True
+            return
+        os.replace(temp_path, output_pdf)
+    finally:
+        if not kept and os.path.exists(temp_path):
+            os.remove(temp_path)
+    if durability == 'file':
+        fsync_directory(os.path.dirname(os.path.abspath(output_pdf)))
+
+def _write_streaming(reader, output_pdf, durability='none', **options):
+    """Write the document behind reader to output_pdf with the streaming engine."""
+    # The input is read lazily, so it stays intact until the finished output replaces it
+    with atomic_output(output_pdf, durability) as f:
+        count = rewrite_pdf(reader, f, progress=_print_object_progress, **options)
+    logging.info(f"Streamed {count} objects")
+
+# Permissions given to documents protected without explicit permissions
+DEFAULT_PERMISSIONS = {'print': True, 'modify': False, 'copy': True, 'annotate': True}
+
+def add_password(input_pdf, output_pdf, user_password, owner_password=None, create_backup_flag=True, overwrite=False, permissions=None, engine='auto', durability='none'):
     """Add password protection to PDF file."""
+    source = None
     try:
         logging.info(f"Adding password protection to: {input_pdf}")
         
-        # Validate input file
-        validate_pdf_file(input_pdf)
+        # Map the input once for every read that follows (read it if it is about to be replaced), then validate it
+        source = open_input(input_pdf, replaces_input(input_pdf, output_pdf)) if os.access(input_pdf, os.R_OK) else None
+        validate_pdf_file(input_pdf, source)
         
-        # Create backup if requested
-        backup_path = None
-        if create_backup_flag:
-            try:
-                backup_path = create_backup(input_pdf)
-            except Exception as e:
-                logging.warning(f"Could not create backup: {e}")
-                if safe_input("Continue without backup? (y/N): ") not in ['y', 'yes']:
-                    return False
-        
-        # Read the PDF
-        reader = PdfReader(input_pdf)
+        # Parse the mapped PDF (the streaming engine reads objects on demand)
+        requested_engine = engine
+        engine = select_engine(input_pdf, engine)
+        reader = PdfReader(source)
         
         # Check if PDF is already encrypted
         if reader.is_encrypted:
@@ -162,15 +508,15 @@ def add_password(input_pdf, output_pdf, user_password, owner_password=None, crea
             if safe_input(f"Output file {os.path.basename(output_pdf)} exists. Overwrite? (y/N): ") not in ['y', 'yes']:
                 return False
         
-        # Create a new PDF writer
-        writer = PdfWriter()
-        total_pages = len(reader.pages)
-        
-        logging.info(f"Processing {total_pages} pages...")
-        for i, page in enumerate(reader.pages):
-            writer.add_page(page)
-            if total_pages > 10 and i % 10 == 0:  # Progress for large files
-                print(f"Processed {i+1}/{total_pages} pages...")
+        # Back up the input only if the output is about to replace it
+        backup_path = None
+        if create_backup_flag and replaces_input(input_pdf, output_pdf):
+            try:
+                backup_path = create_backup(input_pdf)
+            except Exception as e:
+                logging.warning(f"Could not create backup: {e}")
+                if safe_input("Continue without backup? (y/N): ") not in ['y', 'yes']:
+                    return False
         
         # Set up encryption parameters
         if owner_password is None:
@@ -178,24 +524,40 @@ def add_password(input_pdf, output_pdf, user_password, owner_password=None, crea
         
         # Default permissions if not specified
         if permissions is None:
-            permissions = {
-                'print': True,
-                'modify': False,
-                'copy': True,
-                'annotate': True
-            }
-        
-        # Apply encryption
-        writer.encrypt(
-            user_password=user_password,
-            owner_password=owner_password,
-            use_128bit=True,
-            permissions_flag=_convert_permissions_to_flag(permissions)
-        )
-        
-        # Save the encrypted PDF
-        with open(output_pdf, "wb") as f:
-            writer.write(f)
+            permissions = DEFAULT_PERMISSIONS
+        permissions_flag = _convert_permissions_to_flag(permissions)
+        
+        streamed = False
+        if engine == 'streaming':
+            try:
+                # Encrypt strings and raw stream bytes in place, copying everything else
+                logging.info("Encrypting document with the streaming engine...")
+                encryption, encrypt_entry, file_id = standard_encryption(
+                    user_password, owner_password, permissions_flag, reader.trailer.get('/ID'))
+                _write_streaming(reader, output_pdf, durability, decrypt=reader.is_encrypted, encryption=encryption,
+                                 encrypt_entry=encrypt_entry, file_id=file_id)
+                streamed = True
+            except StreamEngineError as e:
+                if requested_engine != 'auto':
+                    raise
+                logging.warning(f"Streaming engine cannot rewrite this file, using standard engine: {e}")
+        
+        if not streamed:
+            # Copy the document into a new PDF writer
+            logging.info("Copying document...")
+            writer = copy_document(reader)
+            
+            # Apply encryption
+            writer.encrypt(
+                user_password=user_password,
+                owner_password=owner_password,
+                use_128bit=True,
+                permissions_flag=permissions_flag
+            )
+            
+            # Save the encrypted PDF
+            with atomic_output(output_pdf, durability) as f:
+                writer.write(f)
         
         logging.info(f"Successfully added password protection to PDF: {output_pdf}")
         print(f"Success! Password-protected PDF saved as: {output_pdf}")
@@ -210,6 +572,10 @@ def add_password(input_pdf, output_pdf, user_password, owner_password=None, crea
         logging.error(f"Error adding password to PDF: {sanitized_error}")
         print("An error occurred while processing the file. Check logs for details.")
         return False
+    
+    finally:
+        if source is not None:
+            source.close()
 
 def _convert_permissions_to_flag(permissions):
     """Convert permissions dict to PyPDF2 permissions flag."""
@@ -225,17 +591,60 @@ def _convert_permissions_to_flag(permissions):
         flag |= 32  # Add or modify text annotations
     return flag
 
-def remove_password(input_pdf, output_pdf, password, create_backup_flag=True, overwrite=False):
+def remove_password(input_pdf, output_pdf, password, create_backup_flag=True, overwrite=False, engine='auto', durability='none'):
     """Remove password from PDF file with enhanced error handling and logging."""
+    source = None
     try:
         logging.info(f"Processing file: {input_pdf}")
         
-        # Validate input file
-        validate_pdf_file(input_pdf)
+        # Map the input once for every read that follows (read it if it is about to be replaced), then validate it
+        source = open_input(input_pdf, replaces_input(input_pdf, output_pdf)) if os.access(input_pdf, os.R_OK) else None
+        validate_pdf_file(input_pdf, source)
         
-        # Create backup if requested
+        # Skip unencrypted files from the trailer alone, before any backup or full parse
+        try:
+            encrypted = probe_pdf(source, count_pages=False)['encrypted']
+        except ProbeError as e:
+            logging.debug(f"Encryption probe failed, parsing the whole file: {e}")
+            encrypted = True
+        if not encrypted:
+            logging.warning("PDF is not password protected")
+            print("Warning: This PDF is not password protected.")
+            return True
+        
+        # Parse the mapped PDF (the streaming engine reads objects on demand)
+        requested_engine = engine
+        engine = select_engine(input_pdf, engine)
+        reader = PdfReader(source)
+        
+        # Check if PDF is encrypted
+        if not reader.is_encrypted:
+            logging.warning("PDF is not password protected")
+            print("Warning: This PDF is not password protected.")
+            return True
+        
+        # Attempt to decrypt
+        if not key_cache.decrypt(reader, password):
+            logging.error("Incorrect password provided")
+            print("Error: Incorrect password. Please try again.")
+            return False
+        
+        # Validate output path for security
+        try:
+            output_pdf = validate_output_path(output_pdf)
+        except ValueError as e:
+            logging.error(f"Invalid output path: {e}")
+            print(f"Error: {e}")
+            return False
+
+        # Check if output file exists and handle overwrite
+        if os.path.exists(output_pdf) and not overwrite:
+            if safe_input(f"Output file {os.path.basename(output_pdf)} exists. Overwrite? (y/N): ") not in ['y', 'yes']:
+                return False
+        
+        # Back up the input only if the output is about to replace it
         backup_path = None
-        if create_backup_flag:
+        if create_backup_flag and replaces_input(input_pdf, output_pdf):
             try:
                 backup_path = create_backup(input_pdf)
             except Exception as e:
@@ -243,21 +652,110 @@ def remove_password(input_pdf, output_pdf, password, create_backup_flag=True, ov
                 if safe_input("Continue without backup? (y/N): ") not in ['y', 'yes']:
                     return False
         
-        # Read the encrypted PDF
-        reader = PdfReader(input_pdf)
+        streamed = False
+        if engine == 'streaming':
+            try:
+                logging.info("Rewriting document with the streaming engine...")
+                _write_streaming(reader, output_pdf, durability, decrypt=True)
+                streamed = True
+            except StreamEngineError as e:
+                if requested_engine != 'auto':
+                    raise
+                logging.warning(f"Streaming engine cannot rewrite this file, using standard engine: {e}")
+        
+        if not streamed:
+            # Copy the document into a new PDF writer
+            logging.info("Copying document...")
+            writer = copy_document(reader)
+            
+            # Save the unlocked PDF
+            with atomic_output(output_pdf, durability) as f:
+                writer.write(f)
+        
+        logging.info(f"Successfully removed password from PDF: {output_pdf}")
+        print(f"Success! Unlocked PDF saved as: {output_pdf}")
+        
+        if backup_path:
+            print(f"Backup saved as: {backup_path}")
+        
+        return True
+        
+    except Exception as e:
+        sanitized_error = sanitize_error_message(str(e), input_pdf)
+        logging.error(f"Error processing PDF: {sanitized_error}")
+        print("An error occurred while processing the file. Check logs for details.")
+        return False
+    
+    finally:
+        if source is not None:
+            source.close()
+
+def _writer_encryption(encryption):
+    """Return the use_128bit flag with which PdfWriter.encrypt re-creates encryption's handler, or None if it cannot."""
+    encrypt_metadata = encryption.entry.get("/EncryptMetadata", True)
+    if getattr(encrypt_metadata, "value", encrypt_metadata) is False:
+        return None
+    if (encryption.algV, encryption.algR, encryption.key_size) == (1, 2, 40):
+        return False
+    if (encryption.algV, encryption.algR, encryption.key_size) == (2, 3, 128):
+        return True
+    return None
+
+def rekey_password(input_pdf, output_pdf, old_password, new_user_password=None, new_owner_password=None, create_backup_flag=True, overwrite=False, permissions=None, engine='auto', durability='none'):
+    """Change the passwords and/or permissions of an encrypted PDF in a single pass.
+    
+    Passwords left as None keep their current value, and permissions=None
+    keeps the current permission flags. The document keeps its security
+    handler: an AES-128 or AES-256 file is re-encrypted with AES, not RC4.
+    """
+    source = None
+    try:
+        logging.info(f"Changing password of: {input_pdf}")
+        
+        # Map the input once for every read that follows (read it if it is about to be replaced), then validate it
+        source = open_input(input_pdf, replaces_input(input_pdf, output_pdf)) if os.access(input_pdf, os.R_OK) else None
+        validate_pdf_file(input_pdf, source)
+        
+        # Parse the mapped PDF (the streaming engine reads objects on demand)
+        requested_engine = engine
+        engine = select_engine(input_pdf, engine)
+        reader = PdfReader(source)
         
         # Check if PDF is encrypted
         if not reader.is_encrypted:
-            logging.warning("PDF is not password protected")
-            print("Warning: This PDF is not password protected.")
-            return True
+            logging.error("PDF is not password protected")
+            print("Error: This PDF is not password protected. Use --add to protect it.")
+            return False
         
         # Attempt to decrypt
-        if not reader.decrypt(password):        
+        password_type = key_cache.decrypt(reader, old_password)
+        if not password_type:
             logging.error("Incorrect password provided")
             print("Error: Incorrect password. Please try again.")
             return False
         
+        # Work out the passwords and permissions to keep
+        if new_owner_password is None:
+            if password_type != PasswordType.OWNER_PASSWORD:
+                logging.error("Owner password is unknown and no new owner password was given")
+                print("Error: The current password is not the owner password. Specify a new owner password.")
+                return False
+            new_owner_password = old_password
+        if new_user_password is None:
+            if password_type == PasswordType.OWNER_PASSWORD:
+                try:
+                    new_user_password = recover_user_password(reader._encryption, old_password)
+                except StreamEngineError as e:
+                    logging.error(f"Cannot keep the user password: {e}")
+                    print("Error: The user password cannot be recovered from this file. Specify a new user password.")
+                    return False
+            else:
+                new_user_password = old_password
+        if permissions is None:
+            permissions_flag = reader._encryption.entry["/P"]
+        else:
+            permissions_flag = _convert_permissions_to_flag(permissions)
+        
         # Validate output path for security
         try:
             output_pdf = validate_output_path(output_pdf)
@@ -271,22 +769,62 @@ def remove_password(input_pdf, output_pdf, password, create_backup_flag=True, ov
             if safe_input(f"Output file {os.path.basename(output_pdf)} exists. Overwrite? (y/N): ") not in ['y', 'yes']:
                 return False
         
-        # Create a new PDF writer
-        writer = PdfWriter()
-        total_pages = len(reader.pages)
+        # Back up the input only if the output is about to replace it
+        backup_path = None
+        if create_backup_flag and replaces_input(input_pdf, output_pdf):
+            try:
+                backup_path = create_backup(input_pdf)
+            except Exception as e:
+                logging.warning(f"Could not create backup: {e}")
+                if safe_input("Continue without backup? (y/N): ") not in ['y', 'yes']:
+                    return False
         
-        logging.info(f"Processing {total_pages} pages...")
-        for i, page in enumerate(reader.pages):
-            writer.add_page(page)
-            if total_pages > 10 and i % 10 == 0:  # Progress for large files
-                print(f"Processed {i+1}/{total_pages} pages...")
+        # Keep the document's handler (version, revision, cipher) so AES files stay AES
+        encryption, encrypt_entry, file_id = matching_encryption(
+            reader._encryption, new_user_password, new_owner_password, permissions_flag, reader.trailer.get('/ID'))
         
-        # Save the unlocked PDF
-        with open(output_pdf, "wb") as f:
-            writer.write(f)
+        streamed = False
+        if engine == 'streaming':
+            try:
+                # Decrypt and re-encrypt each string and stream as it is copied
+                logging.info("Re-encrypting document with the streaming engine...")
+                _write_streaming(reader, output_pdf, durability, decrypt=True, encryption=encryption,
+                                 encrypt_entry=encrypt_entry, file_id=file_id)
+                streamed = True
+            except StreamEngineError as e:
+                if requested_engine != 'auto':
+                    raise
+                logging.warning(f"Streaming engine cannot rewrite this file, using standard engine: {e}")
         
-        logging.info(f"Successfully removed password from PDF: {output_pdf}")
-        print(f"Success! Unlocked PDF saved as: {output_pdf}")
+        if not streamed:
+            # Copy the decrypted document into a new PDF writer
+            logging.info("Copying document...")
+            writer = copy_document(reader)
+            
+            use_128bit = _writer_encryption(reader._encryption)
+            if use_128bit is not None:
+                # Apply the new encryption
+                writer.encrypt(
+                    user_password=new_user_password,
+                    owner_password=new_owner_password,
+                    use_128bit=use_128bit,
+                    permissions_flag=permissions_flag
+                )
+                
+                # Save the re-encrypted PDF
+                with atomic_output(output_pdf, durability) as f:
+                    writer.write(f)
+            else:
+                # PdfWriter only writes RC4; encrypt the decrypted copy with the streaming engine instead
+                plain = io.BytesIO()
+                writer.write(plain)
+                plain.seek(0)
+                with atomic_output(output_pdf, durability) as f:
+                    rewrite_pdf(PdfReader(plain), f, encryption=encryption, encrypt_entry=encrypt_entry,
+                                file_id=file_id)
+        
+        logging.info(f"Successfully changed password of PDF: {output_pdf}")
+        print(f"Success! Re-keyed PDF saved as: {output_pdf}")
         
         if backup_path:
             print(f"Backup saved as: {backup_path}")
@@ -295,50 +833,966 @@ def remove_password(input_pdf, output_pdf, password, create_backup_flag=True, ov
         
     except Exception as e:
         sanitized_error = sanitize_error_message(str(e), input_pdf)
-        logging.error(f"Error processing PDF: {sanitized_error}")
+        logging.error(f"Error changing PDF password: {sanitized_error}")
         print("An error occurred while processing the file. Check logs for details.")
         return False
+    
+    finally:
+        if source is not None:
+            source.close()
+
+class _OutputWriter:
+    """Binary stream over a caller's output: a file object, a bytearray (appended to) or a writable buffer.
+    
+    Offsets are counted from where writing started, as PdfWriter needs
+    them for the cross-reference table.
+    """
+    
+    def __init__(self, target):
+        self.target = target
+        self.position = 0
+        if hasattr(target, 'write'):
+            seekable = getattr(target, 'seekable', None)
+            self.start = target.tell() if seekable is not None and seekable() else None
+            self.view = None
+        elif isinstance(target, bytearray):
+            self.start = len(target)
+            self.view = None
+        else:
+            self.start = 0
+            self.view = memoryview(target).cast('B')
+            if self.view.readonly:
+                raise TypeError("output buffer is read-only")
+    
+    def write(self, data):
+        size = len(data)
+        if self.view is not None:
+            if self.position + size > len(self.view):
+                raise ValueError("output buffer is too small for the PDF")
+            self.view[self.position:self.position + size] = data
+        elif isinstance(self.target, bytearray):
+            self.target += data
+        else:
+            self.target.write(data)
+        self.position += size
+        return size
+    
+    def tell(self):
+        return self.position
+    
+    def rewind(self):
+        """Discard what was written so far; returns False if the target cannot be rewound."""
+        if hasattr(self.target, 'write'):
+            if self.start is None:
+                return False
+            self.target.seek(self.start)
+            self.target.truncate()
+        elif isinstance(self.target, bytearray):
+            del self.target[self.start:]
+        self.position = 0
+        return True
+
+def _open_source(data):
+    """Return a seekable binary stream over a PDF given as bytes, a bytes-like object or a file object."""
+    if hasattr(data, 'read'):
+        if getattr(data, 'seekable', None) is not None and data.seekable():
+            data.seek(0)
+            return data
+        return io.BytesIO(data.read())
+    if isinstance(data, bytes):
+        # BytesIO shares an immutable bytes object instead of copying it
+        return io.BytesIO(data)
+    view = memoryview(data)
+    if isinstance(view.obj, bytes) and view.c_contiguous and view.nbytes == len(view.obj):
+        return io.BytesIO(view.obj)
+    # Mutable buffers are copied once, so the caller cannot change them mid-parse
+    return io.BytesIO(view)
+
+def _read_pdf_bytes(data):
+    """Return (stream, reader) for an in-memory PDF after checking its header."""
+    stream = _open_source(data)
+    if stream.read(4) != b'%PDF':
+        raise ValueError("Data does not appear to be a valid PDF")
+    stream.seek(0)
+    return stream, PdfReader(stream)
+
+def _emit_pdf(write, output, engine, size):
+    """Write a PDF with write(stream, engine) into output, or return it as bytes when output is None.
+    
+    'auto' uses the streaming engine for large documents and falls back to
+    the standard engine when it cannot rewrite one.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    concrete = engine
+    if engine == 'auto':
+        concrete = 'streaming' if size >= STREAMING_THRESHOLD_BYTES else 'standard'
+    stream = _OutputWriter(io.BytesIO() if output is None else output)
+    try:
+        write(stream, concrete)
+    except StreamEngineError as e:
+        if engine != 'auto' or not stream.rewind():
+            raise
+        logging.warning(f"Streaming engine cannot rewrite this document, using standard engine: {e}")
+        write(stream, 'standard')
+    if output is None:
+        return stream.target.getvalue()
+    return stream.position
+
+def remove_password_bytes(data, password, output=None, engine='auto'):
+    """Remove the password from a PDF held in memory.
+    
+    No files are touched: there is no path validation and no backup.
+    
+    :param data: The PDF as bytes, a bytes-like object or a binary file object (read from its start).
+    :param output: None to return the result as bytes, or a binary file object, a bytearray (appended to)
+        or a writable buffer (filled from its start) to write it into.
+    :return: The unlocked PDF, or the number of bytes written to output. An unencrypted PDF is passed through unchanged.
+    :raises ValueError: If data is not a PDF or the password is wrong.
+    """
+    stream, reader = _read_pdf_bytes(data)
+    size = stream.seek(0, io.SEEK_END)
+    
+    if not reader.is_encrypted:
+        if output is None and isinstance(data, bytes):
+            return data
+        stream.seek(0)
+        return _emit_pdf(lambda out, engine: shutil.copyfileobj(stream, out), output, 'standard', size)
+    
+    if not key_cache.decrypt(reader, password):
+        raise ValueError("Incorrect password")
+    
+    def write(out, engine):
+        if engine == 'streaming':
+            rewrite_pdf(reader, out, decrypt=True)
+        else:
+            copy_document(reader).write(out)
+    return _emit_pdf(write, output, engine, size)
+
+def add_password_bytes(data, user_password, owner_password=None, permissions=None, output=None, engine='auto'):
+    """Password-protect a PDF held in memory; see remove_password_bytes() for data, output and the result.
+    
+    An already encrypted PDF is re-encrypted only if it opens without a
+    password; otherwise ValueError is raised.
+    """
+    stream, reader = _read_pdf_bytes(data)
+    size = stream.seek(0, io.SEEK_END)
+    if reader.is_encrypted and not key_cache.decrypt(reader, ""):
+        raise ValueError("PDF is already password protected")
+    
+    if owner_password is None:
+        owner_password = user_password
+    permissions_flag = _convert_permissions_to_flag(permissions if permissions is not None else DEFAULT_PERMISSIONS)
+    
+    def write(out, engine):
+        if engine == 'streaming':
+            encryption, encrypt_entry, file_id = standard_encryption(
+                user_password, owner_password, permissions_flag, reader.trailer.get('/ID'))
+            rewrite_pdf(reader, out, decrypt=reader.is_encrypted, encryption=encryption,
+                        encrypt_entry=encrypt_entry, file_id=file_id)
+        else:
+            writer = copy_document(reader)
+            writer.encrypt(user_password=user_password, owner_password=owner_password, use_128bit=True,
+                           permissions_flag=permissions_flag)
+            writer.write(out)
+    return _emit_pdf(write, output, engine, size)
+
+def _read_cgroup_cpu_limit():
+    """Return the CPU limit imposed by the cgroup quota, or None if unlimited."""
+    # cgroup v2
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max' and int(period) > 0:
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    
+    # cgroup v1
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read().strip())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read().strip())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    
+    return None
+
+def available_cpu_count():
+    """Return the number of CPUs this process may use, honouring affinity and cgroup quotas."""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        count = os.cpu_count() or 1
+    
+    limit = _read_cgroup_cpu_limit()
+    if limit is not None:
+        count = min(count, max(1, int(limit)))
+    
+    return max(1, count)
+
+def parse_jobs(value):
+    """Parse a --jobs value ('auto' or a positive integer) into a worker count."""
+    if str(value).lower() == 'auto':
+        return available_cpu_count()
+    try:
+        jobs = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid jobs value: {value!r} (expected a positive integer or 'auto')")
+    if jobs < 1:
+        raise argparse.ArgumentTypeError("jobs must be at least 1")
+    return jobs
+
+def parse_timeout(value):
+    """Parse a --file-timeout value in seconds."""
+    try:
+        timeout = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid timeout: {value!r} (expected a number of seconds)")
+    if not timeout > 0:
+        raise argparse.ArgumentTypeError("timeout must be positive")
+    return timeout
+
+# Derived AES-256 keys reused across the documents processed by this process
+key_cache = DerivedKeyCache()
+
+# Files queued per worker process in parallel batches
+MAX_PENDING_PER_WORKER = 4
+
+# Pipelined batches: threads prefetching inputs and writing outputs, and files
+# each queue between the stages holds per worker process
+PIPELINE_READ_THREADS = 4
+PIPELINE_WRITE_THREADS = 2
+PIPELINE_QUEUE_PER_WORKER = 2
+
+# Orders in which parallel batches hand out files
+SCHEDULES = ('input', 'largest-first')
+
+# Estimated peak memory of a job for --memory-budget: the standard engine holds the
+# file and the objects parsed from it, the streaming engine about one object at a time
+STANDARD_MEMORY_FACTOR = 2
+STREAMING_MEMORY_ESTIMATE = 32 * 1024 * 1024
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+def parse_size(value):
+    """Parse a --memory-budget value such as 512M or 2G (binary units) into bytes."""
+    text = str(value).strip().upper()
+    if text.endswith('IB'):
+        text = text[:-2]
+    elif text.endswith('B'):
+        text = text[:-1]
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ''
+    try:
+        size = int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r} (expected bytes or a number with K, M, G or T)")
+    if size < 1:
+        raise argparse.ArgumentTypeError("size must be positive")
+    return size
+
+# How outputs are made durable: nothing beyond the atomic rename, fsync per file, or one sync at batch end
+DURABILITY_POLICIES = ('none', 'file', 'batch')
+
+# Threads and files per round used to stat inputs and outputs when deciding what to skip
+STAT_THREADS = 16
+STAT_CHUNK_SIZE = 1024
+
+# Output file name prefix for each batch operation
+OUTPUT_PREFIXES = {'remove': 'unlocked_', 'add': 'protected_', 'rekey': 'rekeyed_'}
+
+def _batch_output_path(input_file, output_dir, operation):
+    """Return the output path used for input_file in batch mode."""
+    prefix = OUTPUT_PREFIXES[operation]
+    if output_dir:
+        return os.path.join(output_dir, f"{prefix}{os.path.basename(input_file)}")
+    return f"{prefix}{input_file}"
+
+def find_keyring_password(input_pdf, keyring):
+    """Return the keyring password that opens input_pdf, checked against its /Encrypt dictionary only."""
+    try:
+        encryption = read_encryption(input_pdf)
+    except (OSError, ProbeError, NotImplementedError) as e:
+        logging.debug(f"Cannot check keyring passwords without a full parse: {e}")
+        return None
+    if encryption is None:
+        return None
+    return keyring.match(encryption, key_cache.verify)
+
+def _process_file(operation, input_file, output_file, password, backup=True, overwrite=False,
+                  owner_password=None, permissions=None, engine='auto', new_password=None, keyring=None,
+                  durability='none'):
+    """Run a single add/remove/rekey operation on one file."""
+    if keyring is not None and operation in ('remove', 'rekey'):
+        known_password = find_keyring_password(input_file, keyring)
+        if known_password is not None:
+            password = known_password
+        else:
+            logging.info(f"No keyring password matches: {input_file}")
+    if password is None:
+        logging.error(f"No password given for: {input_file}")
+        print("Error: No password given for this file.")
+        return False
+    if operation == 'remove':
+        return remove_password(input_file, output_file, password, backup, overwrite, engine, durability)
+    if operation == 'rekey':
+        return rekey_password(input_file, output_file, password, new_password, owner_password,
+                              backup, overwrite, permissions, engine, durability)
+    return add_password(input_file, output_file, password, owner_password, backup, overwrite, permissions,
+                        engine, durability)
 
-def process_batch(file_list, password, output_dir=None, backup=True, overwrite=False, operation='remove', owner_password=None, permissions=None):
-    """Process multiple PDF files for add/remove operations."""
+# Keyring of a pool worker process, kept across tasks so its ordering learns
+_worker_keyring = None
+
+def init_batch_worker(keyring=None, backup_root=None):
+    """Make a pool worker non-interactive so prompts fall back to their defaults."""
+    global _worker_keyring, backup_store
+    sys.stdin = open(os.devnull)
+    # Ctrl+C stops the parent from queueing more files; files already handed out are finished
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_keyring = keyring
+    backup_store = BackupStore(backup_root) if backup_root else None
+
+def process_file_worker(operation, input_file, output_file, password, options, fingerprint_input=False, keyring=None):
+    """Process one file without prompting and return a structured result for the parent.
+    
+    Safe to call from threads as well as pool processes; keyring overrides
+    the one the worker was initialized with.
+    """
+    buffer = io.StringIO()
+    hits, misses = key_cache.stats()
+    info = _input_fingerprint(input_file) if fingerprint_input else None
+    try:
+        with captured_console(buffer):
+            success = _process_file(operation, input_file, output_file, password,
+                                    keyring=keyring if keyring is not None else _worker_keyring, **options)
+    except Exception as e:
+        success = False
+        logging.error(f"Worker error: {sanitize_error_message(str(e), input_file)}")
+    
+    return {
+        'input': input_file,
+        'output': output_file,
+        'success': bool(success),
+        'messages': buffer.getvalue().splitlines(),
+        'key_cache': (key_cache.hits - hits, key_cache.misses - misses),
+        'fingerprint': info,
+        'params': parameter_fingerprint(operation, options),
+    }
+
+def _transform_file_worker(operation, input_file, output_file, password, options, fingerprint_input=False):
+    """Like process_file_worker, but leave the outputs as temporary files listed in result['writes'].
+    
+    The data is written here, in the worker; only the fsync (with
+    durability 'file') and the rename are left to _commit_result_outputs.
+    """
+    with deferred_outputs() as writes:
+        result = process_file_worker(operation, input_file, output_file, password, options, fingerprint_input)
+    result['writes'] = writes
+    return result
+
+def _commit_result_outputs(result):
+    """Commit the outputs of a _transform_file_worker result; the result fails if one cannot be committed."""
+    for temp_path, output_file, durability in result.pop('writes'):
+        try:
+            commit_output(temp_path, output_file, durability)
+        except OSError as e:
+            logging.error(f"Cannot write output: {sanitize_error_message(str(e), result['input'])}")
+            result['messages'].append(f"Error: Cannot write {os.path.basename(output_file)}: {e.strerror}")
+            result['success'] = False
+    return result
+
+def parameter_fingerprint(operation, options):
+    """Return a short hash of the settings that shape an output, without the passwords themselves."""
+    permissions = options.get('permissions')
+    settings = {
+        'operation': operation,
+        'permissions': _convert_permissions_to_flag(permissions) if permissions is not None else None,
+        'owner_password': bool(options.get('owner_password')),
+        'new_password': bool(options.get('new_password')),
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+def is_up_to_date(input_file, output_file, operation, params, journal=None):
+    """Return whether output_file is current for input_file, from stat() alone when possible.
+    
+    Like make, the output is current when it is newer than the input. When
+    the journal has a record for the file, it must also have been made with
+    the same parameters; an input that was only touched since is compared
+    by content hash.
+    """
+    try:
+        input_stat = os.stat(input_file)
+        output_stat = os.stat(output_file)
+    except OSError:
+        return False
+    
+    record = journal.latest(operation, input_file) if journal is not None else None
+    if record is not None and record.params != params:
+        return False
+    if output_stat.st_mtime_ns >= input_stat.st_mtime_ns:
+        return True
+    
+    if record is None or not record.sha256 or record.size != input_stat.st_size:
+        return False
+    try:
+        return file_digest(input_file)[0] == record.sha256
+    except OSError:
+        return False
+
+def _filter_jobs(batch_jobs, keep, on_skip):
+    """Yield the jobs for which keep(job) is true, checking a chunk of them at a time on a thread pool.
+    
+    The checks are mostly stat() calls, which release the GIL, so their
+    latency overlaps on a cold cache or network storage.
+    """
+    with ThreadPoolExecutor(max_workers=STAT_THREADS) as pool:
+        while True:
+            chunk = list(itertools.islice(batch_jobs, STAT_CHUNK_SIZE))
+            if not chunk:
+                return
+            for job, wanted in zip(chunk, pool.map(keep, chunk)):
+                if wanted:
+                    yield job
+                else:
+                    on_skip(job)
+
+def _input_fingerprint(input_file):
+    """Return the journal fingerprint of an input taken before processing, or None if it cannot be read."""
+    try:
+        return fingerprint(input_file)
+    except OSError:
+        return None
+
+def _batch_jobs(file_list, password, options, password_map=None):
+    """Yield (input_file, password, options) for each file, applying per-file manifest credentials."""
+    for item in file_list:
+        if isinstance(item, tuple):
+            input_file, file_credentials = item
+        else:
+            input_file = item
+            file_credentials = password_map.lookup(input_file) if password_map is not None else None
+        
+        if not file_credentials:
+            yield input_file, password, options
+            continue
+        
+        file_options = dict(options)
+        for key in ('owner_password', 'new_password', 'permissions'):
+            if file_credentials[key] is not None:
+                file_options[key] = file_credentials[key]
+        file_password = file_credentials['password'] if file_credentials['password'] is not None else password
+        yield input_file, file_password, file_options
+
+def _file_size(path):
+    """Return the size of a file, or 0 if it cannot be statted (it then fails quickly anyway)."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def _largest_first(batch_jobs):
+    """Return the jobs ordered by input size, largest first (LPT), statting the files on a thread pool.
+    
+    Starting the longest files first keeps one big file picked up last from
+    stretching the batch; jobs of equal size keep their order.
+    """
+    batch_jobs = list(batch_jobs)
+    with ThreadPoolExecutor(max_workers=STAT_THREADS) as pool:
+        sizes = list(pool.map(_file_size, [job[0] for job in batch_jobs]))
+    order = sorted(range(len(batch_jobs)), key=sizes.__getitem__, reverse=True)
+    return [batch_jobs[index] for index in order]
+
+def estimate_job_memory(input_file, engine='auto'):
+    """Return the estimated peak memory in bytes of processing input_file with engine."""
+    size = _file_size(input_file)
+    if engine == 'streaming' or (engine == 'auto' and size >= STREAMING_THRESHOLD_BYTES):
+        return STREAMING_MEMORY_ESTIMATE
+    return size * STANDARD_MEMORY_FACTOR
+
+def _worker_failure(input_file, error, output_file=None):
+    """Log a worker that failed outright and return the failed result recorded for its file.
+    
+    Files whose worker was killed for overrunning --file-timeout, or died,
+    get result['quarantine'] = (reason, detail) for the quarantine list,
+    and the partial output the worker left (see atomic_output) is removed.
+    """
+    logging.error(f"Worker failed: {sanitize_error_message(str(error), input_file)}")
+    result = {'input': input_file, 'output': None, 'success': False, 'messages': [], 'key_cache': (0, 0),
+              'fingerprint': None, 'params': None}
+    pid = getattr(error, 'pid', None)
+    if output_file is not None and pid is not None:
+        temp_path = f"{output_file}.{pid}.tmp"
+        try:
+            os.remove(temp_path)
+            logging.info(f"Removed partial output: {temp_path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"Cannot remove partial output {temp_path}: {e}")
+    if isinstance(error, TaskTimeoutError):
+        result['messages'].append(f"Error: Timed out, worker killed ({error})")
+        result['quarantine'] = ('timeout', str(error))
+    elif isinstance(error, WorkerCrashedError):
+        result['messages'].append(f"Error: Worker crashed ({error})")
+        result['quarantine'] = ('crash', str(error))
+    return result
+
+def _batch_executor(jobs, keyring=None, isolated=False, file_timeout=None):
+    """Return the worker pool for a batch.
+    
+    With isolated, an IsolatedPool: a file overrunning file_timeout seconds
+    is killed with its worker, and a crashed worker fails only its file.
+    """
+    backup_root = backup_store.root if backup_store is not None else None
+    if isolated:
+        return IsolatedPool(jobs, file_timeout, init_batch_worker, (keyring, backup_root))
+    return ProcessPoolExecutor(max_workers=jobs, initializer=init_batch_worker, initargs=(keyring, backup_root))
+
+def _print_result(result):
+    """Print a finished batch file and the messages its worker collected."""
+    print(f"\nProcessed: {result['input']}")
+    for message in result['messages']:
+        print(f"  {message}")
+
+def _run_batch_parallel(batch_jobs, output_dir, operation, jobs, keyring=None, on_result=None, fingerprint_input=False,
+                        memory_budget=None, isolated=False, file_timeout=None):
+    """Fan files out to a process pool, calling on_result(result) as each file finishes.
+    
+    Only a bounded number of files is in flight and results are not kept,
+    so batch_jobs may be a generator over millions of files. With
+    memory_budget, a file is only handed out while the estimated memory of
+    the files in flight stays within it; a file over the budget on its own
+    runs alone. isolated and file_timeout select the worker pool (see
+    _batch_executor).
+    """
+    pending = {}
+    in_flight = 0
+    
+    def collect(futures):
+        nonlocal in_flight
+        for future in futures:
+            input_file, output_file, cost = pending.pop(future)
+            in_flight -= cost
+            try:
+                result = future.result()
+            except Exception as e:
+                result = _worker_failure(input_file, e, output_file)
+            
+            _print_result(result)
+            if on_result is not None:
+                on_result(result)
+    
+    with _batch_executor(jobs, keyring, isolated, file_timeout) as executor:
+        for input_file, password, options in batch_jobs:
+            cost = 0
+            if memory_budget is not None:
+                cost = estimate_job_memory(input_file, options['engine'])
+                while pending and in_flight + cost > memory_budget:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            
+            output_file = _batch_output_path(input_file, output_dir, operation)
+            future = executor.submit(process_file_worker, operation, input_file, output_file, password, options,
+                                     fingerprint_input)
+            pending[future] = (input_file, output_file, cost)
+            in_flight += cost
+            if len(pending) >= jobs * MAX_PENDING_PER_WORKER:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        
+        collect(as_completed(list(pending)))
+
+def _run_batch_pipeline(batch_jobs, output_dir, operation, jobs, keyring=None, on_result=None, fingerprint_input=False,
+                        memory_budget=None, isolated=False, file_timeout=None):
+    """Process files in overlapping read, transform and write stages.
+    
+    Reader threads prefetch upcoming inputs into the page cache, jobs worker
+    processes decrypt or encrypt them into temporary files, and writer
+    threads fsync (with durability 'file') and rename those into place, so
+    storage latency for one file overlaps the processing of others. Output
+    data never passes through this process. The queues between the stages
+    are bounded, so batch_jobs may be a generator over millions of files;
+    how full they ran is printed at the end. on_result(result) is called
+    as each file's output is committed, and results are not kept.
+    memory_budget limits the files being transformed at once as in
+    _run_batch_parallel. isolated and file_timeout select the worker pool
+    (see _batch_executor).
+    """
+    budget = threading.Condition()
+    in_flight = 0
+    # Temporary files made by workers and not yet committed, removed if the batch stops early
+    uncommitted = set()
+    
+    def read(job):
+        prefetch_file(job[0])
+        return job
+    
+    def transform(job):
+        nonlocal in_flight
+        input_file, password, options = job
+        output_file = _batch_output_path(input_file, output_dir, operation)
+        cost = estimate_job_memory(input_file, options['engine']) if memory_budget is not None else 0
+        with budget:
+            while in_flight and in_flight + cost > memory_budget:
+                budget.wait()
+            in_flight += cost
+        try:
+            result = executor.submit(_transform_file_worker, operation, input_file, output_file, password, options,
+                                     fingerprint_input).result()
+        except Exception as e:
+            result = _worker_failure(input_file, e, output_file)
+            result['writes'] = []
+        finally:
+            with budget:
+                in_flight -= cost
+                budget.notify_all()
+        with budget:
+            uncommitted.update(write[0] for write in result['writes'])
+        return result
+    
+    def write(result):
+        temp_paths = [write[0] for write in result['writes']]
+        result = _commit_result_outputs(result)
+        with budget:
+            uncommitted.difference_update(temp_paths)
+        return result
+    
+    pipeline = Pipeline(read, transform, write, PIPELINE_READ_THREADS, jobs, PIPELINE_WRITE_THREADS,
+                        jobs * PIPELINE_QUEUE_PER_WORKER)
+    try:
+        with _batch_executor(jobs, keyring, isolated, file_timeout) as executor:
+            with contextlib.closing(pipeline.run(batch_jobs)) as finished:
+                for result in finished:
+                    _print_result(result)
+                    if on_result is not None:
+                        on_result(result)
+    finally:
+        for temp_path in uncommitted:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    # A queue that stays full points at the stage after it, one that stays empty at the stage before it
+    for stats in pipeline.stats():
+        message = (f"Files waiting to {stats['queue']}: mean {stats['mean_depth']:.1f}, max {stats['max_depth']} "
+                   f"of {stats['size']}; producers blocked {stats['put_wait']:.1f}s, "
+                   f"consumers idle {stats['get_wait']:.1f}s")
+        logging.info(f"Pipeline: {message}")
+        print(message)
+
+def process_batch(file_list, password, output_dir=None, backup=True, overwrite=False, operation='remove', owner_password=None, permissions=None, jobs=1, engine='auto', new_password=None, password_map=None, keyring=None, durability='none', journal=None, resume=False, incremental=False, schedule='input', memory_budget=None, pipeline=False, file_timeout=None, quarantine=None):
+    """Process multiple PDF files for add/remove/rekey operations.
+    
+    file_list may be any iterable of paths, or of (path, credentials) pairs
+    as produced by password_map.iter_password_map_files(). Files listed in
+    password_map use their own credentials instead of the batch-wide ones.
+    In remove and rekey modes, a matching keyring password is preferred.
+    With durability 'batch', all outputs are synced once the batch is done.
+    
+    Each result is appended to journal (a BatchJournal) as it finishes; with
+    resume, files the journal shows as completed and unchanged are skipped.
+    With incremental, files whose output is up to date are skipped without
+    being opened (see is_up_to_date).
+    
+    With more than one job, schedule 'largest-first' stats every file up
+    front and starts the largest first, and memory_budget (bytes) limits
+    the estimated memory of the files being processed at once.
+    
+    With pipeline, files go through overlapping read, transform and write
+    stages (see _run_batch_pipeline) on jobs worker processes, without
+    prompting.
+    
+    With file_timeout (seconds), or a quarantine (a Quarantine), every file
+    runs in a worker process, even with one job: a file still running after
+    file_timeout is killed with its worker and fails, and a crashed worker
+    fails only its own file. Such files are added to quarantine, and files
+    it lists are skipped while unchanged.
+    
+    Only the input path of each result is kept, not the result itself, so
+    memory grows little with the number of files. With more than one job
+    the paths are listed in the order the files finished.
+    
+    :return: (list of files that succeeded, list of files that failed).
+    """
+    if schedule not in SCHEDULES:
+        raise ValueError(f"Unknown schedule: {schedule}")
     successful = []
     failed = []
+    options = {
+        'backup': backup,
+        'overwrite': overwrite,
+        'owner_password': owner_password,
+        'permissions': permissions,
+        'engine': engine,
+        'new_password': new_password,
+        'durability': durability,
+    }
+    batch_jobs = _batch_jobs(file_list, password, options, password_map)
+    cache_hits = cache_misses = 0
+    outputs = []
     
-    for input_file in file_list:
-        print(f"\nProcessing: {input_file}")
+    quarantined = 0
+    if quarantine is not None:
+        def not_quarantined(job):
+            return quarantine.reason(job[0]) is None
+        
+        def count_quarantined(job):
+            nonlocal quarantined
+            logging.info(f"Quarantined, skipping: {job[0]}")
+            quarantined += 1
+        
+        batch_jobs = _filter_jobs(batch_jobs, not_quarantined, count_quarantined)
+    
+    skipped = 0
+    resume = resume and journal is not None
+    if resume or incremental:
+        def needs_processing(job):
+            input_file, _, file_options = job
+            if resume and journal.is_complete(operation, input_file):
+                return False
+            if incremental:
+                output_file = _batch_output_path(input_file, output_dir, operation)
+                return not is_up_to_date(input_file, output_file, operation,
+                                         parameter_fingerprint(operation, file_options), journal)
+            return True
+        
+        def count_skipped(job):
+            nonlocal skipped
+            logging.debug(f"Up to date: {job[0]}")
+            skipped += 1
         
-        if output_dir:
-            if operation == 'remove':
-                output_file = os.path.join(output_dir, f"unlocked_{os.path.basename(input_file)}")
-            else:  # add
-                output_file = os.path.join(output_dir, f"protected_{os.path.basename(input_file)}")
+        batch_jobs = _filter_jobs(batch_jobs, needs_processing, count_skipped)
+    
+    timed_out_or_crashed = 0
+    
+    def record(result):
+        nonlocal cache_hits, cache_misses, timed_out_or_crashed
+        if result['success']:
+            successful.append(result['input'])
+            if durability == 'batch':
+                outputs.append(result['output'])
         else:
-            if operation == 'remove':
-                output_file = f"unlocked_{input_file}"
-            else:  # add
-                output_file = f"protected_{input_file}"
-        
-        if operation == 'remove':
-            success = remove_password(input_file, output_file, password, backup, overwrite)
-        else:  # add
-            success = add_password(input_file, output_file, password, owner_password, backup, overwrite, permissions)
-            
-        if success:
-            successful.append(input_file)
+            failed.append(result['input'])
+        cache_hits += result['key_cache'][0]
+        cache_misses += result['key_cache'][1]
+        if journal is not None:
+            journal.record(operation, result['input'], result['output'], result['success'], result['fingerprint'],
+                           result['params'])
+        if result.get('quarantine'):
+            timed_out_or_crashed += 1
+            if quarantine is not None:
+                quarantine.add(result['input'], *result['quarantine'])
+    
+    isolated = file_timeout is not None or quarantine is not None
+    if jobs > 1 or pipeline or isolated:
+        logging.info(f"Processing files with {jobs} workers")
+        if schedule == 'largest-first' and jobs > 1:
+            batch_jobs = _largest_first(batch_jobs)
+        if pipeline:
+            _run_batch_pipeline(batch_jobs, output_dir, operation, jobs, keyring, record, journal is not None,
+                                memory_budget, isolated, file_timeout)
         else:
-            failed.append(input_file)
+            _run_batch_parallel(batch_jobs, output_dir, operation, jobs, keyring, record, journal is not None,
+                                memory_budget, isolated, file_timeout)
+    else:
+        start_hits, start_misses = key_cache.stats()
+        for input_file, file_password, file_options in batch_jobs:
+            print(f"\nProcessing: {input_file}")
+            
+            output_file = _batch_output_path(input_file, output_dir, operation)
+            info = _input_fingerprint(input_file) if journal is not None else None
+            success = _process_file(operation, input_file, output_file, file_password, keyring=keyring, **file_options)
+            if journal is not None:
+                journal.record(operation, input_file, output_file, success, info,
+                               parameter_fingerprint(operation, file_options))
+                
+            if success:
+                successful.append(input_file)
+                if durability == 'batch':
+                    outputs.append(output_file)
+            else:
+                failed.append(input_file)
+        cache_hits, cache_misses = key_cache.hits - start_hits, key_cache.misses - start_misses
+    
+    # Unencrypted inputs succeed without writing an output
+    if durability == 'batch':
+        sync_outputs([path for path in outputs if os.path.exists(path)])
     
     print(f"\n=== Batch Processing Complete ===")
     print(f"Operation: {operation.title()} Password")
     print(f"Successful: {len(successful)}")
     print(f"Failed: {len(failed)}")
+    if skipped:
+        print(f"Skipped (up to date): {skipped}")
+    if quarantined:
+        print(f"Skipped (quarantined): {quarantined}")
+    if timed_out_or_crashed:
+        listed = f" (listed in {quarantine.path})" if quarantine is not None else ""
+        print(f"Timed out or crashed: {timed_out_or_crashed}{listed}")
+    
+    # Key derivations saved by reusing AES-256 keys
+    if cache_hits or cache_misses:
+        print(f"AES-256 key cache: {cache_hits} hits, {cache_misses} misses")
     
     if failed:
         print("Failed files:")
         for f in failed:
             print(f"  - {f}")
+    
+    return successful, failed
 
-if __name__ == "__main__":
+def inspect_file(input_file):
+    """Return the probe record for one file, or a record describing the error."""
+    try:
+        return dict({'path': input_file}, **probe_pdf(input_file))
+    except (OSError, ProbeError) as e:
+        return {'path': input_file, 'error': sanitize_error_message(str(e), input_file)}
+
+# Files sent to an inspect worker at a time
+INSPECT_CHUNK_SIZE = 256
+
+def _inspect_chunk(input_files):
+    """Return the probe records for a list of files."""
+    return [inspect_file(input_file) for input_file in input_files]
+
+def _inspect_parallel(executor, input_files, jobs):
+    """Yield probe records in input order, keeping only a bounded number of chunks in flight."""
+    pending = []
+    while True:
+        chunk = list(itertools.islice(input_files, INSPECT_CHUNK_SIZE))
+        if chunk:
+            pending.append(executor.submit(_inspect_chunk, chunk))
+        if pending and (not chunk or len(pending) >= jobs * MAX_PENDING_PER_WORKER):
+            yield from pending.pop(0).result()
+        if not chunk and not pending:
+            return
+
+def inspect_pdfs(paths, jobs=1):
+    """Print one JSON line per PDF describing its protection and return the number of errors.
+    
+    paths may be any iterable of files and directories; it is consumed lazily.
+    """
+    errors = 0
+    input_files = iter_input_files(paths)
+    if jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        records = _inspect_parallel(executor, input_files, jobs)
+    else:
+        executor = None
+        records = map(inspect_file, input_files)
+    
+    try:
+        for record in records:
+            if 'error' in record:
+                errors += 1
+            print(json.dumps(record))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    return errors
+
+def prune_backups(backup_dir, keep_last=None, max_age_days=None):
+    """Apply a retention policy to a backup store and report what was removed."""
+    result = BackupStore(backup_dir).prune(keep_last, max_age_days)
+    logging.info(f"Pruned backup store {backup_dir}: {result}")
+    print(f"Removed {result['entries_removed']} backup entries and {result['objects_removed']} stored files")
+    print(f"Reclaimed {result['bytes_reclaimed']:,} bytes")
+    return result
+
+def stop_on_sigterm(signum, frame):
+    """Turn SIGTERM into the same orderly shutdown as Ctrl+C."""
+    raise KeyboardInterrupt
+
+def watch_folders(directories, password, output_dir, backup=True, overwrite=False, operation='remove', owner_password=None, permissions=None, jobs=1, engine='auto', new_password=None, password_map=None, keyring=None, durability='none', journal=None, recursive=False, include=None, exclude=None, settle_time=DEFAULT_SETTLE_TIME):
+    """Process PDFs as they are dropped into directories until interrupted.
+    
+    Files are handed to a pool of jobs worker processes once they have
+    settled. The pool is an IsolatedPool, so a worker that crashes on a
+    hostile file fails only that file and is replaced. At most jobs * MAX_PENDING_PER_WORKER files are queued for the
+    workers; beyond that the watcher stops accepting files, which leaves
+    new events in its bounded table and then in the kernel queue. Files
+    whose output is already up to date are skipped, so rescans after a
+    queue overflow do not redo work.
+    
+    :return: (processed, failed) counts.
+    """
+    options = {
+        'backup': backup,
+        'overwrite': overwrite,
+        'owner_password': owner_password,
+        'permissions': permissions,
+        'engine': engine,
+        # Outputs are never synced as a batch in watch mode, so 'batch' syncs each one
+        'durability': 'file' if durability == 'batch' else durability,
+        'new_password': new_password,
+    }
+    limit = jobs * MAX_PENDING_PER_WORKER
+    in_flight = {}
+    processed = failed = 0
+    
+    def collect(futures):
+        nonlocal processed, failed
+        for future in futures:
+            input_file, output_file = in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = _worker_failure(input_file, e, output_file)
+            _print_result(result)
+            if result['success']:
+                processed += 1
+            else:
+                failed += 1
+            if journal is not None:
+                journal.record(operation, result['input'], result['output'], result['success'],
+                               result['fingerprint'], result['params'])
+    
+    previous_handler = signal.signal(signal.SIGTERM, stop_on_sigterm)
+    watcher = DropFolderWatcher(directories, recursive, include, exclude, settle_time)
+    try:
+        with _batch_executor(jobs, keyring, isolated=True) as executor:
+            print(f"Watching {', '.join(directories)} (press Ctrl+C to stop)")
+            try:
+                while True:
+                    if len(in_flight) >= limit:
+                        # Backpressure: accept no new files until a worker finishes one
+                        done, _ = wait(in_flight, timeout=1, return_when=FIRST_COMPLETED)
+                        collect(done)
+                        continue
+                    
+                    for ready_file in watcher.poll(0.5, limit - len(in_flight)):
+                        for input_file, file_password, file_options in _batch_jobs([ready_file], password, options, password_map):
+                            output_file = _batch_output_path(input_file, output_dir, operation)
+                            if is_up_to_date(input_file, output_file, operation,
+                                             parameter_fingerprint(operation, file_options), journal):
+                                continue
+                            future = executor.submit(process_file_worker, operation, input_file, output_file,
+                                                     file_password, file_options, journal is not None)
+                            in_flight[future] = (input_file, output_file)
+                    collect([future for future in list(in_flight) if future.done()])
+            except KeyboardInterrupt:
+                print(f"\nStopping; finishing {len(in_flight)} files in progress...")
+                collect(as_completed(list(in_flight)))
+    finally:
+        watcher.close()
+        signal.signal(signal.SIGTERM, previous_handler)
+    
+    print(f"\n=== Watch Stopped ===")
+    print(f"Successful: {processed}")
+    print(f"Failed: {failed}")
+    if watcher.overflows:
+        print(f"Event queue overflows (recovered by rescanning): {watcher.overflows}")
+    return processed, failed
+
+def main(argv=None):
+    """Run the command-line interface."""
+    global backup_store
+    
     # Set up command-line arguments
     parser = argparse.ArgumentParser(
         description="Add or remove passwords from PDF file(s).",
@@ -346,23 +1800,47 @@ if __name__ == "__main__":
                "  # Remove password\n"
                "  %(prog)s document.pdf --remove\n"
                "  %(prog)s *.pdf --remove --batch --output-dir ./unlocked\n"
+               "  %(prog)s *.pdf --remove --batch --jobs auto --output-dir ./unlocked\n"
                "\n"
                "  # Add password\n"
                "  %(prog)s document.pdf --add --password secret123\n"
                "  %(prog)s *.pdf --add --batch --password secret123 --output-dir ./protected\n"
                "\n"
+               "  # Change password in a single pass\n"
+               "  %(prog)s document.pdf --rekey --password old123 --new-password new456\n"
+               "\n"
+               "  # Per-file passwords from a manifest\n"
+               "  %(prog)s --remove --password-map passwords.jsonl --jobs auto --output-dir ./unlocked\n"
+               "\n"
+               "  # Report encryption details as JSON lines\n"
+               "  %(prog)s ./incoming --inspect\n"
+               "\n"
+               "  # Keep in-place backups in a deduplicating store, then prune it\n"
+               "  %(prog)s document.pdf --remove -o document.pdf --backup-dir ~/.pdf-backups\n"
+               "  %(prog)s --prune-backups --backup-dir ~/.pdf-backups --keep-last 3 --max-age 30\n"
+               "\n"
                "  # Advanced options\n"
                "  %(prog)s file.pdf --add --password user123 --owner-password admin456 --no-print --no-modify",
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
     
     # Positional arguments
-    parser.add_argument("input", nargs="+", help="Path to input PDF file(s).")
+    parser.add_argument("input", nargs="*", help="Path to input PDF file(s) or directories of PDFs.")
     
     # Operation mode (mutually exclusive)
     mode_group = parser.add_mutually_exclusive_group(required=True)
     mode_group.add_argument("--add", action="store_true", help="Add password protection to PDF(s).")
     mode_group.add_argument("--remove", action="store_true", help="Remove password protection from PDF(s).")
+    mode_group.add_argument("--rekey", action="store_true", help="Change the password and/or permissions of protected PDF(s).")
+    mode_group.add_argument("--inspect", action="store_true",
+                            help="Print one JSON line per PDF (or per PDF in a directory) describing its encryption, without decrypting.")
+    mode_group.add_argument("--serve", action="store_true",
+                            help="Run a local HTTP job service (add/remove/rekey/inspect endpoints) on a warm worker pool.")
+    mode_group.add_argument("--warm-server", action="store_true",
+                            help="Keep a process with the PDF libraries loaded on a Unix socket; later commands run on it "
+                                 "instead of starting from scratch.")
+    mode_group.add_argument("--prune-backups", action="store_true",
+                            help="Apply --keep-last/--max-age to the store given by --backup-dir and delete unreferenced backups.")
     
     # Output options
     parser.add_argument("-o", "--output", help="Path to output file (single file mode) or directory (batch mode).")
@@ -370,32 +1848,193 @@ if __name__ == "__main__":
     
     # Password options
     parser.add_argument("-p", "--password", help="PDF password (will prompt if not provided).")
-    parser.add_argument("--owner-password", help="Owner password (for add mode, defaults to user password).")
+    parser.add_argument("--owner-password", help="Owner password (for add mode, defaults to user password; for rekey mode, the new owner password).")
+    parser.add_argument("--new-password", help="New user password (rekey mode, keeps the current one if not provided).")
+    parser.add_argument("--keyring", metavar="FILE",
+                        help="File of known passwords, one per line (remove/rekey mode). Each file's encryption dictionary "
+                             "is checked against them, most recently successful first, before it is decrypted.")
+    parser.add_argument("--password-map", metavar="FILE",
+                        help="CSV, JSON or JSONL manifest mapping file paths or glob patterns to password, owner_password, "
+                             "new_password and permissions. Without input files, the files named by the manifest are processed "
+                             "as it is read; -p/--password then only applies to files it gives no password for.")
     
-    # Permission options (for add mode)
-    parser.add_argument("--no-print", action="store_true", help="Disable printing (add mode only).")
-    parser.add_argument("--no-modify", action="store_true", help="Disable content modification (add mode only).")
-    parser.add_argument("--no-copy", action="store_true", help="Disable copying/extracting (add mode only).")
-    parser.add_argument("--no-annotate", action="store_true", help="Disable annotations (add mode only).")
+    # Permission options (for add and rekey modes)
+    parser.add_argument("--no-print", action="store_true", help="Disable printing (add/rekey mode).")
+    parser.add_argument("--no-modify", action="store_true", help="Disable content modification (add/rekey mode).")
+    parser.add_argument("--no-copy", action="store_true", help="Disable copying/extracting (add/rekey mode).")
+    parser.add_argument("--no-annotate", action="store_true", help="Disable annotations (add/rekey mode).")
     
     # Processing options
     parser.add_argument("--batch", action="store_true", help="Process multiple files.")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Also process PDFs in subdirectories of directory inputs.")
+    parser.add_argument("--files-from", metavar="FILE",
+                        help="Read input paths from FILE ('-' for standard input), one per line; read as files are processed.")
+    parser.add_argument("-0", "--null", action="store_true", help="Paths in --files-from are NUL-separated (as from find -print0).")
+    parser.add_argument("--include", action="append", metavar="GLOB",
+                        help="Only process files matching GLOB (repeatable; patterns without '/' match the file name).")
+    parser.add_argument("--exclude", action="append", metavar="GLOB",
+                        help="Skip files and directories matching GLOB (repeatable).")
     parser.add_argument("--no-backup", action="store_true", help="Skip creating backup files.")
+    parser.add_argument("--backup-dir", metavar="DIR",
+                        help="Keep backups in a content-addressed store in DIR, each distinct file stored once, "
+                             "instead of timestamped copies next to the inputs.")
+    parser.add_argument("--keep-last", type=int, metavar="N", help="Prune mode: keep the N newest backups of each file.")
+    parser.add_argument("--max-age", type=float, metavar="DAYS", help="Prune mode: remove backups older than DAYS days.")
     parser.add_argument("--overwrite", action="store_true", help="Overwrite existing output files without asking.")
+    parser.add_argument("--schedule", choices=SCHEDULES, default='input',
+                        help="Order in which parallel batches start files: 'input' starts them as they are discovered; "
+                             "'largest-first' lists and stats all inputs up front so big files do not start last, "
+                             "which holds the whole file list in memory (default: input).")
+    parser.add_argument("--memory-budget", type=parse_size, metavar="SIZE",
+                        help="Parallel batches: start files only while their estimated memory use stays under SIZE "
+                             "(e.g. 4G); a file over the budget runs alone.")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Batch mode: overlap storage I/O with processing by prefetching inputs on reader threads "
+                             "and committing outputs on writer threads while --jobs worker processes work on other files; "
+                             "prints how full the queues between the stages ran.")
+    parser.add_argument("-j", "--jobs", type=parse_jobs, default=1, metavar="N",
+                        help="Number of parallel worker processes for batch mode, or 'auto' to match available CPUs (default: 1).")
+    parser.add_argument("--engine", choices=ENGINES, default='auto',
+                        help="Processing engine: 'streaming' rewrites the file object by object in constant memory, "
+                             "'standard' loads it with PyPDF2; 'auto' streams files of 256 MB or more (default: auto).")
+    parser.add_argument("--journal", metavar="FILE",
+                        help="Append one JSON line per processed file (input size, mtime and SHA-256, output, result) "
+                             "to FILE; it can be followed while the batch runs.")
+    parser.add_argument("--file-timeout", type=parse_timeout, metavar="SECONDS",
+                        help="Batch mode: run each file in a worker process and kill it if it takes longer than "
+                             "SECONDS; the file fails and the batch carries on.")
+    parser.add_argument("--quarantine", metavar="FILE",
+                        help="Batch mode: list files that timed out or crashed a worker in FILE (JSON lines), and "
+                             "skip the files it lists while they are unchanged.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip files the --journal records as completed whose size and mtime are unchanged.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Skip files whose output exists and is newer than the input, checked with stat() only "
+                             "(and against the --journal's parameters and content hash when given); stale outputs "
+                             "are overwritten.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and process PDFs as they are written into the input directories "
+                             "(Linux inotify); requires --output-dir outside them.")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_TIME, metavar="SECONDS",
+                        help=f"Watch mode: how long a file must stay unchanged before it is processed (default: {DEFAULT_SETTLE_TIME:g}).")
+    parser.add_argument("--host", default="127.0.0.1", help="Serve mode: address to listen on (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8765, help="Serve mode: port to listen on (default: 8765).")
+    parser.add_argument("--max-concurrent", type=int, metavar="N",
+                        help="Serve mode: requests processed at once before answering 503 (default: twice --jobs).")
+    parser.add_argument("--job-timeout", type=float, default=300, metavar="SECONDS",
+                        help="Serve mode: seconds a job may take before its worker is killed and the request fails with 504 (default: 300).")
+    parser.add_argument("--path-root", metavar="DIR",
+                        help="Serve mode: allow JSON requests naming local files under DIR instead of uploading them.")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="Warm server mode: Unix socket to listen on (default: $PDFPM_SOCKET, or a per-user socket "
+                             "in $XDG_RUNTIME_DIR or the temporary directory).")
+    parser.add_argument("--durability", choices=DURABILITY_POLICIES, default='none',
+                        help="Outputs are always written to a temporary file and renamed into place. 'file' also fsyncs "
+                             "each output and its directory; 'batch' syncs all outputs and each output directory once "
+                             "at the end of a batch (default: none).")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose logging.")
     parser.add_argument("--version", action="version", version="PDF Password Manager v2.0")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.resume and not args.journal:
+        parser.error("--resume requires --journal")
+    if args.prune_backups and not args.backup_dir:
+        parser.error("--prune-backups requires --backup-dir")
+    if not args.input and not args.files_from and not args.prune_backups and not args.serve and not args.warm_server and not (args.password_map and not args.inspect):
+        parser.error("the following arguments are required: input")
+    if args.watch:
+        if args.inspect or args.prune_backups or args.files_from:
+            parser.error("--watch only applies to --add, --remove and --rekey on input directories")
+        if not args.input or not all(os.path.isdir(path) for path in args.input):
+            parser.error("--watch requires input directories")
+        output_dir = args.output_dir or args.output
+        if not output_dir:
+            parser.error("--watch requires --output-dir")
+        for path in args.input:
+            watched = os.path.abspath(path)
+            if os.path.commonpath([watched, os.path.abspath(output_dir)]) == watched:
+                parser.error("--output-dir must not be inside a watched directory")
+    if args.keyring and (args.add or args.inspect):
+        parser.error("--keyring only applies to --remove and --rekey")
+    if args.serve and (args.input or args.files_from or args.password_map or args.watch):
+        parser.error("--serve takes no input files; documents are sent to its endpoints")
+    if args.warm_server and (args.input or args.files_from or args.password_map or args.watch):
+        parser.error("--warm-server takes no input files; run commands as usual while it is running")
     
     # Setup logging
     setup_logging(args.verbose)
     
     # Determine operation
-    operation = 'add' if args.add else 'remove'
+    if args.add:
+        operation = 'add'
+    elif args.rekey:
+        operation = 'rekey'
+    elif args.inspect:
+        operation = 'inspect'
+    elif args.prune_backups:
+        operation = 'prune'
+    elif args.serve:
+        operation = 'serve'
+    elif args.warm_server:
+        operation = 'warm-server'
+    else:
+        operation = 'remove'
     
-    # Get password if not provided
+    # Discover inputs lazily: directories are walked and --files-from is read as files are processed
+    sources = args.input
+    if args.files_from:
+        sources = itertools.chain(args.input, read_file_list(args.files_from, args.null))
+    input_files = iter_input_files(sources, args.recursive, args.include, args.exclude)
+    single_file = (len(args.input) == 1 and not args.files_from and not os.path.isdir(args.input[0]))
+    
+    # Inspect mode needs no password and writes nothing
+    if operation == 'inspect':
+        try:
+            sys.exit(1 if inspect_pdfs(input_files, args.jobs) else 0)
+        except OSError as e:
+            logging.error(f"Cannot read file list: {e}")
+            print(f"Error: Cannot read file list: {e}")
+            sys.exit(1)
+    
+    if operation == 'prune':
+        try:
+            prune_backups(args.backup_dir, args.keep_last, args.max_age)
+        except (OSError, ValueError) as e:
+            logging.error(f"Cannot prune backup store: {e}")
+            print(f"Error: Cannot prune backup store: {e}")
+            sys.exit(1)
+        sys.exit(0)
+    
+    backup_store = BackupStore(args.backup_dir) if args.backup_dir else None
+    
+    # Serve mode takes its passwords from each request (or the keyring)
+    if operation == 'serve':
+        from http_service import serve
+        try:
+            serve(args.host, args.port, jobs=args.jobs, max_concurrent=args.max_concurrent,
+                  job_timeout=args.job_timeout, engine=args.engine, durability=args.durability,
+                  keyring=Keyring.from_file(args.keyring) if args.keyring else None,
+                  backup_root=args.backup_dir, path_root=args.path_root)
+        except OSError as e:
+            logging.error(f"Cannot start job service: {e}")
+            print(f"Error: Cannot start job service: {e}")
+            sys.exit(1)
+        sys.exit(0)
+    
+    # Warm server mode runs each forwarded command line through main() in a forked child
+    if operation == 'warm-server':
+        import warm_server
+        try:
+            warm_server.run_server(main, args.socket)
+        except OSError as e:
+            logging.error(f"Cannot start warm server: {e}")
+            print(f"Error: Cannot start warm server: {e}")
+            sys.exit(1)
+        sys.exit(0)
+    
+    # Get password if not provided (a password map supplies per-file passwords)
     password = args.password
-    if not password:
+    if not password and not args.password_map and not args.keyring:
         if operation == 'add':
             password = getpass.getpass("Enter the password to protect the PDF: ")
         else:
@@ -403,13 +2042,19 @@ if __name__ == "__main__":
     
     # Get owner password for add mode
     owner_password = args.owner_password
-    if operation == 'add' and not owner_password:
+    if operation == 'add' and not owner_password and not args.password_map:
         owner_response = safe_input("Enter owner password (press Enter to use same as user password): ", valid_responses=None, default="")
         owner_password = owner_response if owner_response else password
     
-    # Set up permissions for add mode
+    # Get the new user password for rekey mode
+    new_password = args.new_password
+    if operation == 'rekey' and not new_password and not args.password_map:
+        new_password = getpass.getpass("Enter the new password (press Enter to keep the current one): ") or None
+    
+    # Set up permissions (rekey mode keeps the current ones unless a flag is given)
     permissions = None
-    if operation == 'add':
+    no_permission_flags = (args.no_print, args.no_modify, args.no_copy, args.no_annotate)
+    if operation == 'add' or (operation == 'rekey' and any(no_permission_flags)):
         permissions = {
             'print': not args.no_print,
             'modify': not args.no_modify,
@@ -417,14 +2062,92 @@ if __name__ == "__main__":
             'annotate': not args.no_annotate
         }
     
+    # Load known passwords
+    keyring = None
+    if args.keyring:
+        try:
+            keyring = Keyring.from_file(args.keyring)
+        except OSError as e:
+            logging.error(f"Cannot read keyring: {e}")
+            print(f"Error: Cannot read keyring: {e}")
+            sys.exit(1)
+        logging.info(f"Loaded {len(keyring)} keyring passwords")
+    
+    # Load per-file credentials: stream the manifest when it names the files, index it otherwise
+    file_list = input_files
+    password_map = None
+    if args.password_map:
+        try:
+            if args.input or args.files_from:
+                password_map = PasswordMap(read_password_map(args.password_map))
+            else:
+                file_list = iter_password_map_files(read_password_map(args.password_map))
+        except (OSError, PasswordMapError) as e:
+            logging.error(f"Cannot read password map: {e}")
+            print(f"Error: Cannot read password map: {e}")
+            sys.exit(1)
+    
     # Process files
-    if args.batch or len(args.input) > 1:
+    if args.watch:
+        journal = None
+        try:
+            if args.journal:
+                journal = BatchJournal(args.journal, sync=args.durability != 'none')
+            watch_folders(args.input, password, args.output_dir or args.output, not args.no_backup, True,
+                          operation, owner_password, permissions, args.jobs, args.engine, new_password,
+                          password_map, keyring, args.durability, journal, args.recursive, args.include,
+                          args.exclude, args.settle)
+        except (OSError, WatchError) as e:
+            logging.error(f"Cannot watch folders: {e}")
+            print(f"Error: Cannot watch folders: {e}")
+            sys.exit(1)
+        finally:
+            if journal is not None:
+                journal.close()
+    elif args.batch or args.password_map or args.journal or args.incremental or not single_file:
         # Batch processing
         output_dir = args.output_dir or args.output
-        process_batch(args.input, password, output_dir, not args.no_backup, args.overwrite, 
-                     operation, owner_password, permissions)
+        journal = None
+        quarantine = None
+        if args.quarantine:
+            try:
+                quarantine = Quarantine(args.quarantine)
+            except (OSError, KeyError) as e:
+                logging.error(f"Cannot use quarantine list: {e}")
+                print(f"Error: Cannot use quarantine list: {e}")
+                sys.exit(1)
+        if args.journal:
+            try:
+                journal = BatchJournal(args.journal, sync=args.durability == 'file')
+            except (OSError, KeyError) as e:
+                logging.error(f"Cannot use journal: {e}")
+                print(f"Error: Cannot use journal: {e}")
+                sys.exit(1)
+            if args.resume:
+                logging.info(f"Resuming: {len(journal)} files already completed in {args.journal}")
+        try:
+            process_batch(file_list, password, output_dir, not args.no_backup, args.overwrite or args.incremental,
+                          operation, owner_password, permissions, args.jobs, args.engine,
+                          new_password, password_map, keyring, args.durability, journal, args.resume,
+                          args.incremental, args.schedule, args.memory_budget, args.pipeline, args.file_timeout,
+                          quarantine)
+        except PasswordMapError as e:
+            logging.error(f"Invalid password map: {e}")
+            print(f"Error: Invalid password map: {e}")
+            sys.exit(1)
+        except OSError as e:
+            logging.error(f"Cannot read file list: {e}")
+            print(f"Error: Cannot read file list: {e}")
+            sys.exit(1)
+        finally:
+            if journal is not None:
+                journal.close()
+            if quarantine is not None:
+                quarantine.close()
     else:
         # Single file processing
+        if args.file_timeout or args.quarantine:
+            parser.error("--file-timeout and --quarantine apply to batch mode (add --batch)")
         input_file = args.input[0]
         
         # Determine output file name if not provided
@@ -432,16 +2155,29 @@ if __name__ == "__main__":
             output_file = args.output
         else:
             base_name = os.path.basename(input_file)
-            if operation == 'add':
-                output_file = f"protected_{base_name}"
-            else:
-                output_file = f"unlocked_{base_name}"
+            output_file = f"{OUTPUT_PREFIXES[operation]}{base_name}"
+        
+        # Prefer a known password that opens the file
+        if keyring is not None:
+            password = find_keyring_password(input_file, keyring) or password
+            if password is None:
+                logging.error("No keyring password matches")
+                print("Error: None of the keyring passwords opens this file.")
+                sys.exit(1)
         
-        # Process the file
+        # Process the file (a single file needs no batching, so 'batch' durability syncs it like 'file')
+        durability = 'file' if args.durability == 'batch' else args.durability
         if operation == 'add':
             success = add_password(input_file, output_file, password, owner_password, 
-                                 not args.no_backup, args.overwrite, permissions)
+                                 not args.no_backup, args.overwrite, permissions, args.engine, durability)
+        elif operation == 'rekey':
+            success = rekey_password(input_file, output_file, password, new_password, owner_password,
+                                   not args.no_backup, args.overwrite, permissions, args.engine, durability)
         else:
-            success = remove_password(input_file, output_file, password, not args.no_backup, args.overwrite)
+            success = remove_password(input_file, output_file, password, not args.no_backup, args.overwrite,
+                                      args.engine, durability)
             
-        sys.exit(0 if success else 1)
\ No newline at end of file
+        sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
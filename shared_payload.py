@@ -0,0 +1,210 @@
+"""
+Shared-memory hand-off of in-memory PDFs to worker processes.
+
+Running remove_password_bytes()/add_password_bytes() in a process pool by
+passing the payload as an argument pickles it through a pipe: the parent
+serializes it, the worker deserializes a private copy, and the result
+travels back the same way. For large documents that is several full
+copies and twice the memory.
+
+submit_shared() instead puts the input in a multiprocessing.shared_memory
+segment and sends only its name. The worker parses it in place through a
+memoryview and writes the result straight into a second segment that the
+parent allocated, so a job costs at most the copy into shared memory
+(none if the caller fills a SharedPayload directly, e.g. from a socket).
+The result comes back as a SharedPayload the caller reads and closes.
+
+Segments are created by the parent, which unlinks them when closed. Start
+the pool with make_shared_executor() (or call
+multiprocessing.resource_tracker.ensure_running() before creating it) so
+workers share the parent's resource tracker and do not unlink segments
+when they exit.
+"""
+
+import contextlib
+import io
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+# Room left for the output segment: results can be slightly larger than their input
+# (encryption adds padding and IVs); unused pages of a segment are never allocated
+OUTPUT_CAPACITY_FACTOR = 2
+OUTPUT_CAPACITY_SLACK = 1024 * 1024
+
+
+class MemoryviewReader(io.RawIOBase):
+    """Read-only seekable binary stream over a memoryview, without copying it."""
+
+    def __init__(self, view):
+        self.view = memoryview(view).cast('B')
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        end = len(self.view) if size is None or size < 0 else min(self.position + size, len(self.view))
+        data = self.view[self.position:end].tobytes()
+        self.position = max(self.position, end)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        else:
+            position = len(self.view) + offset
+        if position < 0:
+            raise ValueError("negative seek position")
+        self.position = position
+        return position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        self.view.release()
+        super().close()
+
+
+class SharedPayload:
+    """A PDF (or room for one) in a shared memory segment, owned by the process that created it."""
+
+    def __init__(self, size, name=None):
+        """Create a segment of size bytes, or attach to the segment called name."""
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+            self.owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name)
+            self.owner = False
+        self.size = size
+        self.view = self._shm.buf[:size]
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Copy a bytes-like object into a new segment."""
+        data = memoryview(data).cast('B')
+        payload = cls(len(data))
+        payload.view[:] = data
+        return payload
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def tobytes(self):
+        return self.view.tobytes()
+
+    def truncate(self, size):
+        """Limit the payload to its first size bytes."""
+        view = self.view[:size]
+        self.view.release()
+        self.view = view
+        self.size = size
+
+    def close(self):
+        """Release this process's mapping; the owner also removes the segment."""
+        if self.view is None:
+            return
+        self.view.release()
+        self.view = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def make_shared_executor(jobs=None):
+    """Return a process pool whose workers share this process's resource tracker."""
+    resource_tracker.ensure_running()
+    return ProcessPoolExecutor(max_workers=jobs)
+
+
+def _shared_worker(operation, input_name, input_size, output_name, output_capacity, password, options):
+    """Run a bytes job between two shared segments; return (result size, segment name or None)."""
+    from remove_pdf_password import add_password_bytes, remove_password_bytes
+
+    source = SharedPayload(input_size, input_name)
+    output = SharedPayload(output_capacity, output_name)
+    stream = MemoryviewReader(source.view)
+    try:
+        function = remove_password_bytes if operation == 'remove' else add_password_bytes
+        try:
+            return function(stream, password, output=output.view, **options), None
+        except ValueError as e:
+            if "too small" not in str(e):
+                raise
+        # Rare: the result outgrew the preallocated segment, so hand back a new one of the exact size
+        stream.seek(0)
+        data = function(stream, password, **options)
+        overflow = SharedPayload.from_bytes(data)
+        # The parent takes over the segment and unlinks it
+        overflow.owner = False
+        overflow.close()
+        return len(data), overflow.name
+    finally:
+        # A failed job's traceback may still reference views of the segments; they go when the worker exits
+        for resource in (stream, source, output):
+            with contextlib.suppress(BufferError):
+                resource.close()
+
+
+def submit_shared(executor, operation, payload, password, **options):
+    """Run remove_password_bytes() or add_password_bytes() in executor through shared memory.
+
+    :param operation: 'remove' or 'add' (password is then the user password).
+    :param payload: A SharedPayload, or a bytes-like object to copy into one.
+    :param options: Passed to the bytes function (engine; owner_password and permissions for add).
+    :return: A Future resolving to a SharedPayload with the result; close it when done.
+    """
+    if operation not in ('remove', 'add'):
+        raise ValueError(f"Unknown operation: {operation}")
+    source = payload if isinstance(payload, SharedPayload) else SharedPayload.from_bytes(payload)
+    output = SharedPayload(source.size * OUTPUT_CAPACITY_FACTOR + OUTPUT_CAPACITY_SLACK)
+    shared = Future()
+    shared.set_running_or_notify_cancel()
+
+    def finish(job):
+        try:
+            size, overflow_name = job.result()
+        except BaseException as e:
+            output.close()
+            shared.set_exception(e)
+            return
+        finally:
+            if source is not payload:
+                source.close()
+        if overflow_name is None:
+            output.truncate(size)
+            shared.set_result(output)
+        else:
+            output.close()
+            overflow = SharedPayload(size, overflow_name)
+            overflow.owner = True
+            shared.set_result(overflow)
+
+    try:
+        job = executor.submit(_shared_worker, operation, source.name, source.size, output.name, output.size,
+                              password, options)
+    except BaseException:
+        output.close()
+        if source is not payload:
+            source.close()
+        raise
+    job.add_done_callback(finish)
+    return shared
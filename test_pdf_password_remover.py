@@ -8,6 +8,7 @@ import tempfile
 import os
 import sys
 import shutil
+import json
 from unittest.mock import patch, MagicMock, mock_open
 from io import StringIO
 
@@ -17,8 +18,98 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 # Import the modules to test
 from remove_pdf_password import (
     setup_logging, validate_pdf_file, create_backup, remove_password, 
-    add_password, _convert_permissions_to_flag, process_batch
+    add_password, rekey_password, _convert_permissions_to_flag, process_batch
 )
+import remove_pdf_password
+
+def make_test_pdf(path, pages=1, password=None):
+    """Write a real PDF with blank pages, optionally encrypted with password."""
+    from PyPDF2 import PdfWriter
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    if password is not None:
+        writer.encrypt(user_password=password, owner_password=password, use_128bit=True)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+def make_object_stream_pdf(path):
+    """Write a small PDF 1.5 file whose objects live in an object stream with an xref stream."""
+    import struct
+    content = b"BT /F1 12 Tf 20 100 Td (Compressed \\(objects\\)) Tj ET"
+    objects = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>"),
+        (3, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] /Contents 4 0 R >>"),
+        (7, b"<< /Title (Object stream \\(test\\)) /Author <4a616e65> >>"),
+    ]
+    header, body = b"", b""
+    for idnum, data in objects:
+        header += b"%d %d " % (idnum, len(body))
+        body += data + b"\n"
+    object_stream = header + body
+    
+    out = b"%PDF-1.5\n"
+    offsets = {}
+    offsets[4] = len(out)
+    out += b"4 0 obj\n<< /Length %d >>\nstream\n%s\nendstream\nendobj\n" % (len(content), content)
+    offsets[5] = len(out)
+    out += (b"5 0 obj\n<< /Type /ObjStm /N %d /First %d /Length %d >>\nstream\n%s\nendstream\nendobj\n"
+            % (len(objects), len(header), len(object_stream), object_stream))
+    offsets[6] = len(out)
+    rows = [struct.pack(">BIH", 0, 0, 65535)]
+    for idnum in range(1, 8):
+        if idnum in offsets:
+            rows.append(struct.pack(">BIH", 1, offsets[idnum], 0))
+        else:
+            index = [o[0] for o in objects].index(idnum)
+            rows.append(struct.pack(">BIH", 2, 5, index))
+    xref = b"".join(rows)
+    out += (b"6 0 obj\n<< /Type /XRef /Size 8 /W [1 4 2] /Root 1 0 R /Info 7 0 R /Length %d >>\nstream\n"
+            % len(xref)) + xref + b"\nendstream\nendobj\n"
+    out += b"startxref\n%d\n%%%%EOF\n" % offsets[6]
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+def make_aes256_pdf(path, password, source=None):
+    """Write an AES-256 (V5, R6) copy of source (or a one-page PDF) with the streaming engine.
+    
+    Each call derives a new handler, so copies of the returned file share their /O and /U values.
+    """
+    import io
+    from PyPDF2 import PdfReader
+    from PyPDF2._encryption import AES_CBC_encrypt, AlgV5, Encryption
+    from PyPDF2.generic import ArrayObject, ByteStringObject, DictionaryObject, NameObject, NumberObject
+    from pdf_stream_engine import rewrite_pdf
+    if source is None:
+        source = make_test_pdf(path + ".src")
+    key, secret, iv = os.urandom(32), password.encode(), bytes(16)
+    u_salts, o_salts = os.urandom(16), os.urandom(16)
+    u_value = AlgV5.calculate_hash(6, secret, u_salts[:8], b"") + u_salts
+    o_value = AlgV5.calculate_hash(6, secret, o_salts[:8], u_value) + o_salts
+    values = {
+        "/U": u_value,
+        "/UE": AES_CBC_encrypt(AlgV5.calculate_hash(6, secret, u_salts[8:], b""), iv, key),
+        "/O": o_value,
+        "/OE": AES_CBC_encrypt(AlgV5.calculate_hash(6, secret, o_salts[8:], u_value), iv, key),
+        "/Perms": AlgV5.compute_Perms_value(key, -4 & 0xFFFFFFFF, True),
+    }
+    entry = DictionaryObject({NameObject(k): ByteStringObject(v) for k, v in values.items()})
+    crypt_filter = DictionaryObject({NameObject("/CFM"): NameObject("/AESV3"), NameObject("/Length"): NumberObject(32)})
+    entry.update({
+        NameObject("/Filter"): NameObject("/Standard"), NameObject("/V"): NumberObject(5),
+        NameObject("/R"): NumberObject(6), NameObject("/Length"): NumberObject(256), NameObject("/P"): NumberObject(-4),
+        NameObject("/CF"): DictionaryObject({NameObject("/StdCF"): crypt_filter}),
+        NameObject("/StmF"): NameObject("/StdCF"), NameObject("/StrF"): NameObject("/StdCF"),
+    })
+    encryption = Encryption(5, 6, entry, b"", "/AESV3", "/AESV3", "/AESV3")
+    encryption._key = key
+    file_id = ArrayObject([ByteStringObject(os.urandom(16)), ByteStringObject(os.urandom(16))])
+    with open(source, "rb") as f, open(path, "wb") as out:
+        rewrite_pdf(PdfReader(f), out, encryption=encryption, encrypt_entry=entry, file_id=file_id)
+    return path
 
 class TestPDFPasswordRemover(unittest.TestCase):
     """Test cases for the PDF password remover CLI functionality."""
@@ -353,7 +444,8 @@ class TestIntegration(unittest.TestCase):
         mock_writer = MagicMock()
         mock_writer_class.return_value = mock_writer
         
-        output_pdf = os.path.join(self.test_dir, "output.pdf")
+        # Backups are only taken when the output replaces the input
+        output_pdf = test_pdf
         
         with patch('builtins.open', mock_open()):
             result = remove_password(test_pdf, output_pdf, "password", True, True)
@@ -364,6 +456,1857 @@ class TestIntegration(unittest.TestCase):
         backup_files = [f for f in os.listdir(self.test_dir) if "backup" in f]
         self.assertTrue(len(backup_files) > 0)
         
+class TestParallelBatch(unittest.TestCase):
+    """Test cases for process-pool batch execution."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.test_dir, "out")
+        os.makedirs(self.output_dir)
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_parse_jobs(self):
+        """Test --jobs value parsing."""
+        import argparse
+        self.assertEqual(remove_pdf_password.parse_jobs("4"), 4)
+        with patch('remove_pdf_password.available_cpu_count', return_value=3):
+            self.assertEqual(remove_pdf_password.parse_jobs("auto"), 3)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            remove_pdf_password.parse_jobs("0")
+        with self.assertRaises(argparse.ArgumentTypeError):
+            remove_pdf_password.parse_jobs("many")
+            
+    def test_available_cpu_count_respects_cgroup_quota(self):
+        """Test that a cgroup CPU quota caps the automatic worker count."""
+        with patch('remove_pdf_password._read_cgroup_cpu_limit', return_value=2.5), \
+             patch('os.sched_getaffinity', return_value=set(range(32)), create=True):
+            self.assertEqual(remove_pdf_password.available_cpu_count(), 2)
+        with patch('remove_pdf_password._read_cgroup_cpu_limit', return_value=None), \
+             patch('os.sched_getaffinity', return_value=set(range(8)), create=True):
+            self.assertEqual(remove_pdf_password.available_cpu_count(), 8)
+            
+    def test_process_file_worker_returns_structured_result(self):
+        """Test the non-interactive worker entry point."""
+        test_pdf = make_test_pdf(os.path.join(self.test_dir, "a.pdf"), password="secret")
+        output_pdf = os.path.join(self.output_dir, "unlocked_a.pdf")
+        
+        result = remove_pdf_password.process_file_worker(
+            'remove', test_pdf, output_pdf, "secret", {'backup': False, 'overwrite': True})
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['output'], output_pdf)
+        self.assertTrue(os.path.exists(output_pdf))
+        
+    def test_process_batch_parallel_summary(self):
+        """Test that parallel batches report the same summary as sequential ones."""
+        good = [make_test_pdf(os.path.join(self.test_dir, f"good{i}.pdf"), password="secret") for i in range(3)]
+        bad = make_test_pdf(os.path.join(self.test_dir, "bad.pdf"), password="other")
+        
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            successful, failed = process_batch(good + [bad], "secret", self.output_dir,
+                                               backup=False, overwrite=True, jobs=2)
+            output = mock_stdout.getvalue()
+            
+        self.assertEqual(sorted(successful), sorted(good))
+        self.assertEqual(failed, [bad])
+        self.assertIn("Successful: 3", output)
+        self.assertIn("Failed: 1", output)
+        for path in good:
+            self.assertTrue(os.path.exists(os.path.join(self.output_dir, f"unlocked_{os.path.basename(path)}")))
+            
+    def test_parse_size(self):
+        """Test --memory-budget value parsing."""
+        import argparse
+        self.assertEqual(remove_pdf_password.parse_size("512"), 512)
+        self.assertEqual(remove_pdf_password.parse_size("2G"), 2 * 1024 ** 3)
+        self.assertEqual(remove_pdf_password.parse_size("1.5mb"), 3 * 1024 ** 2 // 2)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            remove_pdf_password.parse_size("lots")
+            
+    def test_largest_first_order(self):
+        """Test that jobs are ordered by input size, largest first, keeping ties in order."""
+        sizes = {"small": 10, "big": 300, "tie1": 50, "tie2": 50}
+        for name, size in sizes.items():
+            with open(os.path.join(self.test_dir, name), "wb") as f:
+                f.write(b"x" * size)
+        jobs = [(os.path.join(self.test_dir, name), None, {}) for name in ["small", "tie1", "missing", "big", "tie2"]]
+        ordered = [os.path.basename(job[0]) for job in remove_pdf_password._largest_first(iter(jobs))]
+        self.assertEqual(ordered, ["big", "tie1", "tie2", "small", "missing"])
+        
+    def test_memory_budget_limits_files_in_flight(self):
+        """Test that estimated memory in flight stays within the budget and oversized files run alone."""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        costs = {"big": 500, "a": 40, "b": 40, "c": 40, "d": 40}
+        state = {'in_flight': 0, 'peak': 0, 'alone': None}
+        lock = threading.Lock()
+        
+        def fake_worker(operation, input_file, output_file, password, options, fingerprint_input=False):
+            name = os.path.basename(input_file)
+            with lock:
+                if name == "big":
+                    state['alone'] = state['in_flight'] == 0
+                state['in_flight'] += costs[name]
+                if name != "big":
+                    state['peak'] = max(state['peak'], state['in_flight'])
+            time.sleep(0.05)
+            with lock:
+                state['in_flight'] -= costs[name]
+            return {'input': input_file, 'output': output_file, 'success': True, 'messages': [], 'key_cache': (0, 0),
+                    'fingerprint': None, 'params': None}
+        
+        jobs = [(name, None, {'engine': 'standard'}) for name in ["a", "big", "b", "c", "d"]]
+        with patch('remove_pdf_password.ProcessPoolExecutor', ThreadPoolExecutor), \
+             patch('remove_pdf_password.init_batch_worker'), \
+             patch('remove_pdf_password.process_file_worker', fake_worker), \
+             patch('remove_pdf_password.estimate_job_memory', lambda path, engine: costs[path]), \
+             patch('sys.stdout', new_callable=StringIO):
+            results = []
+            remove_pdf_password._run_batch_parallel(iter(jobs), self.output_dir, 'remove', 4, on_result=results.append,
+                                                    memory_budget=100)
+        self.assertEqual(sorted(result['input'] for result in results), ["a", "b", "big", "c", "d"])
+        self.assertTrue(state['alone'])
+        self.assertLessEqual(state['peak'], 100)
+        
+class TestDocumentClone(unittest.TestCase):
+    """Test cases for the whole-document clone fast path."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_clone_preserves_pages_and_catalog(self):
+        """Test that cloning keeps every page plus outlines and metadata."""
+        from PyPDF2 import PdfReader, PdfWriter
+        writer = PdfWriter()
+        for _ in range(25):
+            writer.add_blank_page(width=200, height=200)
+        writer.add_outline_item("Chapter 1", 3)
+        writer.add_metadata({'/Title': 'Contract'})
+        writer.encrypt(user_password="secret", owner_password="secret", use_128bit=True)
+        test_pdf = os.path.join(self.test_dir, "outlined.pdf")
+        with open(test_pdf, "wb") as f:
+            writer.write(f)
+        
+        output_pdf = os.path.join(self.test_dir, "unlocked.pdf")
+        self.assertTrue(remove_password(test_pdf, output_pdf, "secret", False, True))
+        
+        reader = PdfReader(output_pdf)
+        self.assertFalse(reader.is_encrypted)
+        self.assertEqual(len(reader.pages), 25)
+        self.assertEqual(reader.metadata.get('/Title'), 'Contract')
+        self.assertEqual(len(reader.outline), 1)
+        self.assertEqual(reader.get_destination_page_number(reader.outline[0]), 3)
+        
+    def test_copy_document_falls_back_to_pages(self):
+        """Test page-by-page fallback when the catalog cannot be cloned."""
+        mock_reader = MagicMock()
+        mock_reader.pages = [MagicMock(), MagicMock()]
+        
+        with patch('remove_pdf_password.PdfWriter') as mock_writer_class:
+            remove_pdf_password.copy_document(mock_reader)
+            
+        self.assertEqual(mock_writer_class.return_value.add_page.call_count, 2)
+        
+    def test_failed_clone_leaves_reader_intact(self):
+        """Test that a clone failing partway does not point the reader's objects into the writer."""
+        from PyPDF2 import PdfReader, PdfWriter
+        from PyPDF2.generic import IndirectObject
+        reader = PdfReader(make_test_pdf(os.path.join(self.test_dir, "pages.pdf"), pages=5))
+        get_object = reader.get_object
+        calls = []
+        def failing_get_object(ref):
+            calls.append(ref)
+            if len(calls) == 6:
+                raise ValueError("broken xref")
+            return get_object(ref)
+        
+        with patch.object(reader, 'get_object', side_effect=failing_get_object):
+            with self.assertRaises(ValueError):
+                remove_pdf_password._clone_document(reader)
+        
+        def references(obj):
+            if isinstance(obj, IndirectObject):
+                yield obj
+            elif isinstance(obj, dict):
+                for value in obj.values():
+                    yield from references(value)
+            elif isinstance(obj, list):
+                for value in obj:
+                    yield from references(value)
+        for ref in calls[:5]:
+            for inner in references(get_object(ref)):
+                self.assertNotIsInstance(inner.pdf, PdfWriter)
+        self.assertEqual(len(remove_pdf_password.copy_document(reader).pages), 5)
+        
+class TestStreamingEngine(unittest.TestCase):
+    """Test cases for the constant-memory streaming removal engine."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.test_pdf = os.path.join(self.test_dir, "statement.pdf")
+        self.output_pdf = os.path.join(self.test_dir, "unlocked.pdf")
+        
+        from PyPDF2 import PdfWriter
+        from PyPDF2.generic import DecodedStreamObject, NameObject
+        writer = PdfWriter()
+        for i in range(12):
+            writer.add_blank_page(width=200, height=200)
+            content = DecodedStreamObject()
+            content.set_data(f"BT (Page {i}) Tj ET".encode())
+            writer.pages[-1][NameObject("/Contents")] = writer._add_object(content)
+        writer.add_metadata({'/Title': 'Q3 (final) \\ report'})
+        writer.encrypt(user_password="secret", owner_password="owner", use_128bit=True)
+        with open(self.test_pdf, "wb") as f:
+            writer.write(f)
+            
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def assert_unlocked_copy(self, output_pdf):
+        from PyPDF2 import PdfReader
+        original = PdfReader(self.test_pdf)
+        original.decrypt("secret")
+        unlocked = PdfReader(output_pdf, strict=True)
+        
+        self.assertFalse(unlocked.is_encrypted)
+        self.assertEqual(len(unlocked.pages), len(original.pages))
+        for expected, actual in zip(original.pages, unlocked.pages):
+            self.assertEqual(actual.get_contents().get_data(), expected.get_contents().get_data())
+        self.assertEqual(unlocked.metadata.get('/Title'), 'Q3 (final) \\ report')
+        
+    def test_streaming_remove_password(self):
+        """Test password removal with the streaming engine."""
+        result = remove_password(self.test_pdf, self.output_pdf, "secret", False, True, engine='streaming')
+        
+        self.assertTrue(result)
+        self.assert_unlocked_copy(self.output_pdf)
+        
+    def test_streaming_wrong_password(self):
+        """Test that the streaming engine rejects a wrong password."""
+        result = remove_password(self.test_pdf, self.output_pdf, "wrong", False, True, engine='streaming')
+        
+        self.assertFalse(result)
+        self.assertFalse(os.path.exists(self.output_pdf))
+        
+    def test_auto_engine_uses_size_threshold(self):
+        """Test that 'auto' picks the streaming engine only for large files."""
+        self.assertEqual(remove_pdf_password.select_engine(self.test_pdf), 'standard')
+        with patch('remove_pdf_password.STREAMING_THRESHOLD_BYTES', 1):
+            self.assertEqual(remove_pdf_password.select_engine(self.test_pdf), 'streaming')
+            with patch('remove_pdf_password.rewrite_pdf', wraps=remove_pdf_password.rewrite_pdf) as mock_rewrite:
+                self.assertTrue(remove_password(self.test_pdf, self.output_pdf, "secret", False, True))
+            mock_rewrite.assert_called_once()
+        self.assert_unlocked_copy(self.output_pdf)
+        
+    def test_auto_engine_falls_back_to_standard(self):
+        """Test fallback to the standard engine when streaming is not possible."""
+        from pdf_stream_engine import StreamEngineError
+        with patch('remove_pdf_password.STREAMING_THRESHOLD_BYTES', 1), \
+             patch('remove_pdf_password.rewrite_pdf', side_effect=StreamEngineError("unsupported")):
+            self.assertTrue(remove_password(self.test_pdf, self.output_pdf, "secret", False, True))
+            self.assertFalse(remove_password(self.test_pdf, self.output_pdf, "secret", False, True, engine='streaming'))
+        
+class TestStreamingEncryptionEquivalence(unittest.TestCase):
+    """Compare the streaming add-mode engine against the PdfWriter path."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def protect_both(self, input_pdf, permissions=None):
+        """Protect input_pdf with both engines and return the two readers, opened with the user password."""
+        from PyPDF2 import PdfReader
+        readers = []
+        for engine in ('standard', 'streaming'):
+            output_pdf = os.path.join(self.test_dir, f"protected_{engine}.pdf")
+            self.assertTrue(add_password(input_pdf, output_pdf, "user123", "owner456", False, True,
+                                         permissions, engine=engine))
+            reader = PdfReader(output_pdf, strict=True)
+            self.assertTrue(reader.is_encrypted)
+            self.assertTrue(reader.decrypt("user123"))
+            readers.append(reader)
+        return readers
+        
+    def assert_equivalent(self, standard, streaming):
+        self.assertEqual(len(streaming.pages), len(standard.pages))
+        for expected, actual in zip(standard.pages, streaming.pages):
+            expected_contents, actual_contents = expected.get_contents(), actual.get_contents()
+            self.assertEqual(actual_contents is None, expected_contents is None)
+            if expected_contents is not None:
+                self.assertEqual(actual_contents.get_data(), expected_contents.get_data())
+            self.assertEqual(actual.mediabox, expected.mediabox)
+        self.assertEqual(streaming._encryption.entry['/P'], standard._encryption.entry['/P'])
+        self.assertEqual(streaming._encryption.algR, standard._encryption.algR)
+        self.assertEqual(streaming._encryption.key_size, standard._encryption.key_size)
+        
+    def test_pages_and_permissions_match(self):
+        """Test multi-page content and permission flags."""
+        from PyPDF2 import PdfWriter
+        from PyPDF2.generic import DecodedStreamObject, NameObject
+        writer = PdfWriter()
+        for i in range(15):
+            writer.add_blank_page(width=300, height=400)
+            content = DecodedStreamObject()
+            content.set_data(f"BT (Line {i} with \\(parens\\)) Tj ET".encode())
+            writer.pages[-1][NameObject("/Contents")] = writer._add_object(content)
+        input_pdf = os.path.join(self.test_dir, "input.pdf")
+        with open(input_pdf, "wb") as f:
+            writer.write(f)
+        
+        permissions = {'print': True, 'modify': False, 'copy': False, 'annotate': True}
+        standard, streaming = self.protect_both(input_pdf, permissions)
+        self.assert_equivalent(standard, streaming)
+        
+    def test_text_string_file_id(self):
+        """Test that an existing /ID read back as a text string is kept and usable."""
+        from PyPDF2.generic import ArrayObject, TextStringObject, create_string_object
+        from pdf_stream_engine import standard_encryption
+        file_id = ArrayObject([create_string_object(b"0123456789abcdef"), create_string_object(b"fedcba9876543210")])
+        self.assertIsInstance(file_id[0], TextStringObject)
+        encryption, entry, kept = standard_encryption("user123", "owner456", -4, file_id)
+        self.assertIs(kept, file_id)
+        self.assertEqual(encryption.id1_entry, b"0123456789abcdef")
+        
+    def test_strings_are_encrypted(self):
+        """Test that string values decrypt to the same text and are not stored in the clear."""
+        from PyPDF2 import PdfWriter
+        writer = PdfWriter()
+        writer.add_blank_page(width=200, height=200)
+        writer.add_metadata({'/Title': 'Confidential (draft) \\ v2', '/Subject': 'Plain subject'})
+        input_pdf = os.path.join(self.test_dir, "input.pdf")
+        with open(input_pdf, "wb") as f:
+            writer.write(f)
+        
+        standard, streaming = self.protect_both(input_pdf)
+        self.assert_equivalent(standard, streaming)
+        self.assertEqual(streaming.metadata.get('/Title'), standard.metadata.get('/Title'))
+        self.assertEqual(streaming.metadata.get('/Subject'), 'Plain subject')
+        with open(os.path.join(self.test_dir, "protected_streaming.pdf"), "rb") as f:
+            self.assertNotIn(b"Plain subject", f.read())
+            
+    def test_object_streams(self):
+        """Test a PDF 1.5 file with object and cross-reference streams."""
+        input_pdf = make_object_stream_pdf(os.path.join(self.test_dir, "objstm.pdf"))
+        
+        standard, streaming = self.protect_both(input_pdf)
+        self.assert_equivalent(standard, streaming)
+        self.assertEqual(streaming.metadata.get('/Title'), 'Object stream (test)')
+        self.assertEqual(streaming.metadata.get('/Author'), 'Jane')
+        
+    def test_owner_password_opens_output(self):
+        """Test that the owner password opens the streaming engine output."""
+        from PyPDF2 import PdfReader
+        input_pdf = make_test_pdf(os.path.join(self.test_dir, "input.pdf"), pages=3)
+        output_pdf = os.path.join(self.test_dir, "protected.pdf")
+        self.assertTrue(add_password(input_pdf, output_pdf, "user123", "owner456", False, True, engine='streaming'))
+        
+        reader = PdfReader(output_pdf)
+        self.assertEqual(reader.decrypt("owner456"), 2)
+        self.assertEqual(len(reader.pages), 3)
+        self.assertEqual(PdfReader(output_pdf).decrypt("wrong"), 0)
+        
+class TestRekey(unittest.TestCase):
+    """Test single-pass password changes."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.input_pdf = os.path.join(self.test_dir, "input.pdf")
+        from PyPDF2 import PdfWriter
+        writer = PdfWriter()
+        writer.add_blank_page(width=200, height=200)
+        writer.encrypt(user_password="user123", owner_password="owner456", use_128bit=True, permissions_flag=-3904)
+        with open(self.input_pdf, "wb") as f:
+            writer.write(f)
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def open_output(self, output_pdf):
+        from PyPDF2 import PdfReader
+        reader = PdfReader(output_pdf)
+        self.assertTrue(reader.is_encrypted)
+        return reader
+        
+    def test_change_user_password(self):
+        """Test that the new user password replaces the old one and the owner password is kept."""
+        for engine in ('standard', 'streaming'):
+            output_pdf = os.path.join(self.test_dir, f"rekeyed_{engine}.pdf")
+            self.assertTrue(rekey_password(self.input_pdf, output_pdf, "owner456", "new789",
+                                           create_backup_flag=False, overwrite=True, engine=engine))
+            self.assertFalse(self.open_output(output_pdf).decrypt("user123"))
+            self.assertEqual(self.open_output(output_pdf).decrypt("new789"), 1)
+            reader = self.open_output(output_pdf)
+            self.assertEqual(reader.decrypt("owner456"), 2)
+            self.assertEqual(len(reader.pages), 1)
+
+    def test_rekey_keeps_handler(self):
+        """Test that AES-256 and 40-bit RC4 documents are not re-encrypted with a different handler."""
+        from PyPDF2 import PdfWriter
+        aes_pdf = make_aes256_pdf(os.path.join(self.test_dir, "aes.pdf"), "secret")
+        rc4_pdf = os.path.join(self.test_dir, "rc4.pdf")
+        writer = PdfWriter()
+        writer.add_blank_page(width=200, height=200)
+        writer.encrypt(user_password="secret", use_128bit=False)
+        with open(rc4_pdf, "wb") as f:
+            writer.write(f)
+        for input_pdf, handler in ((aes_pdf, (5, 6, "/AESV3")), (rc4_pdf, (1, 2, "/V2"))):
+            for engine in ('standard', 'streaming'):
+                output_pdf = os.path.join(self.test_dir, f"rekeyed_{engine}.pdf")
+                self.assertTrue(rekey_password(input_pdf, output_pdf, "secret", "new789", "admin000",
+                                               create_backup_flag=False, overwrite=True, engine=engine))
+                reader = self.open_output(output_pdf)
+                encryption = reader._encryption
+                self.assertEqual((encryption.algV, encryption.algR, encryption.StmF), handler)
+                self.assertEqual(reader.decrypt("new789"), 1)
+                self.assertEqual(self.open_output(output_pdf).decrypt("admin000"), 2)
+                self.assertEqual(len(reader.pages), 1)
+
+    def test_owner_only_change_keeps_user_password(self):
+        """Test that the user password is recovered when only the owner password changes."""
+        output_pdf = os.path.join(self.test_dir, "rekeyed.pdf")
+        self.assertTrue(rekey_password(self.input_pdf, output_pdf, "owner456", new_owner_password="admin000",
+                                       create_backup_flag=False, overwrite=True))
+        self.assertEqual(self.open_output(output_pdf).decrypt("user123"), 1)
+        self.assertEqual(self.open_output(output_pdf).decrypt("admin000"), 2)
+        self.assertFalse(self.open_output(output_pdf).decrypt("owner456"))
+
+    def test_owner_only_change_aes256(self):
+        """Test an AES-256 owner-only change when the owner password is also the user password."""
+        aes_pdf = make_aes256_pdf(os.path.join(self.test_dir, "aes.pdf"), "secret")
+        for engine in ('standard', 'streaming'):
+            output_pdf = os.path.join(self.test_dir, f"rekeyed_{engine}.pdf")
+            self.assertTrue(rekey_password(aes_pdf, output_pdf, "secret", new_owner_password="admin000",
+                                           create_backup_flag=False, overwrite=True, engine=engine))
+            reader = self.open_output(output_pdf)
+            self.assertEqual((reader._encryption.algV, reader._encryption.algR), (5, 6))
+            self.assertEqual(reader.decrypt("secret"), 1)
+            self.assertEqual(self.open_output(output_pdf).decrypt("admin000"), 2)
+
+    def test_permission_only_change(self):
+        """Test that permissions change while both passwords are kept."""
+        output_pdf = os.path.join(self.test_dir, "rekeyed.pdf")
+        permissions = {'print': True, 'modify': False, 'copy': False, 'annotate': False}
+        self.assertTrue(rekey_password(self.input_pdf, output_pdf, "owner456", permissions=permissions,
+                                       create_backup_flag=False, overwrite=True))
+        reader = self.open_output(output_pdf)
+        self.assertEqual(reader.decrypt("user123"), 1)
+        self.assertEqual(reader._encryption.entry['/P'], _convert_permissions_to_flag(permissions))
+        
+        # Without new permissions the current flags are kept
+        self.assertTrue(rekey_password(self.input_pdf, output_pdf, "owner456", "new789",
+                                       create_backup_flag=False, overwrite=True))
+        self.assertEqual(self.open_output(output_pdf)._encryption.entry['/P'], -3904)
+        
+    def test_user_password_requires_new_owner_password(self):
+        """Test that the owner password cannot be kept when it is not known."""
+        output_pdf = os.path.join(self.test_dir, "rekeyed.pdf")
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            result = rekey_password(self.input_pdf, output_pdf, "user123", "new789",
+                                    create_backup_flag=False, overwrite=True)
+        self.assertFalse(result)
+        self.assertIn("Specify a new owner password", mock_stdout.getvalue())
+        self.assertFalse(os.path.exists(output_pdf))
+        
+        self.assertTrue(rekey_password(self.input_pdf, output_pdf, "user123", "new789", "admin000",
+                                       create_backup_flag=False, overwrite=True))
+        self.assertEqual(self.open_output(output_pdf).decrypt("admin000"), 2)
+        
+    def test_batch_rekey(self):
+        """Test rekey mode in batch processing."""
+        output_dir = os.path.join(self.test_dir, "out")
+        os.makedirs(output_dir)
+        with patch('sys.stdout', new_callable=StringIO):
+            successful, failed = process_batch([self.input_pdf], "owner456", output_dir, backup=False,
+                                               overwrite=True, operation='rekey', new_password="new789")
+        self.assertEqual((successful, failed), ([self.input_pdf], []))
+        output_pdf = os.path.join(output_dir, "rekeyed_input.pdf")
+        self.assertEqual(self.open_output(output_pdf).decrypt("new789"), 1)
+
+
+class TestProbe(unittest.TestCase):
+    """Test the header-only encryption probe and inspect mode."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_probe_encrypted(self):
+        """Test that the security handler is reported from the /Encrypt dictionary."""
+        from pdf_probe import probe_pdf
+        info = probe_pdf(make_test_pdf(os.path.join(self.test_dir, "e.pdf"), pages=3, password="secret"))
+        self.assertTrue(info['encrypted'])
+        self.assertEqual(info['filter'], 'Standard')
+        self.assertEqual((info['version'], info['revision'], info['key_length']), (2, 3, 128))
+        self.assertEqual(info['method'], 'RC4')
+        self.assertIsNotNone(info['permissions'])
+        self.assertEqual(info['page_count'], 3)
+        
+    def test_probe_object_stream(self):
+        """Test an unencrypted file whose catalog lives in an object stream."""
+        from pdf_probe import probe_pdf
+        info = probe_pdf(make_object_stream_pdf(os.path.join(self.test_dir, "o.pdf")))
+        self.assertFalse(info['encrypted'])
+        self.assertEqual(info['pdf_version'], '1.5')
+        self.assertEqual(info['page_count'], 1)
+        
+    def test_probe_follows_incremental_updates(self):
+        """Test that the newest revision of an object wins and older sections are still used."""
+        from PyPDF2 import PdfReader
+        from pdf_probe import probe_pdf
+        path = make_test_pdf(os.path.join(self.test_dir, "u.pdf"), pages=2)
+        reader = PdfReader(path)
+        root = reader.trailer.raw_get('/Root')
+        pages_id = reader.trailer['/Root'].raw_get('/Pages').idnum
+        with open(path, "rb") as f:
+            data = f.read()
+        prev = int(data[data.rindex(b"startxref"):].split()[1])
+        
+        offset = len(data)
+        update = b"%d 0 obj\n<< /Type /Pages /Kids [] /Count 7 >>\nendobj\n" % pages_id
+        xref = offset + len(update)
+        update += (b"xref\n%d 1\n%010d 00000 n \ntrailer\n<< /Size %d /Root %d 0 R /Prev %d >>\nstartxref\n%d\n%%%%EOF\n"
+                   % (pages_id, offset, reader.trailer['/Size'], root.idnum, prev, xref))
+        with open(path, "ab") as f:
+            f.write(update)
+            
+        self.assertEqual(probe_pdf(path)['page_count'], 7)
+        
+    def test_probe_indirect_count(self):
+        """Test that an indirect /Count is resolved rather than read as a truncated number."""
+        from PyPDF2 import PdfReader
+        from pdf_probe import probe_pdf
+        path = make_test_pdf(os.path.join(self.test_dir, "i.pdf"), pages=2)
+        reader = PdfReader(path)
+        root = reader.trailer.raw_get('/Root')
+        pages_id = reader.trailer['/Root'].raw_get('/Pages').idnum
+        # A two-digit object number, so a truncated match would read /Count 1
+        count_id = max(reader.trailer['/Size'], 12)
+        with open(path, "rb") as f:
+            data = f.read()
+        prev = int(data[data.rindex(b"startxref"):].split()[1])
+        
+        offset = len(data)
+        update = b"%d 0 obj\n<< /Type /Pages /Kids [] /Count %d 0 R >>\nendobj\n" % (pages_id, count_id)
+        count_offset = offset + len(update)
+        update += b"%d 0 obj\n3\nendobj\n" % count_id
+        xref = offset + len(update)
+        update += (b"xref\n%d 1\n%010d 00000 n \n%d 1\n%010d 00000 n \n"
+                   b"trailer\n<< /Size %d /Root %d 0 R /Prev %d >>\nstartxref\n%d\n%%%%EOF\n"
+                   % (pages_id, offset, count_id, count_offset, count_id + 1, root.idnum, prev, xref))
+        with open(path, "ab") as f:
+            f.write(update)
+            
+        self.assertEqual(probe_pdf(path)['page_count'], 3)
+        
+    def test_probe_rejects_garbage(self):
+        """Test that files without a usable trailer raise ProbeError."""
+        from pdf_probe import ProbeError, probe_pdf
+        path = os.path.join(self.test_dir, "bad.pdf")
+        with open(path, "wb") as f:
+            f.write(b"%PDF-1.4\nnot really a pdf\n")
+        with self.assertRaises(ProbeError):
+            probe_pdf(path)
+            
+    def test_remove_skips_unencrypted_without_parsing(self):
+        """Test that remove_password skips unencrypted files before backup and full parse."""
+        path = make_test_pdf(os.path.join(self.test_dir, "plain.pdf"))
+        with patch('remove_pdf_password.create_backup') as mock_backup, \
+             patch('remove_pdf_password.PdfReader') as mock_reader, \
+             patch('sys.stdout', new_callable=StringIO):
+            self.assertTrue(remove_password(path, os.path.join(self.test_dir, "out.pdf"), "x"))
+        mock_backup.assert_not_called()
+        mock_reader.assert_not_called()
+        
+    def test_inspect_directory(self):
+        """Test that inspect mode prints one JSON line per PDF in a directory."""
+        import json
+        make_test_pdf(os.path.join(self.test_dir, "a.pdf"), password="secret")
+        make_test_pdf(os.path.join(self.test_dir, "b.pdf"))
+        with open(os.path.join(self.test_dir, "c.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4\n")
+        with open(os.path.join(self.test_dir, "notes.txt"), "w") as f:
+            f.write("ignored")
+            
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            errors = remove_pdf_password.inspect_pdfs([self.test_dir])
+        records = {os.path.basename(r['path']): r for r in map(json.loads, mock_stdout.getvalue().splitlines())}
+        
+        self.assertEqual(errors, 1)
+        self.assertEqual(sorted(records), ["a.pdf", "b.pdf", "c.pdf"])
+        self.assertTrue(records["a.pdf"]['encrypted'])
+        self.assertFalse(records["b.pdf"]['encrypted'])
+        self.assertIn('error', records["c.pdf"])
+
+
+class TestPasswordMap(unittest.TestCase):
+    """Test per-file password manifests."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.test_dir, "out")
+        os.makedirs(self.output_dir)
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def write(self, name, text):
+        path = os.path.join(self.test_dir, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+        
+    def test_read_formats(self):
+        """Test that CSV, JSON and JSONL manifests produce the same entries."""
+        from password_map import read_password_map
+        csv_path = self.write("m.csv", 'path,password,owner_password,permissions\na.pdf,pa,,"print,copy"\n')
+        jsonl_path = self.write("m.jsonl", '{"path": "a.pdf", "password": "pa", "permissions": ["print", "copy"]}\n\n')
+        json_path = self.write("m.json", '[{"path": "a.pdf", "password": "pa", "permissions": {"print": true, "copy": true}}]')
+        
+        expected = [{'path': 'a.pdf', 'password': 'pa', 'owner_password': None, 'new_password': None,
+                     'permissions': {'print': True, 'modify': False, 'copy': True, 'annotate': False}}]
+        for path in (csv_path, jsonl_path, json_path):
+            self.assertEqual(list(read_password_map(path)), expected)
+            
+    def test_invalid_records(self):
+        """Test that bad records are reported with their location."""
+        from password_map import PasswordMapError, read_password_map
+        path = self.write("m.jsonl", '{"path": "a.pdf", "password": "pa"}\n{"password": "pb"}\n')
+        with self.assertRaisesRegex(PasswordMapError, "m.jsonl:2: missing 'path'"):
+            list(read_password_map(path))
+        path = self.write("m.csv", "path,password,permissions\na.pdf,pa,print+fly\n")
+        with self.assertRaisesRegex(PasswordMapError, "unknown permissions"):
+            list(read_password_map(path))
+        with self.assertRaises(PasswordMapError):
+            list(read_password_map(self.write("m.txt", "a.pdf pa")))
+            
+    def test_lookup_prefers_exact_paths(self):
+        """Test exact paths over patterns and name-only patterns."""
+        from password_map import PasswordMap
+        password_map = PasswordMap([
+            {'path': 'in/*.pdf', 'password': 'dir', 'owner_password': None, 'new_password': None, 'permissions': None},
+            {'path': 'special.pdf', 'password': 'exact', 'owner_password': None, 'new_password': None, 'permissions': None},
+            {'path': 'cust_*.pdf', 'password': 'name', 'owner_password': None, 'new_password': None, 'permissions': None},
+        ])
+        self.assertEqual(password_map.lookup('./special.pdf')['password'], 'exact')
+        self.assertEqual(password_map.lookup('in/other.pdf')['password'], 'dir')
+        self.assertEqual(password_map.lookup('elsewhere/cust_7.pdf')['password'], 'name')
+        self.assertIsNone(password_map.lookup('elsewhere/other.pdf'))
+        
+    def test_batch_with_mixed_passwords(self):
+        """Test a batch where each file has its own password, with and without input files."""
+        from password_map import PasswordMap, iter_password_map_files, read_password_map
+        a = make_test_pdf(os.path.join(self.test_dir, "a.pdf"), password="pa")
+        b = make_test_pdf(os.path.join(self.test_dir, "cust_b.pdf"), password="pb")
+        c = make_test_pdf(os.path.join(self.test_dir, "c.pdf"), password="default")
+        d = make_test_pdf(os.path.join(self.test_dir, "d.pdf"), password="pd")
+        path = self.write("m.jsonl", "\n".join([
+            f'{{"path": "{a}", "password": "pa"}}',
+            f'{{"path": "{os.path.join(self.test_dir, "cust_*.pdf")}", "password": "pb"}}',
+        ]))
+        
+        with patch('sys.stdout', new_callable=StringIO):
+            successful, failed = process_batch([a, b, c, d], "default", self.output_dir, backup=False,
+                                               overwrite=True, password_map=PasswordMap(read_password_map(path)))
+        self.assertEqual((successful, failed), ([a, b, c], [d]))
+        
+        # Without input files the manifest itself is the work list
+        with patch('sys.stdout', new_callable=StringIO):
+            successful, failed = process_batch(iter_password_map_files(read_password_map(path)), None,
+                                               self.output_dir, backup=False, overwrite=True, jobs=2)
+        self.assertEqual((sorted(successful), failed), ([a, b], []))
+        
+    def test_permissions_from_manifest(self):
+        """Test that manifest permissions override the batch-wide ones in add mode."""
+        from PyPDF2 import PdfReader
+        from password_map import iter_password_map_files, read_password_map
+        a = make_test_pdf(os.path.join(self.test_dir, "a.pdf"))
+        path = self.write("m.csv", f"path,password,permissions\n{a},pa,print\n")
+        with patch('sys.stdout', new_callable=StringIO):
+            successful, failed = process_batch(iter_password_map_files(read_password_map(path)), None,
+                                               self.output_dir, backup=False, overwrite=True, operation='add',
+                                               permissions={'print': True, 'modify': True, 'copy': True, 'annotate': True})
+        self.assertEqual(successful, [a])
+        reader = PdfReader(os.path.join(self.output_dir, "protected_a.pdf"))
+        self.assertTrue(reader.decrypt("pa"))
+        self.assertEqual(reader._encryption.entry['/P'], _convert_permissions_to_flag({'print': True}))
+
+
+class TestKeyring(unittest.TestCase):
+    """Test known-password keyrings."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.test_dir, "out")
+        os.makedirs(self.output_dir)
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_most_recently_successful_first(self):
+        """Test that a matching password moves to the front of the keyring."""
+        from password_map import Keyring
+        keyring = Keyring(["alpha", "beta", "", "gamma", "beta"])
+        tried = []
+        
+        class FakeEncryption:
+            def __init__(self, password):
+                self.password = password
+            def verify(self, candidate):
+                tried.append(candidate)
+                return 1 if candidate == self.password else 0
+                
+        self.assertEqual(len(keyring), 3)
+        self.assertEqual(keyring.match(FakeEncryption("gamma")), "gamma")
+        self.assertEqual(tried, ["alpha", "beta", "gamma"])
+        del tried[:]
+        self.assertEqual(keyring.match(FakeEncryption("gamma")), "gamma")
+        self.assertEqual(tried, ["gamma"])
+        self.assertIsNone(keyring.match(FakeEncryption("delta")))
+        
+    def test_find_keyring_password(self):
+        """Test candidate verification against the encryption dictionary of a real file."""
+        from password_map import Keyring
+        path = make_test_pdf(os.path.join(self.test_dir, "a.pdf"), password="company-2")
+        keyring = Keyring(["company-1", "company-2", "company-3"])
+        self.assertEqual(remove_pdf_password.find_keyring_password(path, keyring), "company-2")
+        self.assertIsNone(remove_pdf_password.find_keyring_password(make_test_pdf(os.path.join(self.test_dir, "p.pdf")), keyring))
+        
+    def test_batch_parses_each_file_once(self):
+        """Test that wrong candidates never cost a full parse."""
+        from PyPDF2 import PdfReader
+        from password_map import Keyring
+        keyring_path = os.path.join(self.test_dir, "keyring.txt")
+        with open(keyring_path, "w") as f:
+            f.write("company-1\ncompany-2\n\ncompany-3\n")
+        files = [make_test_pdf(os.path.join(self.test_dir, f"f{i}.pdf"), password=f"company-{i % 3 + 1}") for i in range(4)]
+        other = make_test_pdf(os.path.join(self.test_dir, "other.pdf"), password="unknown")
+        
+        with patch('remove_pdf_password.PdfReader', side_effect=PdfReader) as mock_reader, \
+             patch('sys.stdout', new_callable=StringIO):
+            successful, failed = process_batch(files + [other], None, self.output_dir, backup=False, overwrite=True,
+                                               keyring=Keyring.from_file(keyring_path))
+        self.assertEqual((successful, failed), (files, [other]))
+        self.assertEqual(mock_reader.call_count, len(files))
+
+
+class TestDerivedKeyCache(unittest.TestCase):
+    """Test the AES-256 derived-key cache."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_reuses_keys_for_identical_handlers(self):
+        """Test that a second document with the same handler skips the key derivation."""
+        from PyPDF2 import PdfReader
+        from PyPDF2._encryption import AlgV5
+        from key_cache import DerivedKeyCache
+        path = make_aes256_pdf(os.path.join(self.test_dir, "a.pdf"), "secret")
+        cache = DerivedKeyCache()
+        
+        first = PdfReader(path)
+        self.assertEqual(cache.decrypt(first, "secret"), 2)
+        second = PdfReader(path)
+        with patch.object(AlgV5, 'calculate_hash', side_effect=AssertionError("key derived again")):
+            self.assertEqual(cache.decrypt(second, "secret"), 2)
+        self.assertEqual(second._encryption._key, first._encryption._key)
+        self.assertEqual(len(second.pages), 1)
+        self.assertEqual(cache.stats(), (1, 1))
+        
+        # Wrong passwords are remembered too
+        self.assertFalse(cache.decrypt(PdfReader(path), "wrong"))
+        self.assertFalse(cache.decrypt(PdfReader(path), "wrong"))
+        self.assertEqual(cache.stats(), (2, 2))
+        
+    def test_eviction_zeroes_keys(self):
+        """Test the LRU bound and that evicted keys are overwritten."""
+        from PyPDF2 import PdfReader
+        from key_cache import DerivedKeyCache
+        paths = [make_aes256_pdf(os.path.join(self.test_dir, f"{i}.pdf"), "secret") for i in range(3)]
+        cache = DerivedKeyCache(max_size=2)
+        
+        cache.decrypt(PdfReader(paths[0]), "secret")
+        stored = next(iter(cache._entries.values()))[0]
+        self.assertNotEqual(bytes(stored), bytes(32))
+        cache.decrypt(PdfReader(paths[1]), "secret")
+        cache.decrypt(PdfReader(paths[2]), "secret")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(bytes(stored), bytes(32))
+        
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        
+    def test_batch_summary_reports_hits(self):
+        """Test that the batch summary shows the cache hit and miss counts."""
+        import remove_pdf_password as module
+        from key_cache import DerivedKeyCache
+        original = make_aes256_pdf(os.path.join(self.test_dir, "a.pdf"), "secret")
+        files = [original]
+        for i in range(2):
+            copy = os.path.join(self.test_dir, f"copy{i}.pdf")
+            shutil.copyfile(original, copy)
+            files.append(copy)
+        output_dir = os.path.join(self.test_dir, "out")
+        os.makedirs(output_dir)
+        
+        with patch.object(module, 'key_cache', DerivedKeyCache()), \
+             patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            successful, failed = process_batch(files, "secret", output_dir, backup=False, overwrite=True)
+        self.assertEqual(successful, files)
+        self.assertIn("AES-256 key cache: 2 hits, 1 misses", mock_stdout.getvalue())
+
+
+class TestLazyBackup(unittest.TestCase):
+    """Test that backups are only taken when the input is replaced."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.input_pdf = make_test_pdf(os.path.join(self.test_dir, "input.pdf"), pages=2, password="secret")
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def backups(self):
+        return [f for f in os.listdir(self.test_dir) if "_backup_" in f]
+        
+    def test_no_backup_for_separate_output(self):
+        """Test that writing a separate output file takes no backup."""
+        output_pdf = os.path.join(self.test_dir, "unlocked.pdf")
+        with patch('sys.stdout', new_callable=StringIO):
+            self.assertTrue(remove_password(self.input_pdf, output_pdf, "secret", True, True))
+            self.assertTrue(add_password(output_pdf, os.path.join(self.test_dir, "protected.pdf"), "new", None, True, True))
+        self.assertEqual(self.backups(), [])
+        
+    def test_backup_when_replacing_input(self):
+        """Test in-place processing with both engines."""
+        from PyPDF2 import PdfReader
+        for engine in ('standard', 'streaming'):
+            input_pdf = make_test_pdf(os.path.join(self.test_dir, f"{engine}.pdf"), pages=2, password="secret")
+            with open(input_pdf, "rb") as f:
+                original = f.read()
+            with patch('sys.stdout', new_callable=StringIO):
+                self.assertTrue(rekey_password(input_pdf, input_pdf, "secret", "secret2", "secret2",
+                                               True, True, engine=engine))
+            reader = PdfReader(input_pdf)
+            self.assertTrue(reader.decrypt("secret2"))
+            self.assertEqual(len(reader.pages), 2)
+            
+            backups = [f for f in self.backups() if f.startswith(engine)]
+            self.assertEqual(len(backups), 1)
+            with open(os.path.join(self.test_dir, backups[0]), "rb") as f:
+                self.assertEqual(f.read(), original)
+        self.assertEqual([f for f in os.listdir(self.test_dir) if f.endswith(".tmp")], [])
+        
+    def test_no_backup_on_wrong_password(self):
+        """Test that a failed decrypt does not cost a backup even when overwriting."""
+        with patch('sys.stdout', new_callable=StringIO):
+            self.assertFalse(remove_password(self.input_pdf, self.input_pdf, "wrong", True, True))
+        self.assertEqual(self.backups(), [])
+
+
+class TestBackupStore(unittest.TestCase):
+    """Test the content-addressed backup store."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.test_dir, "store")
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def stored_objects(self):
+        return [name for _, _, names in os.walk(os.path.join(self.store_dir, "objects")) for name in names]
+        
+    def test_identical_content_stored_once(self):
+        """Test that repeated backups of the same content share one object."""
+        from backup_store import BackupStore
+        store = BackupStore(self.store_dir)
+        first = make_test_pdf(os.path.join(self.test_dir, "a.pdf"), pages=1)
+        second = os.path.join(self.test_dir, "b.pdf")
+        shutil.copyfile(first, second)
+        
+        paths = [store.store(first), store.store(first), store.store(second)]
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(len(self.stored_objects()), 1)
+        with open(paths[0], "rb") as f, open(first, "rb") as g:
+            self.assertEqual(f.read(), g.read())
+        
+        entries = list(store.entries())
+        self.assertEqual([e['path'] for e in entries], [os.path.abspath(p) for p in (first, first, second)])
+        
+    def test_plain_copy_fallback(self):
+        """Test the copy when neither reflink nor copy_file_range is available."""
+        import backup_store
+        source = make_test_pdf(os.path.join(self.test_dir, "a.pdf"), pages=3)
+        destination = os.path.join(self.test_dir, "copy.pdf")
+        with patch.object(backup_store, "fcntl", None), \
+             patch("os.copy_file_range", side_effect=OSError("not supported"), create=True):
+            self.assertEqual(backup_store.clone_file(source, destination), 'copy')
+        with open(source, "rb") as f, open(destination, "rb") as g:
+            self.assertEqual(f.read(), g.read())
+        
+    def test_prune_keep_last(self):
+        """Test that pruning keeps the newest backups per file and reports reclaimed bytes."""
+        from backup_store import BackupStore
+        store = BackupStore(self.store_dir)
+        input_pdf = os.path.join(self.test_dir, "a.pdf")
+        sizes = []
+        for pages in (1, 2, 3):
+            make_test_pdf(input_pdf, pages=pages)
+            sizes.append(os.path.getsize(input_pdf))
+            latest = store.store(input_pdf)
+        
+        result = store.prune(keep_last=1)
+        self.assertEqual(result, {'entries_removed': 2, 'objects_removed': 2, 'bytes_reclaimed': sizes[0] + sizes[1]})
+        self.assertEqual(self.stored_objects(), [os.path.basename(latest)])
+        self.assertEqual(len(list(store.entries())), 1)
+        
+    def test_prune_max_age(self):
+        """Test that pruning by age drops old backups only."""
+        from datetime import datetime, timedelta
+        from backup_store import BackupStore
+        store = BackupStore(self.store_dir)
+        store.store(make_test_pdf(os.path.join(self.test_dir, "a.pdf"), pages=1))
+        
+        self.assertEqual(store.prune(max_age_days=1)['entries_removed'], 0)
+        result = store.prune(max_age_days=1, now=datetime.now() + timedelta(days=2))
+        self.assertEqual(result['objects_removed'], 1)
+        self.assertEqual(self.stored_objects(), [])
+        
+    def test_in_place_remove_uses_store(self):
+        """Test that in-place processing backs up into the store instead of the input directory."""
+        from backup_store import BackupStore
+        input_pdf = make_test_pdf(os.path.join(self.test_dir, "input.pdf"), pages=2, password="secret")
+        with patch.object(remove_pdf_password, "backup_store", BackupStore(self.store_dir)), \
+             patch('sys.stdout', new_callable=StringIO):
+            self.assertTrue(remove_password(input_pdf, input_pdf, "secret", True, True))
+        
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["input.pdf", "store"])
+        self.assertEqual(len(self.stored_objects()), 1)
+
+
+class TestAtomicOutput(unittest.TestCase):
+    """Test atomic output writes and durability policies."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.input_pdf = make_test_pdf(os.path.join(self.test_dir, "input.pdf"), pages=2, password="secret")
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_failed_write_keeps_previous_output(self):
+        """Test that an interrupted write leaves the existing output intact."""
+        output_pdf = os.path.join(self.test_dir, "unlocked.pdf")
+        with open(output_pdf, "wb") as f:
+            f.write(b"previous")
+        
+        for engine in ('standard', 'streaming'):
+            target = 'remove_pdf_password.rewrite_pdf' if engine == 'streaming' else 'PyPDF2.PdfWriter.write'
+            with patch(target, side_effect=IOError("disk full")), patch('sys.stdout', new_callable=StringIO):
+                self.assertFalse(remove_password(self.input_pdf, output_pdf, "secret", False, True, engine))
+            with open(output_pdf, "rb") as f:
+                self.assertEqual(f.read(), b"previous")
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["input.pdf", "unlocked.pdf"])
+        
+    def test_file_durability_fsyncs_each_output(self):
+        """Test that 'file' durability syncs the data and the directory entry."""
+        output_pdf = os.path.join(self.test_dir, "unlocked.pdf")
+        with patch('os.fsync', wraps=os.fsync) as fsync, patch('sys.stdout', new_callable=StringIO):
+            self.assertTrue(remove_password(self.input_pdf, output_pdf, "secret", False, True, durability='none'))
+            self.assertEqual(fsync.call_count, 0)
+            self.assertTrue(remove_password(self.input_pdf, output_pdf, "secret", False, True, durability='file'))
+            self.assertEqual(fsync.call_count, 2)
+        
+    def test_batch_durability_syncs_at_end(self):
+        """Test that 'batch' durability syncs every output and each directory once."""
+        files = [make_test_pdf(os.path.join(self.test_dir, f"doc{i}.pdf"), password="secret") for i in range(3)]
+        output_dir = os.path.join(self.test_dir, "out")
+        os.makedirs(output_dir)
+        with patch('os.fsync', wraps=os.fsync) as fsync, patch('sys.stdout', new_callable=StringIO):
+            successful, failed = process_batch(files, "secret", output_dir, False, True, durability='batch')
+        self.assertEqual((len(successful), failed), (3, []))
+        self.assertEqual(fsync.call_count, 4)
+
+
+class TestBatchJournal(unittest.TestCase):
+    """Test the progress journal and resumed batches."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.journal_path = os.path.join(self.test_dir, "journal.jsonl")
+        self.output_dir = os.path.join(self.test_dir, "out")
+        self.files = [make_test_pdf(os.path.join(self.test_dir, f"doc{i}.pdf"), password="secret") for i in range(3)]
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def run_batch(self, password="secret", jobs=1):
+        from batch_journal import BatchJournal
+        with BatchJournal(self.journal_path) as journal, patch('sys.stdout', new_callable=StringIO) as stdout:
+            result = process_batch(self.files, password, self.output_dir, False, True, jobs=jobs,
+                                   journal=journal, resume=True)
+        return result, stdout.getvalue()
+        
+    def test_resume_skips_completed_files(self):
+        """Test that a resumed batch only processes failed and changed files."""
+        import json
+        (successful, failed), _ = self.run_batch(password="wrong")
+        self.assertEqual(len(failed), 3)
+        
+        (successful, failed), _ = self.run_batch(jobs=2)
+        self.assertEqual((len(successful), failed), (3, []))
+        with open(self.journal_path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 6)
+        self.assertTrue(all(r['sha256'] and r['output'] for r in records[3:]))
+        
+        make_test_pdf(self.files[1], pages=2, password="secret")
+        (successful, failed), output = self.run_batch()
+        self.assertEqual(successful, [self.files[1]])
+        self.assertIn("Skipped (up to date): 2", output)
+        
+    def test_missing_output_is_reprocessed(self):
+        """Test that a file whose output was deleted is not treated as done."""
+        self.run_batch()
+        os.remove(os.path.join(self.output_dir, "unlocked_doc0.pdf"))
+        (successful, failed), _ = self.run_batch()
+        self.assertEqual(successful, [self.files[0]])
+        
+    def test_torn_last_line_ignored(self):
+        """Test that a record cut short by a crash is ignored and later records stay readable."""
+        from batch_journal import BatchJournal
+        self.run_batch()
+        with open(self.journal_path, "a") as f:
+            f.write('{"time": "2024-01-01T00:00:00", "operation": "rem')
+        
+        with BatchJournal(self.journal_path) as journal:
+            self.assertEqual(len(journal), 3)
+            journal.record('add', self.files[0], None, False)
+        with BatchJournal(self.journal_path) as journal:
+            self.assertEqual(len(journal), 3)
+            self.assertTrue(journal.is_complete('remove', self.files[0]))
+            self.assertFalse(journal.is_complete('add', self.files[0]))
+
+
+class TestIncremental(unittest.TestCase):
+    """Test make-style incremental batches."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.test_dir, "out")
+        self.files = [make_test_pdf(os.path.join(self.test_dir, f"doc{i}.pdf"), password="secret") for i in range(3)]
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def run_batch(self, operation='add', journal=None, **options):
+        with patch('sys.stdout', new_callable=StringIO):
+            successful, failed = process_batch(self.files, "secret", self.output_dir, False, True, operation,
+                                               journal=journal, incremental=True, **options)
+        self.assertEqual(failed, [])
+        return successful
+        
+    def age(self, path, seconds):
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 10**9))
+        
+    def test_skips_outputs_newer_than_inputs(self):
+        """Test that up-to-date outputs are skipped without opening the input."""
+        self.assertEqual(len(self.run_batch('remove')), 3)
+        
+        with patch('remove_pdf_password.PdfReader') as reader, patch('remove_pdf_password.open_input') as source:
+            reader.side_effect = source.side_effect = AssertionError("input opened")
+            self.assertEqual(self.run_batch('remove'), [])
+        
+        os.utime(self.files[2])
+        self.age(os.path.join(self.output_dir, "unlocked_doc2.pdf"), 10)
+        self.assertEqual(self.run_batch('remove'), [self.files[2]])
+        
+    def test_parameter_and_content_fingerprints(self):
+        """Test that the journal catches changed parameters and touched but unchanged inputs."""
+        from batch_journal import BatchJournal
+        with BatchJournal(os.path.join(self.test_dir, "journal.jsonl")) as journal:
+            self.assertEqual(len(self.run_batch('rekey', journal, new_password="new")), 3)
+            self.assertEqual(self.run_batch('rekey', journal, new_password="new"), [])
+            
+            # Same content, newer mtime: the stored hash shows nothing changed
+            for path in self.files:
+                os.utime(path)
+                self.age(os.path.join(self.output_dir, f"rekeyed_{os.path.basename(path)}"), 10)
+            self.assertEqual(self.run_batch('rekey', journal, new_password="new"), [])
+            
+            permissions = {'print': True, 'modify': False, 'copy': False, 'annotate': False}
+            self.assertEqual(len(self.run_batch('rekey', journal, new_password="new", permissions=permissions)), 3)
+
+
+class TestFileDiscovery(unittest.TestCase):
+    """Test lazy input discovery."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        for directory in ("", "a", os.path.join("a", "b"), "skip"):
+            os.makedirs(os.path.join(self.test_dir, directory), exist_ok=True)
+            for name in ("x.pdf", "notes.txt"):
+                with open(os.path.join(self.test_dir, directory, name), "w") as f:
+                    f.write("%PDF-1.4")
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def relative(self, paths):
+        return sorted(os.path.relpath(path, self.test_dir) for path in paths)
+        
+    def test_directory_walk_and_filters(self):
+        """Test recursion and include/exclude patterns."""
+        from file_discovery import iter_input_files
+        self.assertEqual(self.relative(iter_input_files([self.test_dir])), ["x.pdf"])
+        self.assertEqual(self.relative(iter_input_files([self.test_dir], recursive=True, exclude=["skip"])),
+                         ["a/b/x.pdf", "a/x.pdf", "x.pdf"])
+        self.assertEqual(self.relative(iter_input_files([self.test_dir], recursive=True, include=["*/a/x.pdf"])),
+                         ["a/x.pdf"])
+        
+    def test_inputs_consumed_lazily(self):
+        """Test that the first file is yielded before later inputs are read."""
+        from file_discovery import iter_input_files
+        consumed = []
+        
+        def sources():
+            for name in ("x.pdf", "missing.pdf"):
+                consumed.append(name)
+                yield os.path.join(self.test_dir, name)
+        
+        files = iter_input_files(sources())
+        self.assertEqual(os.path.basename(next(files)), "x.pdf")
+        self.assertEqual(consumed, ["x.pdf"])
+        
+    def test_read_file_list(self):
+        """Test newline- and NUL-separated lists."""
+        from file_discovery import read_file_list
+        list_path = os.path.join(self.test_dir, "list")
+        with open(list_path, "wb") as f:
+            f.write(b"one.pdf\r\nwith space.pdf\n\nlast.pdf")
+        self.assertEqual(list(read_file_list(list_path)), ["one.pdf", "with space.pdf", "last.pdf"])
+        
+        with open(list_path, "wb") as f:
+            f.write(b"new\nline.pdf\0" + b"x" * 70000 + b".pdf\0last.pdf")
+        with patch('file_discovery.READ_CHUNK_SIZE', 1024):
+            paths = list(read_file_list(list_path, null_separated=True))
+        self.assertEqual(paths, ["new\nline.pdf", "x" * 70000 + ".pdf", "last.pdf"])
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux-only")
+class TestDropFolderWatcher(unittest.TestCase):
+    """Test the inotify drop-folder watcher."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def poll_until(self, watcher, count, timeout=5):
+        import time
+        found = []
+        deadline = time.monotonic() + timeout
+        while len(found) < count and time.monotonic() < deadline:
+            found.extend(watcher.poll(0.1))
+        return sorted(os.path.basename(path) for path in found)
+        
+    def test_reports_files_once_closed_and_settled(self):
+        """Test that files being written are held back until closed and unchanged."""
+        from watch_folder import DropFolderWatcher
+        with DropFolderWatcher([self.test_dir], settle_time=0.3) as watcher:
+            with open(os.path.join(self.test_dir, "slow.pdf"), "wb") as f:
+                f.write(b"%PDF-1.4\n")
+                f.flush()
+                self.assertEqual(watcher.poll(0.4), [])
+            make_test_pdf(os.path.join(self.test_dir, "fast.pdf"))
+            with open(os.path.join(self.test_dir, "notes.txt"), "w") as f:
+                f.write("ignored")
+            self.assertEqual(watcher.poll(0), [])
+            self.assertEqual(self.poll_until(watcher, 2), ["fast.pdf", "slow.pdf"])
+        
+    def test_overflow_rescans_and_pending_is_bounded(self):
+        """Test that a queue overflow finds files again, never holding more than max_pending."""
+        from watch_folder import IN_Q_OVERFLOW, DropFolderWatcher
+        for i in range(5):
+            make_test_pdf(os.path.join(self.test_dir, f"doc{i}.pdf"))
+        with DropFolderWatcher([self.test_dir], settle_time=0, max_pending=2, initial_scan=False) as watcher:
+            self.assertEqual(watcher.poll(0), [])
+            watcher._handle(-1, IN_Q_OVERFLOW, "")
+            found = []
+            for _ in range(10):
+                found.extend(watcher.poll(0))
+                self.assertLessEqual(watcher.pending_count(), 2)
+        self.assertEqual(sorted(os.path.basename(path) for path in found), [f"doc{i}.pdf" for i in range(5)])
+        self.assertEqual(watcher.overflows, 1)
+
+
+class TestHTTPService(unittest.TestCase):
+    """Test the local HTTP job service on localhost."""
+    
+    @classmethod
+    def setUpClass(cls):
+        import threading
+        from http_service import JobService, make_server
+        cls.test_dir = tempfile.mkdtemp()
+        cls.service = JobService(jobs=1, max_concurrent=2, job_timeout=0.5, path_root=cls.test_dir)
+        cls.server = make_server(cls.service, "127.0.0.1", 0)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.input_pdf = make_test_pdf(os.path.join(cls.test_dir, "input.pdf"), pages=3, password="secret")
+        with open(cls.input_pdf, "rb") as f:
+            cls.data = f.read()
+            
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.service.close()
+        shutil.rmtree(cls.test_dir)
+        
+    def request(self, method, path, body=None, headers=None):
+        import http.client
+        connection = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=10)
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+            
+    def test_upload_round_trip(self):
+        """Test unlocking an uploaded PDF, sent in chunks, and getting the PDF back."""
+        import io
+        from PyPDF2 import PdfReader
+        chunks = (self.data[i:i + 1000] for i in range(0, len(self.data), 1000))
+        # http.client sends an iterable body with chunked transfer encoding
+        status, body = self.request("POST", "/remove", chunks, {"X-PDF-Password": "secret"})
+        self.assertEqual(status, 200)
+        reader = PdfReader(io.BytesIO(body))
+        self.assertFalse(reader.is_encrypted)
+        self.assertEqual(len(reader.pages), 3)
+        
+        status, body = self.request("POST", "/remove", self.data, {"X-PDF-Password": "wrong"})
+        self.assertEqual(status, 422)
+        self.assertIn("Incorrect password", json.loads(body)['messages'][0])
+        
+    def test_inspect_health_and_metrics(self):
+        """Test the JSON endpoints."""
+        status, body = self.request("POST", "/inspect", self.data)
+        self.assertEqual(status, 200)
+        self.assertEqual((json.loads(body)['encrypted'], json.loads(body)['page_count']), (True, 3))
+        self.assertEqual(self.request("GET", "/health"), (200, b'{"status": "ok"}'))
+        metrics = json.loads(self.request("GET", "/metrics")[1])
+        self.assertGreaterEqual(metrics['requests'], 1)
+        self.assertEqual(metrics['in_flight'], 0)
+        
+    def test_local_paths_confined_to_root(self):
+        """Test JSON requests naming local files."""
+        request = {"path": self.input_pdf, "password": "secret", "new_password": "other",
+                   "output": os.path.join(self.test_dir, "rekeyed.pdf")}
+        status, body = self.request("POST", "/rekey", json.dumps(request), {"Content-Type": "application/json"})
+        self.assertEqual(status, 200)
+        self.assertTrue(os.path.exists(json.loads(body)['output']))
+        
+        request['path'] = os.path.join(self.test_dir, "..", "outside.pdf")
+        status, _ = self.request("POST", "/rekey", json.dumps(request), {"Content-Type": "application/json"})
+        self.assertEqual(status, 403)
+        
+    def test_concurrency_limit_and_timeout(self):
+        """Test 503 when all slots are taken, 504 when a job runs too long and 500 when a worker crashes."""
+        import time
+        from http_service import RequestError
+        self.assertTrue(self.service.acquire() and self.service.acquire())
+        try:
+            status, _ = self.request("POST", "/remove", self.data, {"X-PDF-Password": "secret"})
+            self.assertEqual(status, 503)
+        finally:
+            self.service.release()
+            self.service.release()
+        
+        with self.assertRaises(RequestError) as context:
+            self.service.run(time.sleep, 1)
+        self.assertEqual(context.exception.status, 504)
+        
+        with self.assertRaises(RequestError) as context:
+            self.service.run(_crash, None)
+        self.assertEqual(context.exception.status, 500)
+        
+        # The timed-out and crashed workers were replaced
+        self.assertEqual(self.service.run(_double, 21), 42)
+        metrics = self.service.metrics()
+        self.assertEqual((metrics['timed_out'], metrics['crashed']), (1, 1))
+
+class TestWarmServer(unittest.TestCase):
+    """Test forwarding CLI commands to a warm server over a Unix socket."""
+    
+    @classmethod
+    def setUpClass(cls):
+        import subprocess
+        import time
+        cls.test_dir = tempfile.mkdtemp()
+        cls.socket_path = os.path.join(cls.test_dir, "server.sock")
+        cls.script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "remove_pdf_password.py")
+        cls.server = subprocess.Popen([sys.executable, cls.script, "--warm-server", "--socket", cls.socket_path],
+                                      cwd=cls.test_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 20
+        while not os.path.exists(cls.socket_path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        cls.input_pdf = make_test_pdf(os.path.join(cls.test_dir, "input.pdf"), pages=2, password="secret")
+        
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.terminate()
+        cls.server.wait(timeout=10)
+        shutil.rmtree(cls.test_dir)
+        
+    def run_cli(self, *args, forward=True, stdin=None):
+        import subprocess
+        env = dict(os.environ, PDFPM_SOCKET=self.socket_path)
+        if not forward:
+            env['PDFPM_NO_SERVER'] = '1'
+        return subprocess.run([sys.executable, self.script] + list(args), cwd=self.test_dir, env=env,
+                              input=stdin, capture_output=True, text=True, timeout=30)
+        
+    def test_socket_is_private(self):
+        """Test that the socket is only accessible to its owner."""
+        import stat
+        self.assertTrue(os.path.exists(self.socket_path))
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+        
+    def test_forwarded_command_matches_local_run(self):
+        """Test that a forwarded command prints the same output and exit status as a local run."""
+        import warm_server
+        with patch.dict(os.environ, {'PDFPM_SOCKET': self.socket_path}):
+            with self.assertRaises(SystemExit) as cm:
+                warm_server.forward_or_continue(["--inspect", self.input_pdf])
+        self.assertEqual(cm.exception.code, 0)
+        
+        forwarded = self.run_cli("--inspect", self.input_pdf)
+        local = self.run_cli("--inspect", self.input_pdf, forward=False)
+        self.assertEqual(forwarded.returncode, 0)
+        self.assertEqual(forwarded.stdout, local.stdout)
+        self.assertEqual(self.run_cli("--inspect", "missing.pdf").returncode, 1)
+        self.assertEqual(self.run_cli("--remove").returncode, 2)
+        
+    def test_forwarded_command_uses_client_directory(self):
+        """Test that relative paths are resolved in the client's working directory."""
+        result = self.run_cli("input.pdf", "--remove", "--password", "secret", "-o", "unlocked.pdf")
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        from PyPDF2 import PdfReader
+        self.assertFalse(PdfReader(os.path.join(self.test_dir, "unlocked.pdf")).is_encrypted)
+        
+    def test_password_prompt_falls_back_to_local_run(self):
+        """Test that a command needing a hidden password prompt runs in the client instead."""
+        result = self.run_cli("input.pdf", "--remove", "-o", "prompted.pdf", stdin="secret\n")
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertTrue(os.path.exists(os.path.join(self.test_dir, "prompted.pdf")))
+        
+    def test_no_server_continues_locally(self):
+        """Test that the client returns to run in-process when no server is listening."""
+        import warm_server
+        with patch.dict(os.environ, {'PDFPM_SOCKET': os.path.join(self.test_dir, "absent.sock")}):
+            self.assertIsNone(warm_server.forward_or_continue(["--inspect", self.input_pdf]))
+        with patch.dict(os.environ, {'PDFPM_SOCKET': self.socket_path, 'PDFPM_NO_SERVER': '1'}):
+            self.assertIsNone(warm_server.forward_or_continue(["--inspect", self.input_pdf]))
+
+class TestAsyncAPI(unittest.TestCase):
+    """Test the asyncio API."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.input_pdf = make_test_pdf(os.path.join(self.test_dir, "input.pdf"), pages=2, password="secret")
+        
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_single_file_coroutines(self):
+        """Test that the coroutines return results with the messages instead of printing or prompting."""
+        import asyncio
+        from async_api import add_password_async, remove_password_async
+        from PyPDF2 import PdfReader
+        output_pdf = os.path.join(self.test_dir, "unlocked.pdf")
+        
+        async def run():
+            return (await remove_password_async(self.input_pdf, output_pdf, "secret"),
+                    await remove_password_async(self.input_pdf, output_pdf, "secret"),
+                    await add_password_async(output_pdf, output_pdf, "new", overwrite=True, backup=False))
+        
+        with patch('sys.stdin') as stdin:
+            stdin.isatty.return_value = True
+            unlocked, existing, protected = asyncio.run(run())
+        self.assertTrue(unlocked['success'])
+        self.assertIn("Success!", unlocked['messages'][0])
+        self.assertFalse(existing['success'])
+        self.assertIn("Overwrite?", existing['messages'][0])
+        self.assertTrue(protected['success'])
+        self.assertTrue(PdfReader(output_pdf).is_encrypted)
+        
+    def test_batch_streams_results_with_bounded_concurrency(self):
+        """Test that no more than limit documents are in flight and every file gets a result."""
+        import asyncio
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        import async_api
+        for i in range(7):
+            shutil.copy(self.input_pdf, os.path.join(self.test_dir, f"copy{i}.pdf"))
+        state = {'running': 0, 'peak': 0}
+        lock = threading.Lock()
+        worker = async_api.process_file_worker
+        
+        def tracking_worker(*args):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.02)
+            try:
+                return worker(*args)
+            finally:
+                with lock:
+                    state['running'] -= 1
+        
+        async def run(executor):
+            return [result async for result in async_api.process_batch_async(
+                [self.test_dir], "secret", os.path.join(self.test_dir, "out"), executor=executor, limit=3)]
+        
+        with patch('async_api.process_file_worker', tracking_worker), ThreadPoolExecutor(8) as executor:
+            results = asyncio.run(run(executor))
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result['success'] for result in results))
+        self.assertLessEqual(state['peak'], 3)
+        
+    def test_captured_console_is_per_thread(self):
+        """Test that capturing one thread's output leaves other threads printing normally."""
+        import io
+        import threading
+        from remove_pdf_password import captured_console
+        captured = io.StringIO()
+        started, release = threading.Event(), threading.Event()
+        
+        def job():
+            with captured_console(captured):
+                print("from job")
+                started.set()
+                release.wait(5)
+        
+        thread = threading.Thread(target=job)
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            thread.start()
+            started.wait(5)
+            print("from main")
+            release.set()
+            thread.join()
+        self.assertEqual(captured.getvalue(), "from job\n")
+        self.assertEqual(stdout.getvalue(), "from main\n")
+
+class TestBytesAPI(unittest.TestCase):
+    """Test the in-memory bytes API."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        with open(make_test_pdf(os.path.join(self.test_dir, "input.pdf"), pages=2, password="secret"), "rb") as f:
+            self.data = f.read()
+            
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_remove_round_trip_without_files(self):
+        """Test unlocking and protecting in memory with each input and output kind."""
+        import io
+        from PyPDF2 import PdfReader
+        from remove_pdf_password import add_password_bytes, remove_password_bytes
+        for engine in ('standard', 'streaming'):
+            unlocked = remove_password_bytes(memoryview(self.data), "secret", engine=engine)
+            self.assertFalse(PdfReader(io.BytesIO(unlocked)).is_encrypted)
+            
+            appended = bytearray(b"header")
+            size = remove_password_bytes(io.BytesIO(self.data), "secret", output=appended, engine=engine)
+            self.assertEqual(bytes(appended[6:]), unlocked)
+            self.assertEqual(size, len(unlocked))
+            
+            buffer = bytearray(len(unlocked))
+            remove_password_bytes(self.data, "secret", output=memoryview(buffer), engine=engine)
+            self.assertEqual(bytes(buffer), unlocked)
+            
+            protected = add_password_bytes(unlocked, "new", permissions={'print': False}, engine=engine)
+            reader = PdfReader(io.BytesIO(protected))
+            self.assertTrue(reader.is_encrypted)
+            self.assertTrue(reader.decrypt("new"))
+        self.assertEqual(os.listdir(self.test_dir), ["input.pdf"])
+        
+    def test_unencrypted_data_is_passed_through(self):
+        """Test that an unencrypted PDF comes back as the same object."""
+        from remove_pdf_password import remove_password_bytes
+        unlocked = remove_password_bytes(self.data, "secret")
+        self.assertIs(remove_password_bytes(unlocked, "anything"), unlocked)
+        
+    def test_errors_raise(self):
+        """Test that bad input, a wrong password and a small buffer raise ValueError."""
+        from remove_pdf_password import remove_password_bytes
+        with self.assertRaises(ValueError):
+            remove_password_bytes(b"not a pdf", "secret")
+        with self.assertRaises(ValueError):
+            remove_password_bytes(self.data, "wrong")
+        with self.assertRaises(ValueError):
+            remove_password_bytes(self.data, "secret", output=memoryview(bytearray(10)))
+
+class TestSharedPayload(unittest.TestCase):
+    """Test shared-memory hand-off of in-memory PDFs to worker processes."""
+    
+    @classmethod
+    def setUpClass(cls):
+        from shared_payload import make_shared_executor
+        cls.executor = make_shared_executor(1)
+        
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+        
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        with open(make_test_pdf(os.path.join(self.test_dir, "input.pdf"), pages=2, password="secret"), "rb") as f:
+            self.data = f.read()
+            
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_memoryview_reader(self):
+        """Test that the reader streams a memoryview like a file."""
+        import io
+        from shared_payload import MemoryviewReader
+        stream = MemoryviewReader(memoryview(b"%PDF-1.7 body"))
+        self.assertEqual(stream.read(4), b"%PDF")
+        self.assertEqual(stream.seek(-4, io.SEEK_END), 9)
+        self.assertEqual(stream.read(), b"body")
+        self.assertEqual(stream.read(10), b"")
+        
+    def test_round_trip_through_worker(self):
+        """Test removing and adding a password in a worker through shared segments."""
+        import io
+        from PyPDF2 import PdfReader
+        from shared_payload import SharedPayload, submit_shared
+        with SharedPayload.from_bytes(self.data) as payload:
+            with submit_shared(self.executor, 'remove', payload, "secret").result() as unlocked:
+                self.assertFalse(PdfReader(io.BytesIO(unlocked.tobytes())).is_encrypted)
+                with submit_shared(self.executor, 'add', unlocked, "new").result() as protected:
+                    self.assertTrue(PdfReader(io.BytesIO(protected.tobytes())).decrypt("new"))
+                    
+    def test_result_larger_than_preallocated_segment(self):
+        """Test that a result that does not fit the output segment comes back in a new one."""
+        import io
+        from PyPDF2 import PdfReader
+        from shared_payload import submit_shared
+        with patch('shared_payload.OUTPUT_CAPACITY_FACTOR', 0), patch('shared_payload.OUTPUT_CAPACITY_SLACK', 16):
+            with submit_shared(self.executor, 'remove', self.data, "secret").result() as unlocked:
+                self.assertFalse(PdfReader(io.BytesIO(unlocked.tobytes())).is_encrypted)
+                
+    def test_errors_are_raised_by_the_future(self):
+        """Test that a wrong password fails the future."""
+        from shared_payload import submit_shared
+        with self.assertRaises(ValueError):
+            submit_shared(self.executor, 'remove', self.data, "wrong").result()
+            
+    def test_worker_closes_every_segment(self):
+        """Test that a segment that cannot be closed yet does not keep the others open."""
+        from shared_payload import MemoryviewReader, SharedPayload, _shared_worker
+        release = MemoryviewReader.close
+        
+        def close_stream(stream):
+            release(stream)
+            raise BufferError("cannot close exported pointers exist")
+            
+        with SharedPayload.from_bytes(self.data) as source, SharedPayload(2 * len(self.data)) as output, \
+             patch.object(MemoryviewReader, 'close', autospec=True, side_effect=close_stream), \
+             patch.object(SharedPayload, 'close', autospec=True, side_effect=SharedPayload.close) as close:
+            _shared_worker('remove', source.name, source.size, output.name, output.size, "secret", {})
+            self.assertEqual(close.call_count, 2)
+
+class TestMappedInput(unittest.TestCase):
+    """Test that the password operations read each input through one memory mapping."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.input_pdf = make_test_pdf(os.path.join(self.test_dir, "input.pdf"), pages=3, password="secret")
+            
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_open_input(self):
+        """Test that inputs are mapped, and empty files fall back to a plain file."""
+        import mmap
+        from remove_pdf_password import open_input
+        source = open_input(self.input_pdf)
+        self.assertIsInstance(source, mmap.mmap)
+        self.assertEqual(source[:4], b"%PDF")
+        source.close()
+        
+        empty = os.path.join(self.test_dir, "empty.pdf")
+        open(empty, "wb").close()
+        with open_input(empty) as source:
+            self.assertNotIsInstance(source, mmap.mmap)
+            self.assertEqual(source.read(), b"")
+            
+    def test_probe_reads_a_stream(self):
+        """Test that the encryption probe accepts an open stream and leaves it open."""
+        from pdf_probe import probe_pdf, read_encryption
+        from remove_pdf_password import open_input
+        source = open_input(self.input_pdf)
+        self.assertTrue(probe_pdf(source)['encrypted'])
+        self.assertIsNotNone(read_encryption(source))
+        self.assertFalse(source.closed)
+        source.close()
+        
+    def test_in_place_rewrite_does_not_map_input(self):
+        """Test that each engine parses the mapping, but reads an input its output replaces as a plain file."""
+        import io
+        import mmap
+        from PyPDF2 import PdfReader
+        output_pdf = os.path.join(self.test_dir, "output.pdf")
+        for engine in ('standard', 'streaming'):
+            with patch('remove_pdf_password.PdfReader', wraps=PdfReader) as reader:
+                self.assertTrue(remove_password(self.input_pdf, output_pdf, "secret", False, True, engine=engine))
+                self.assertIsInstance(reader.call_args[0][0], mmap.mmap)
+                self.assertTrue(remove_password(self.input_pdf, self.input_pdf, "secret", False, True, engine=engine))
+                self.assertNotIsInstance(reader.call_args[0][0], mmap.mmap)
+                if os.name != 'nt':
+                    # Not copied into memory: the open file outlives the rename
+                    self.assertIsInstance(reader.call_args[0][0], io.BufferedReader)
+            self.assertFalse(PdfReader(self.input_pdf).is_encrypted)
+            self.assertTrue(add_password(self.input_pdf, self.input_pdf, "secret", None, False, True, engine=engine))
+            protected = PdfReader(self.input_pdf)
+            self.assertTrue(protected.decrypt("secret"))
+            self.assertEqual(len(protected.pages), 3)
+
+class TestPipeline(unittest.TestCase):
+    """Test pipelined read/transform/write batches."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.test_dir, "out")
+        os.makedirs(self.output_dir)
+        self.files = [make_test_pdf(os.path.join(self.test_dir, f"doc{i}.pdf"), password="secret") for i in range(4)]
+            
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_stage_queue(self):
+        """Test that a stage queue ends after its producers and reports its depth."""
+        from batch_pipeline import StageQueue
+        queue = StageQueue('write', 2, producers=1)
+        self.assertTrue(queue.put(1))
+        self.assertTrue(queue.put(2))
+        self.assertEqual(queue.get(), 1)
+        queue.producer_done()
+        self.assertEqual(queue.get(), 2)
+        self.assertIsNone(queue.get())
+        stats = queue.stats()
+        self.assertEqual((stats['queue'], stats['size'], stats['max_depth']), ('write', 2, 2))
+        queue.abort()
+        self.assertFalse(queue.put(3))
+        
+    def test_pipeline_stops_on_error(self):
+        """Test that an exception in a stage stops the pipeline and is raised."""
+        from batch_pipeline import Pipeline
+        def transform(item):
+            if item == 3:
+                raise RuntimeError("broken")
+            return item
+        pipeline = Pipeline(lambda item: item, transform, lambda item: item * 2, 2, 2, 2, 2)
+        self.assertEqual(sorted(pipeline.run(range(3))), [0, 2, 4])
+        with self.assertRaises(RuntimeError):
+            list(Pipeline(lambda item: item, transform, lambda item: item, 2, 2, 2, 2).run(range(100)))
+            
+    def test_deferred_outputs(self):
+        """Test that outputs are left as temporary files inside deferred_outputs() until committed."""
+        from remove_pdf_password import commit_output, deferred_outputs
+        output_pdf = os.path.join(self.output_dir, "unlocked.pdf")
+        with deferred_outputs() as writes:
+            self.assertTrue(remove_password(self.files[0], output_pdf, "secret", False, True))
+        self.assertFalse(os.path.exists(output_pdf))
+        self.assertEqual(len(writes), 1)
+        temp_path = writes[0][0]
+        self.assertTrue(os.path.exists(temp_path))
+        commit_output(*writes[0])
+        self.assertFalse(os.path.exists(temp_path))
+        from PyPDF2 import PdfReader
+        self.assertFalse(PdfReader(output_pdf).is_encrypted)
+        
+    def test_pipelined_batch(self):
+        """Test a pipelined batch, including an output that cannot be written."""
+        from PyPDF2 import PdfReader
+        os.makedirs(os.path.join(self.output_dir, "unlocked_doc3.pdf"))
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            successful, failed = process_batch(self.files, "secret", self.output_dir, backup=False, overwrite=True,
+                                               jobs=2, pipeline=True, memory_budget=1)
+        self.assertEqual(sorted(successful), self.files[:3])
+        self.assertEqual(failed, self.files[3:])
+        for name in ("unlocked_doc0.pdf", "unlocked_doc1.pdf", "unlocked_doc2.pdf"):
+            self.assertFalse(PdfReader(os.path.join(self.output_dir, name)).is_encrypted)
+        self.assertEqual([name for name in os.listdir(self.output_dir) if name.endswith(".tmp")], [])
+        self.assertIn("Files waiting to transform", stdout.getvalue())
+        self.assertIn("Files waiting to write", stdout.getvalue())
+
+def _double(value):
+    return value * 2
+
+def _hang(value):
+    import time
+    time.sleep(60)
+
+def _crash(value):
+    os._exit(3)
+
+class TestFileTimeout(unittest.TestCase):
+    """Test per-file timeouts, isolated workers and the quarantine list."""
+    
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.test_dir, "out")
+        os.makedirs(self.output_dir)
+        self.files = [make_test_pdf(os.path.join(self.test_dir, f"{name}.pdf"), password="secret")
+                      for name in ("good", "hang", "crash")]
+        self.quarantine_path = os.path.join(self.test_dir, "quarantine.jsonl")
+            
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            
+    def test_isolated_pool(self):
+        """Test that a task over the timeout and a crashing task fail alone and the pool carries on."""
+        from isolated_pool import IsolatedPool, TaskTimeoutError, WorkerCrashedError
+        with IsolatedPool(2, timeout=0.5) as pool:
+            futures = [pool.submit(func, 4) for func in (_double, _hang, _crash, _double, _double)]
+            self.assertEqual(futures[0].result(), 8)
+            with self.assertRaises(TaskTimeoutError):
+                futures[1].result()
+            with self.assertRaises(WorkerCrashedError):
+                futures[2].result()
+            self.assertEqual([future.result() for future in futures[3:]], [8, 8])
+            
+    def test_isolated_pool_replaces_dead_idle_worker(self):
+        """Test that a worker that died while idle is replaced instead of failing the tasks sent to it."""
+        from isolated_pool import IsolatedPool
+        with IsolatedPool(1) as pool:
+            self.assertEqual(pool.submit(_double, 1).result(), 2)
+            pool._workers[0].process.kill()
+            pool._workers[0].process.join()
+            self.assertEqual([pool.submit(_double, n).result() for n in range(3)], [0, 2, 4])
+            
+    def test_quarantine_list(self):
+        """Test that quarantined files are remembered until they change."""
+        from quarantine import Quarantine
+        with Quarantine(self.quarantine_path) as quarantine:
+            quarantine.add(self.files[1], 'timeout', "too slow")
+            self.assertEqual(quarantine.reason(self.files[1]), 'timeout')
+            self.assertIsNone(quarantine.reason(self.files[0]))
+            with self.assertRaises(ValueError):
+                quarantine.add(self.files[0], 'slow')
+        with Quarantine(self.quarantine_path) as quarantine:
+            self.assertEqual(len(quarantine), 1)
+            self.assertEqual(quarantine.reason(self.files[1]), 'timeout')
+            os.utime(self.files[1], ns=(0, 0))
+            self.assertIsNone(quarantine.reason(self.files[1]))
+            
+    def test_batch_quarantines_hanging_and_crashing_files(self):
+        """Test that a batch kills a hanging file, survives a crash and skips both on the next run."""
+        from quarantine import Quarantine
+        real_remove_password = remove_pdf_password.remove_password
+        def remove_password_or_stall(input_pdf, *args):
+            if "hang" in input_pdf:
+                # Killed halfway through writing its output
+                with remove_pdf_password.atomic_output(args[0]) as f:
+                    f.write(b"%PDF-1.4\n")
+                    f.flush()
+                    _hang(None)
+            if "crash" in input_pdf:
+                _crash(None)
+            return real_remove_password(input_pdf, *args)
+        
+        with patch('remove_pdf_password.remove_password', side_effect=remove_password_or_stall), \
+             patch('sys.stdout', new_callable=StringIO) as stdout, Quarantine(self.quarantine_path) as quarantine:
+            successful, failed = process_batch(self.files, "secret", self.output_dir, backup=False, overwrite=True,
+                                               file_timeout=1, quarantine=quarantine)
+        self.assertEqual(successful, self.files[:1])
+        self.assertEqual(failed, self.files[1:])
+        self.assertIn("Timed out or crashed: 2", stdout.getvalue())
+        self.assertEqual(os.listdir(self.output_dir), ["unlocked_good.pdf"])
+        with open(self.quarantine_path) as f:
+            self.assertEqual([json.loads(line)['reason'] for line in f], ['timeout', 'crash'])
+        
+        with patch('sys.stdout', new_callable=StringIO) as stdout, Quarantine(self.quarantine_path) as quarantine:
+            successful, failed = process_batch(self.files, "secret", self.output_dir, backup=False, overwrite=True,
+                                               file_timeout=1, quarantine=quarantine)
+        self.assertEqual((successful, failed), (self.files[:1], []))
+        self.assertIn("Skipped (quarantined): 2", stdout.getvalue())
+
+    def test_watch_survives_crashing_worker(self):
+        """Test that a drop-folder watcher survives a crashing worker and removes its partial output."""
+        real_remove_password = remove_pdf_password.remove_password
+        def remove_password_or_crash(input_pdf, *args):
+            if "crash" in input_pdf:
+                with remove_pdf_password.atomic_output(args[0]) as f:
+                    f.write(b"%PDF-1.4\n")
+                    f.flush()
+                    _crash(None)
+            return real_remove_password(input_pdf, *args)
+        
+        files = [self.files[2], self.files[0]]
+        class FakeWatcher:
+            overflows = 0
+            def __init__(self, *args):
+                self.polls = 0
+            def poll(self, timeout, limit=None):
+                self.polls += 1
+                if self.polls > 1:
+                    raise KeyboardInterrupt
+                return files
+            def close(self):
+                pass
+        
+        with patch('remove_pdf_password.remove_password', side_effect=remove_password_or_crash), \
+             patch('remove_pdf_password.DropFolderWatcher', FakeWatcher), patch('sys.stdout', new_callable=StringIO):
+            result = remove_pdf_password.watch_folders([self.test_dir], "secret", self.output_dir, backup=False,
+                                                       overwrite=True, jobs=1)
+        self.assertEqual(result, (1, 1))
+        self.assertEqual(os.listdir(self.output_dir), ["unlocked_good.pdf"])
+
+
 def run_tests():
     """Run all tests."""
     # Disable logging during tests to avoid cluttering output
@@ -0,0 +1,233 @@
+"""
+Warm-worker Unix socket server for the PDF Password Manager CLI.
+
+Most of the time of a single-file CLI run goes to starting Python and
+importing PyPDF2 and PyCryptodome. ``remove_pdf_password.py --warm-server``
+keeps a process with everything imported listening on a Unix socket.
+Each CLI invocation first calls forward_or_continue(), which needs only
+the standard library: when a server is running, the command line, the
+working directory, the environment and the client's stdin/stdout/stderr
+descriptors are passed to it, and the client exits with the server's
+exit status. Otherwise the CLI simply continues in-process.
+
+The server forks once per command, so runs are isolated from each other
+and see the client's terminal for output and confirmation prompts.
+Commands that need a hidden password prompt are handed back to the
+client to run locally.
+
+The socket is created with mode 0600, and clients only use a socket
+owned by their own user, since command lines may carry passwords. Set
+PDFPM_SOCKET to use another socket path, or PDFPM_NO_SERVER=1 to never
+forward.
+"""
+
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+
+SOCKET_ENV = "PDFPM_SOCKET"
+DISABLE_ENV = "PDFPM_NO_SERVER"
+SERVER_FLAG = "--warm-server"
+
+_LENGTH = struct.Struct("!I")
+# Largest request accepted (command line and environment)
+MAX_REQUEST_SIZE = 1024 * 1024
+
+
+class NeedsTerminal(Exception):
+    """Raised in a server-side run that has to prompt for a hidden password."""
+
+
+def default_socket_path():
+    """Return the per-user socket path used when PDFPM_SOCKET is not set."""
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, f"pdf-password-manager-{os.getuid()}.sock")
+
+
+def socket_path():
+    return os.environ.get(SOCKET_ENV) or default_socket_path()
+
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return data
+
+
+def _send_message(sock, message):
+    sock.sendall(json.dumps(message).encode() + b"\n")
+
+
+def forward_or_continue(argv=None):
+    """Run the command on a warm server and exit with its status, or return to run it in-process."""
+    argv = sys.argv[1:] if argv is None else argv
+    if os.environ.get(DISABLE_ENV) or SERVER_FLAG in argv or not hasattr(socket, "send_fds"):
+        return
+    path = socket_path()
+    try:
+        if os.stat(path).st_uid != os.getuid():
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+    except OSError:
+        return
+
+    request = json.dumps({'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}).encode()
+    child_pid = None
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        socket.send_fds(sock, [_LENGTH.pack(len(request)) + request], [0, 1, 2])
+        replies = sock.makefile("r")
+        for line in replies:
+            reply = json.loads(line)
+            if 'pid' in reply:
+                child_pid = reply['pid']
+            elif reply.get('fallback'):
+                return
+            elif 'exit' in reply:
+                sys.exit(reply['exit'])
+    except KeyboardInterrupt:
+        # Interrupt the run on the server like a local Ctrl+C, then wait for its exit status
+        if child_pid is not None:
+            os.kill(child_pid, 2)
+            for line in replies:
+                reply = json.loads(line)
+                if 'exit' in reply:
+                    sys.exit(reply['exit'])
+        sys.exit(130)
+    except (OSError, ValueError):
+        # The server went away before starting the command; run it here instead
+        if child_pid is None:
+            return
+        sys.exit(1)
+    finally:
+        sock.close()
+    # The server closed the connection without a status
+    if child_pid is None:
+        return
+    sys.exit(1)
+
+
+def _run_forwarded(sock, main):
+    """Serve one forwarded command in a forked child; never returns."""
+    import getpass
+    import logging
+    import traceback
+
+    status = 1
+    try:
+        message, fds, _, _ = socket.recv_fds(sock, 65536, 3)
+        if len(fds) != 3 or len(message) < _LENGTH.size:
+            os._exit(1)
+        (length,) = _LENGTH.unpack_from(message)
+        if length > MAX_REQUEST_SIZE:
+            os._exit(1)
+        message = message[_LENGTH.size:]
+        if len(message) < length:
+            message += _recv_exact(sock, length - len(message))
+        request = json.loads(message)
+
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        sys.argv = [sys.argv[0]] + request['argv']
+        sys.stdout.reconfigure(line_buffering=os.isatty(1))
+        _send_message(sock, {'pid': os.getpid()})
+
+        def refuse_prompt(prompt="", stream=None):
+            raise NeedsTerminal(prompt)
+        getpass.getpass = refuse_prompt
+        # Let the command set up logging for its own directory and verbosity
+        for handler in logging.root.handlers[:]:
+            logging.root.removeHandler(handler)
+
+        try:
+            main(request['argv'])
+            status = 0
+        except SystemExit as e:
+            if e.code is None:
+                status = 0
+            elif isinstance(e.code, int):
+                status = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                status = 1
+        except NeedsTerminal:
+            _send_message(sock, {'fallback': True})
+            os._exit(0)
+        except KeyboardInterrupt:
+            status = 130
+        except Exception:
+            traceback.print_exc()
+            status = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            _send_message(sock, {'exit': status})
+        except Exception:
+            pass
+        os._exit(0)
+
+
+def run_server(main, path=None):
+    """Accept forwarded commands on a Unix socket until interrupted.
+
+    :param main: The CLI entry point, called as main(argv) in a forked child per command.
+    """
+    import signal
+    import socketserver
+
+    path = path or socket_path()
+    if os.path.exists(path):
+        # Refuse to take over a live server; remove a stale socket
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.remove(path)
+        else:
+            probe.close()
+            raise OSError(f"a server is already listening on {path}")
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            # Children get the default Ctrl+C behaviour back so a client can interrupt its own run
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            _run_forwarded(self.request, main)
+
+    class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+        pass
+
+    previous_umask = os.umask(0o177)
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(previous_umask)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"Warm server listening on {path} (press Ctrl+C to stop)")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping warm server...")
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,242 @@
+"""
+Drop-folder watching for PDF Password Manager (Linux inotify).
+
+A DropFolderWatcher reports PDFs once their writer has closed them (or
+they were renamed into the folder) and their size and modification time
+have stayed the same for a settle time, so partially written files are
+not picked up. Files waiting to settle are held in a bounded table;
+while it is full, events stay in the kernel queue. If that queue
+overflows, the folders are rescanned, so bursts lose no files.
+
+inotify is used through ctypes, so no extra package is needed.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from collections import deque
+
+from file_discovery import iter_input_files, matches
+
+# inotify event flags (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Seconds a file's size and mtime must stay unchanged before it is processed
+DEFAULT_SETTLE_TIME = 2.0
+# Files waiting to settle before events are left in the kernel queue
+DEFAULT_MAX_PENDING = 10000
+# Bytes read from the inotify descriptor at a time
+READ_SIZE = 64 * 1024
+
+
+class WatchError(Exception):
+    """Raised when a folder cannot be watched."""
+
+
+class Inotify:
+    """Minimal inotify binding: add directory watches and read raw events."""
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise WatchError("watch mode needs Linux inotify")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise WatchError(f"inotify_init1 failed: {os.strerror(errno)}")
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        """Watch a directory and return its watch descriptor."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise WatchError(f"cannot watch {path}: {os.strerror(errno)}")
+        return wd
+
+    def read(self, timeout):
+        """Return a list of (wd, mask, name) events, waiting up to timeout seconds for the first."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DropFolderWatcher:
+    """Yield settled PDFs dropped into one or more directories."""
+
+    def __init__(self, directories, recursive=False, include=None, exclude=None,
+                 settle_time=DEFAULT_SETTLE_TIME, max_pending=DEFAULT_MAX_PENDING, initial_scan=True):
+        """Start watching directories.
+
+        :param initial_scan: Also report the PDFs already in the directories.
+        """
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.settle_time = settle_time
+        self.max_pending = max_pending
+        self.overflows = 0
+        self._roots = [os.path.abspath(directory) for directory in directories]
+        self._watches = {}
+        self._pending = {}
+        self._scans = deque()
+        self._inotify = Inotify()
+        try:
+            for root in self._roots:
+                self._watch_tree(root)
+        except BaseException:
+            self._inotify.close()
+            raise
+        if initial_scan:
+            self._scans.append(iter_input_files(self._roots, recursive, include, exclude))
+
+    def _watch_tree(self, directory):
+        """Watch directory and, when recursive, every directory below it."""
+        self._watches[self._inotify.add_watch(directory)] = directory
+        if not self.recursive:
+            return
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and not (self.exclude and matches(entry.path, self.exclude)):
+                try:
+                    self._watch_tree(entry.path)
+                except WatchError:
+                    # The directory vanished or the watch limit was reached; its files are picked up by rescans
+                    continue
+
+    def _wanted(self, path):
+        if not path.lower().endswith(".pdf"):
+            return False
+        if self.exclude and matches(path, self.exclude):
+            return False
+        return not self.include or matches(path, self.include)
+
+    def _schedule(self, path, reset=True):
+        """Start (or restart) the settle timer of a file."""
+        if not reset and path in self._pending:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._pending.pop(path, None)
+            return
+        self._pending[path] = (time.monotonic() + self.settle_time, (stat.st_size, stat.st_mtime_ns))
+
+    def _handle(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            # Events were dropped; find the files again by scanning
+            self.overflows += 1
+            self._scans.append(iter_input_files(self._roots, self.recursive, self.include, self.exclude))
+            return
+        if mask & (IN_IGNORED | IN_DELETE_SELF):
+            self._watches.pop(wd, None)
+            return
+        directory = self._watches.get(wd)
+        if directory is None or not name:
+            return
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if self.recursive and mask & (IN_CREATE | IN_MOVED_TO) and not (self.exclude and matches(path, self.exclude)):
+                try:
+                    self._watch_tree(path)
+                except WatchError:
+                    return
+                # Files may have landed before the watch was in place
+                self._scans.append(iter_input_files([path], True, self.include, self.exclude))
+            return
+        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self._wanted(path):
+            self._schedule(path)
+
+    def _fill_from_scans(self):
+        while self._scans and len(self._pending) < self.max_pending:
+            try:
+                path = next(self._scans[0])
+            except StopIteration:
+                self._scans.popleft()
+                continue
+            self._schedule(path, reset=False)
+
+    def pending_count(self):
+        """Return the number of files waiting to settle."""
+        return len(self._pending)
+
+    def poll(self, timeout, limit=None):
+        """Wait up to timeout seconds for events and return the paths that have settled.
+
+        :param limit: Return at most this many paths; the rest stay pending.
+        """
+        self._fill_from_scans()
+        now = time.monotonic()
+        if self._pending:
+            timeout = max(0, min(timeout, min(deadline for deadline, _ in self._pending.values()) - now))
+        if len(self._pending) < self.max_pending:
+            for event in self._inotify.read(timeout):
+                self._handle(*event)
+        elif timeout:
+            time.sleep(timeout)
+
+        ready = []
+        now = time.monotonic()
+        for path, (deadline, signature) in list(self._pending.items()):
+            if limit is not None and len(ready) >= limit:
+                break
+            if deadline > now:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != signature:
+                # Still being written
+                self._pending[path] = (now + self.settle_time, (stat.st_size, stat.st_mtime_ns))
+                continue
+            del self._pending[path]
+            ready.append(path)
+        return ready
+
+    def close(self):
+        """Stop watching."""
+        self._inotify.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()